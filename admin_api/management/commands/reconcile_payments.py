@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from admin_api.reconciliation import FixtureGatewayClient, ReconciliationEngine, get_gateway_client
+
+
+class Command(BaseCommand):
+    help = 'Reconcile Paystack transactions against payments, storage payments and orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to reconcile (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--to', dest='end', help='Last day to reconcile (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--fixture', help='Read gateway transactions from a JSON file instead of Paystack')
+        parser.add_argument('--apply', action='store_true', help='Fix local statuses instead of only reporting them')
+        parser.add_argument('--report', help='Write the report to this path (.json or .csv)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = parse_date(options['start']) if options['start'] else today - timedelta(days=1)
+        end = parse_date(options['end']) if options['end'] else today
+        if start is None or end is None:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+
+        client = FixtureGatewayClient(options['fixture']) if options['fixture'] else get_gateway_client()
+        report = ReconciliationEngine(client).run(start, end, apply=options['apply'])
+
+        for mismatch in report.mismatches:
+            line = (
+                f"{mismatch['table']} {mismatch['reference']}: {mismatch['kind']} "
+                f"(local {mismatch['local_status']} / gateway {mismatch['gateway_status']}) - {mismatch['action']}"
+            )
+            style = self.style.SUCCESS if mismatch['action'] == 'fixed' else self.style.WARNING
+            self.stdout.write(style(line))
+
+        if options['report']:
+            content = report.to_csv() if options['report'].endswith('.csv') else report.to_json()
+            with open(options['report'], 'w') as f:
+                f.write(content)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {report.gateway_count} gateway transactions: {report.matched} matched, '
+            f'{report.fixed_count} fixed, {report.flagged_count} flagged.'
+        ))
@@ -0,0 +1,419 @@
+"""
+Reconciliation between the payment gateway and our three payment ledgers.
+
+Paystack is the source of truth for whether money moved. ``Payment``
+(investments), ``PaymentTransaction`` (storage) and ``Order`` (ecommerce)
+each keep their own copy of that status and drift whenever a webhook is
+missed. The engine pages through the gateway's transaction list for a date
+window, joins it against all three tables by reference and either fixes
+the local status in bulk or flags the row for a human.
+"""
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, time
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from ecommerce.models import Order
+from investments.models import Investment, Payment
+from storage.models import PaymentTransaction
+from storage.services.payment_service import confirm_payment
+
+JOIN_CHUNK_SIZE = 500
+
+# Gateway statuses collapsed to the outcomes we act on
+GATEWAY_STATUS_MAP = {
+    'success': 'success',
+    'failed': 'failed',
+    'abandoned': 'failed',
+    'reversed': 'reversed',
+    'ongoing': 'pending',
+    'pending': 'pending',
+    'processing': 'pending',
+    'queued': 'pending',
+}
+
+
+class GatewayClient(ABC):
+    """Interface for something that can list gateway transactions"""
+
+    @abstractmethod
+    def iter_transactions(self, start, end):
+        """Yield dicts with reference, status, amount, currency, paid_at and created_at"""
+
+    @staticmethod
+    def normalize(row):
+        """Turn a Paystack-shaped transaction into the engine's row format"""
+        paid_at = row.get('paid_at') or row.get('paidAt')
+        created_at = row.get('created_at') or row.get('createdAt')
+        return {
+            'reference': row['reference'],
+            'status': row.get('status', ''),
+            # Paystack reports amounts in kobo
+            'amount': Decimal(str(row.get('amount', 0))) / 100,
+            'currency': row.get('currency', 'NGN'),
+            'paid_at': parse_datetime(paid_at) if isinstance(paid_at, str) else paid_at,
+            'created_at': parse_datetime(created_at) if isinstance(created_at, str) else created_at,
+        }
+
+
+class PaystackGatewayClient(GatewayClient):
+    """Pages through GET /transaction on the live Paystack API"""
+
+    PAGE_SIZE = 100
+
+    def __init__(self):
+        self.secret_key = getattr(settings, 'PAYSTACK_SECRET_KEY', '')
+        self.base_url = 'https://api.paystack.co'
+
+    def get_headers(self):
+        return {
+            'Authorization': f'Bearer {self.secret_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def iter_transactions(self, start, end):
+        page = 1
+        while True:
+            response = requests.get(
+                f'{self.base_url}/transaction',
+                params={
+                    'from': start.isoformat(),
+                    'to': end.isoformat(),
+                    'perPage': self.PAGE_SIZE,
+                    'page': page,
+                },
+                headers=self.get_headers(),
+                timeout=30,
+            )
+            data = response.json()
+            if not data.get('status'):
+                raise Exception(f"Paystack error: {data.get('message', 'Unknown error')}")
+
+            for row in data['data']:
+                yield self.normalize(row)
+
+            page_count = data.get('meta', {}).get('pageCount') or 1
+            if page >= page_count:
+                break
+            page += 1
+
+
+class FixtureGatewayClient(GatewayClient):
+    """Serves transactions from a JSON fixture instead of the network.
+
+    The fixture is either a list of Paystack transaction objects or a
+    Paystack list response (``{"data": [...]}``). Used in development and
+    to replay exported gateway statements.
+    """
+
+    def __init__(self, path=None, transactions=None):
+        if transactions is None:
+            with open(path) as f:
+                payload = json.load(f)
+            transactions = payload['data'] if isinstance(payload, dict) else payload
+        self.transactions = transactions
+
+    def iter_transactions(self, start, end):
+        for row in self.transactions:
+            row = self.normalize(row)
+            created = row['created_at'] or row['paid_at']
+            if created is None or start <= created <= end:
+                yield row
+
+
+def get_gateway_client():
+    """Client named by RECONCILIATION_GATEWAY_CLIENT, Paystack by default"""
+    path = getattr(settings, 'RECONCILIATION_GATEWAY_CLIENT', None)
+    if path:
+        return import_string(path)()
+    return PaystackGatewayClient()
+
+
+class ReconciliationReport:
+    FIELDS = [
+        'table', 'reference', 'local_id', 'kind', 'action',
+        'local_status', 'gateway_status', 'local_amount', 'gateway_amount',
+    ]
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.gateway_count = 0
+        self.matched = 0
+        self.mismatches = []
+
+    def add(self, table, reference, kind, action, local=None, gateway=None):
+        self.mismatches.append({
+            'table': table,
+            'reference': reference,
+            'local_id': str(local['id']) if local else None,
+            'kind': kind,
+            'action': action,
+            'local_status': local['status'] if local else None,
+            'gateway_status': gateway['status'] if gateway else None,
+            'local_amount': str(local['amount']) if local else None,
+            'gateway_amount': str(gateway['amount']) if gateway else None,
+        })
+
+    @property
+    def fixed_count(self):
+        return sum(1 for m in self.mismatches if m['action'] == 'fixed')
+
+    @property
+    def flagged_count(self):
+        return sum(1 for m in self.mismatches if m['action'] == 'flagged')
+
+    def as_dict(self):
+        return {
+            'window': {'from': self.start.isoformat(), 'to': self.end.isoformat()},
+            'generated_at': timezone.now().isoformat(),
+            'gateway_transactions': self.gateway_count,
+            'matched': self.matched,
+            'fixed': self.fixed_count,
+            'flagged': self.flagged_count,
+            'mismatches': self.mismatches,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_csv(self):
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=self.FIELDS)
+        writer.writeheader()
+        writer.writerows(self.mismatches)
+        return output.getvalue()
+
+
+class LedgerTable(ABC):
+    """How one local table stores a gateway reference and a status"""
+
+    name = None
+    model = None
+    reference_field = None
+    amount_field = None
+    date_field = 'created_at'
+    # local status -> canonical outcome
+    status_map = {}
+    paid_statuses = []
+
+    def fetch(self, **filters):
+        """Rows keyed by reference, in the engine's row format"""
+        rows = self.model.objects.filter(**filters).values(
+            'id', self.reference_field, 'status', self.amount_field
+        )
+        return {
+            row[self.reference_field]: {
+                'id': row['id'],
+                'status': row['status'],
+                'amount': row[self.amount_field] or Decimal('0'),
+            }
+            for row in rows
+        }
+
+    def fetch_by_references(self, references):
+        rows = {}
+        references = list(references)
+        for start in range(0, len(references), JOIN_CHUNK_SIZE):
+            chunk = references[start:start + JOIN_CHUNK_SIZE]
+            rows.update(self.fetch(**{f'{self.reference_field}__in': chunk}))
+        return rows
+
+    def fetch_paid_in_window(self, start, end):
+        return self.fetch(**{
+            f'{self.date_field}__gte': start,
+            f'{self.date_field}__lte': end,
+            'status__in': self.paid_statuses,
+        })
+
+    def canonical(self, local_status):
+        return self.status_map.get(local_status)
+
+    @abstractmethod
+    def mark_paid(self, fixes):
+        """Record the gateway's success on the rows behind ``fixes``"""
+
+    @abstractmethod
+    def mark_failed(self, fixes):
+        """Record the gateway's failure on the rows behind ``fixes``"""
+
+
+class PaymentTable(LedgerTable):
+    name = 'investments.Payment'
+    model = Payment
+    reference_field = 'paystack_reference'
+    amount_field = 'amount'
+    status_map = {
+        'success': 'success',
+        'failed': 'failed',
+        'abandoned': 'failed',
+        'pending': 'pending',
+    }
+    paid_statuses = ['success']
+
+    def mark_paid(self, fixes):
+        payments = list(Payment.objects.filter(id__in=[local['id'] for local, _ in fixes]))
+        paid_at = {local['id']: gateway['paid_at'] for local, gateway in fixes}
+        for payment in payments:
+            payment.status = 'success'
+            payment.paid_at = paid_at.get(payment.id) or timezone.now()
+        Payment.objects.bulk_update(payments, ['status', 'paid_at'])
+        # Saved one by one so the maturity calendar signals see the activation
+        for investment in Investment.objects.filter(payments__in=payments, status='pending').distinct():
+            investment.status = 'active'
+            investment.save(update_fields=['status'])
+
+    def mark_failed(self, fixes):
+        Payment.objects.filter(id__in=[local['id'] for local, _ in fixes]).update(
+            status='failed', updated_at=timezone.now()
+        )
+
+
+class StoragePaymentTable(LedgerTable):
+    name = 'storage.PaymentTransaction'
+    model = PaymentTransaction
+    reference_field = 'reference'
+    amount_field = 'amount'
+    status_map = {
+        'successful': 'success',
+        'failed': 'failed',
+        'cancelled': 'failed',
+        'pending': 'pending',
+        'processing': 'pending',
+    }
+    paid_statuses = ['successful']
+
+    def mark_paid(self, fixes):
+        # Row by row through the verification path: the investment may have been
+        # cancelled by the reservation sweeper and needs its stock taken again
+        transactions = PaymentTransaction.objects.filter(
+            id__in=[local['id'] for local, _ in fixes]
+        ).select_related('investment__storage_plan')
+        paid_at = {local['id']: gateway['paid_at'] for local, gateway in fixes}
+        for payment_transaction in transactions:
+            confirm_payment(payment_transaction, paid_at=paid_at.get(payment_transaction.id))
+
+    def mark_failed(self, fixes):
+        PaymentTransaction.objects.filter(id__in=[local['id'] for local, _ in fixes]).update(
+            status='failed', updated_at=timezone.now()
+        )
+
+
+class OrderTable(LedgerTable):
+    name = 'ecommerce.Order'
+    model = Order
+    reference_field = 'reference'
+    amount_field = 'total_amount'
+    status_map = {
+        'paid': 'success',
+        'delivered': 'success',
+        'cancelled': 'failed',
+        'pending': 'pending',
+    }
+    paid_statuses = ['paid', 'delivered', 'confirmed']
+
+    def mark_paid(self, fixes):
+        Order.objects.filter(id__in=[local['id'] for local, _ in fixes]).update(
+            status='paid', paystack_reference=F('reference'), updated_at=timezone.now()
+        )
+
+    def mark_failed(self, fixes):
+        Order.objects.filter(id__in=[local['id'] for local, _ in fixes]).update(
+            status='cancelled', updated_at=timezone.now()
+        )
+
+
+LEDGER_TABLES = [PaymentTable(), StoragePaymentTable(), OrderTable()]
+
+
+class ReconciliationEngine:
+    """Hash-joins gateway transactions against the local ledgers.
+
+    Fixable drift (gateway settled, local still pending, or a status that
+    is not one of the model's choices) is corrected in bulk when ``apply``
+    is set. Anything that involves money we may already have acted on -
+    amount differences, reversals of paid rows, payments we have no record
+    of - is only flagged. Fixes update the ledger rows and the status of
+    the investment/order they pay for. A confirmed storage payment goes
+    through the same path as verification, so it also takes the stock;
+    crop slot counts and transaction history are left for the flagged-row
+    review.
+    """
+
+    def __init__(self, client=None, tables=None):
+        self.client = client or get_gateway_client()
+        self.tables = tables or LEDGER_TABLES
+
+    def run(self, start, end, apply=False):
+        if not isinstance(start, datetime):
+            start = timezone.make_aware(datetime.combine(start, time.min))
+        if not isinstance(end, datetime):
+            end = timezone.make_aware(datetime.combine(end, time.max))
+
+        report = ReconciliationReport(start, end)
+        gateway = {row['reference']: row for row in self.client.iter_transactions(start, end)}
+        report.gateway_count = len(gateway)
+        found = set()
+
+        with transaction.atomic():
+            for table in self.tables:
+                local_rows = table.fetch_by_references(gateway.keys())
+                found.update(local_rows)
+                to_mark_paid = []
+                to_mark_failed = []
+
+                for reference, local in local_rows.items():
+                    remote = gateway[reference]
+                    remote_outcome = GATEWAY_STATUS_MAP.get(remote['status'], 'pending')
+                    local_outcome = table.canonical(local['status'])
+
+                    if local_outcome is None:
+                        # e.g. Order.status='confirmed', which is not a valid choice
+                        if remote_outcome == 'success':
+                            to_mark_paid.append((local, remote))
+                            report.add(table.name, reference, 'invalid_status', 'fixed' if apply else 'flagged', local, remote)
+                        else:
+                            report.add(table.name, reference, 'invalid_status', 'flagged', local, remote)
+                        continue
+
+                    if remote_outcome == 'success' and local['amount'] != remote['amount']:
+                        report.add(table.name, reference, 'amount', 'flagged', local, remote)
+                        continue
+
+                    if local_outcome == remote_outcome or remote_outcome == 'pending':
+                        report.matched += 1
+                    elif remote_outcome == 'success':
+                        to_mark_paid.append((local, remote))
+                        report.add(table.name, reference, 'status', 'fixed' if apply else 'flagged', local, remote)
+                    elif local_outcome == 'pending':
+                        to_mark_failed.append((local, remote))
+                        report.add(table.name, reference, 'status', 'fixed' if apply else 'flagged', local, remote)
+                    else:
+                        # We think it was paid, the gateway says failed or reversed
+                        report.add(table.name, reference, 'status', 'flagged', local, remote)
+
+                if apply:
+                    if to_mark_paid:
+                        table.mark_paid(to_mark_paid)
+                    if to_mark_failed:
+                        table.mark_failed(to_mark_failed)
+
+                for reference, local in table.fetch_paid_in_window(start, end).items():
+                    if reference not in gateway:
+                        report.add(table.name, reference, 'missing_at_gateway', 'flagged', local=local)
+
+        for reference, remote in gateway.items():
+            if reference not in found and GATEWAY_STATUS_MAP.get(remote['status']) == 'success':
+                report.add('-', reference, 'missing_locally', 'flagged', gateway=remote)
+
+        return report
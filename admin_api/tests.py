@@ -1,3 +1,107 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ecommerce.models import Order
+from investments.models import Payment
+from investments.tests import crop_investment, investment_package
+from referrals.models import Referral, ReferralCode, ReferralEarning
+from users.models import User
+
+from .reconciliation import FixtureGatewayClient, GatewayClient, LedgerTable, ReconciliationEngine
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='payer@example.com', password='x')
+        Payment.objects.create(user=user, amount=Decimal('100'), paystack_reference='P1')
+        Payment.objects.create(user=user, amount=Decimal('100'), paystack_reference='P2', status='success')
+        Payment.objects.create(user=user, amount=Decimal('50'), paystack_reference='P3')
+        Payment.objects.create(user=user, amount=Decimal('50'), paystack_reference='P4', status='success')
+        Order.objects.create(reference='O1', total_amount=Decimal('20'), status='confirmed')
+        Order.objects.create(reference='O2', total_amount=Decimal('20'))
+
+        now = timezone.now().isoformat()
+        self.gateway = FixtureGatewayClient(transactions=[
+            {'reference': 'P1', 'status': 'success', 'amount': 10000, 'paid_at': now},
+            {'reference': 'P2', 'status': 'reversed', 'amount': 10000, 'paid_at': now},
+            {'reference': 'P3', 'status': 'abandoned', 'amount': 5000, 'paid_at': None},
+            {'reference': 'O1', 'status': 'success', 'amount': 2000, 'paid_at': now},
+            {'reference': 'O2', 'status': 'success', 'amount': 2500, 'paid_at': now},
+            {'reference': 'X9', 'status': 'success', 'amount': 2500, 'paid_at': now},
+        ])
+
+    def run_reconciliation(self, apply):
+        today = timezone.localdate()
+        return ReconciliationEngine(self.gateway).run(today, today, apply=apply)
+
+    def test_fixes_drift_and_flags_what_needs_a_human(self):
+        report = self.run_reconciliation(apply=True)
+
+        self.assertEqual(sorted((m['reference'], m['kind'], m['action']) for m in report.mismatches), [
+            ('O1', 'invalid_status', 'fixed'),
+            ('O2', 'amount', 'flagged'),
+            ('P1', 'status', 'fixed'),
+            ('P2', 'status', 'flagged'),
+            ('P3', 'status', 'fixed'),
+            ('P4', 'missing_at_gateway', 'flagged'),
+            ('X9', 'missing_locally', 'flagged'),
+        ])
+        self.assertEqual(Payment.objects.get(paystack_reference='P1').status, 'success')
+        self.assertEqual(Payment.objects.get(paystack_reference='P2').status, 'success')
+        self.assertEqual(Payment.objects.get(paystack_reference='P3').status, 'failed')
+        self.assertEqual(Order.objects.get(reference='O1').status, 'paid')
+        self.assertEqual(Order.objects.get(reference='O2').status, 'pending')
+        self.assertEqual(len(report.to_csv().splitlines()), 8)
+
+    def test_dry_run_changes_nothing(self):
+        report = self.run_reconciliation(apply=False)
+
+        self.assertTrue(report.mismatches)
+        self.assertEqual(Payment.objects.get(paystack_reference='P1').status, 'pending')
+        self.assertEqual(Order.objects.get(reference='O1').status, 'confirmed')
+
+    def test_interfaces_cannot_be_used_half_implemented(self):
+        class NoMarkFailed(LedgerTable):
+            def mark_paid(self, fixes):
+                pass
+
+        for cls in (GatewayClient, LedgerTable, NoMarkFailed):
+            with self.subTest(cls=cls.__name__), self.assertRaises(TypeError):
+                cls()
+
+
+class AdminReferralListingTests(TestCase):
+    def setUp(self):
+        package = investment_package()
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        for j in range(3):
+            referrer = User.objects.create_user(email=f'referrer{j}@example.com', password='x')
+            code = ReferralCode.objects.create(user=referrer)
+            for i in range(3):
+                referred = User.objects.create_user(email=f'referred{j}{i}@example.com', password='x')
+                referral = Referral.objects.create(
+                    referrer=referrer, referred_user=referred, referral_code=code, status='active'
+                )
+                ReferralEarning.objects.create(
+                    referral=referral, investment=crop_investment(referred, package), amount=Decimal('5'),
+                    commission_rate=Decimal('5'), status='paid',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_each_listing_is_one_query(self):
+        for url, rows in [
+            ('/api/admin/referrals/', 9), ('/api/admin/referral-codes/', 3), ('/api/admin/referral-earnings/', 9),
+        ]:
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), rows)
 
-# Create your tests here.
+    def test_code_totals_come_from_annotations(self):
+        code = self.client.get('/api/admin/referral-codes/').data[0]
+        self.assertEqual(code['referrals_count'], 3)
+        self.assertEqual(code['total_earnings'], Decimal('15.00'))
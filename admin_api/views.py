@@ -116,14 +116,13 @@ def admin_referrals(request):
     """
     Get all referrals for admin
     """
-    referrals = Referral.objects.select_related('referrer', 'referred_user', 'referral_code').all()
+    referrals = Referral.objects.select_related('referrer', 'referred_user', 'referral_code').annotate(
+        earnings_total=Sum('earnings__amount')
+    )
 
     data = []
     for referral in referrals:
-        # Calculate earnings for this referral
-        earnings = ReferralEarning.objects.filter(referral=referral).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        earnings = referral.earnings_total or 0
 
         data.append({
             'id': referral.id,
@@ -155,11 +154,7 @@ def admin_referral_earnings(request):
     """
     Get all referral earnings for admin
     """
-    earnings = ReferralEarning.objects.select_related(
-        'referral__referrer',
-        'referral__referred_user',
-        'investment'
-    ).all()
+    earnings = ReferralEarning.objects.with_related()
 
     data = []
     for earning in earnings:
@@ -178,7 +173,7 @@ def admin_referral_earnings(request):
             'investment': {
                 'id': earning.investment.id,
                 'amount': float(earning.investment.amount),
-                'package_name': earning.investment.package.name if hasattr(earning.investment, 'package') else 'N/A'
+                'package_name': earning.investment.package.name if earning.investment.package_id else 'N/A'
             },
             'amount': float(earning.amount),
             'commission_rate': float(earning.commission_rate),
@@ -196,17 +191,13 @@ def admin_referral_codes(request):
     """
     Get all referral codes for admin
     """
-    codes = ReferralCode.objects.select_related('user').all()
+    codes = ReferralCode.objects.with_stats()
 
     data = []
     for code in codes:
-        # Get referral stats for this code
-        referrals_count = Referral.objects.filter(referral_code=code).count()
-        active_referrals = Referral.objects.filter(referral_code=code, status='active').count()
-        total_earnings = ReferralEarning.objects.filter(
-            referral__referral_code=code,
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        referrals_count = code.referrals_total
+        active_referrals = code.active_referrals_total
+        total_earnings = code.paid_earnings_total or 0
 
         data.append({
             'id': code.id,
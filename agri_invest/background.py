@@ -0,0 +1,33 @@
+"""
+Fire-and-forget work off the request thread.
+
+There is no task queue in this project, so background work runs on a daemon
+thread. Use ``after_commit`` for work that reads rows written by the
+current transaction.
+"""
+import logging
+import threading
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, '__name__', func))
+    finally:
+        # The thread opened its own connection
+        connection.close()
+
+
+def dispatch(func, *args):
+    """Run ``func(*args)`` on a background thread"""
+    threading.Thread(target=_run, args=(func, args), daemon=True).start()
+
+
+def after_commit(func, *args):
+    """Dispatch ``func(*args)`` once the current transaction commits"""
+    transaction.on_commit(lambda: dispatch(func, *args))
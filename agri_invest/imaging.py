@@ -0,0 +1,114 @@
+"""
+Image pipeline for user uploads.
+
+``process`` checks an upload with Pillow before anything reaches Cloudinary:
+it must be a real JPEG, PNG or WebP under ``IMAGE_MAX_UPLOAD_BYTES`` and
+``IMAGE_MAX_PIXELS``. It is then rotated upright from its EXIF orientation,
+stripped of metadata, downscaled to ``IMAGE_MAX_DIMENSION`` and re-encoded
+as WebP (JPEG where Pillow lacks WebP).
+
+The processed image is stored as usual. ``generate_variants`` then uploads
+the sizes in ``IMAGE_VARIANTS`` from a background thread after commit, and
+records their URLs in the model's ``<field>_variants`` JSON field.
+"""
+import io
+import os
+
+from cloudinary import uploader
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .background import after_commit
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+
+class ProcessedUpload(SimpleUploadedFile):
+    """A re-encoded upload that keeps the decoded image for variant generation"""
+
+    def __init__(self, name, content, content_type, image):
+        super().__init__(name, content, content_type)
+        self.image = image
+
+
+def _output_format():
+    return 'WEBP' if settings.IMAGE_FORMAT == 'WEBP' and features.check('webp') else 'JPEG'
+
+
+def encode(image):
+    """Image bytes in the output format, with no metadata"""
+    output_format = _output_format()
+    if output_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, output_format, quality=settings.IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue(), output_format
+
+
+def process(upload):
+    """Validate and re-encode an uploaded image. Raises ValidationError for anything unusable."""
+    if upload.size > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise ValidationError(f"Images must be smaller than {settings.IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB")
+
+    try:
+        upload.seek(0)
+        with Image.open(upload) as original:
+            if original.format not in ALLOWED_FORMATS:
+                raise ValidationError("Only JPEG, PNG and WebP images are allowed")
+            if original.width * original.height > settings.IMAGE_MAX_PIXELS:
+                raise ValidationError("Image dimensions are too large")
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError("Upload a valid image file")
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}
+    image.thumbnail((settings.IMAGE_MAX_DIMENSION, settings.IMAGE_MAX_DIMENSION), Image.LANCZOS)
+
+    content, output_format = encode(image)
+    stem = os.path.splitext(os.path.basename(upload.name or 'image'))[0]
+    extension = 'webp' if output_format == 'WEBP' else 'jpg'
+    return ProcessedUpload(f"{stem}.{extension}", content, f"image/{'webp' if extension == 'webp' else 'jpeg'}", image)
+
+
+def clean(value):
+    """Serializer hook: process file uploads, pass anything else (existing URLs, None) through"""
+    if isinstance(value, UploadedFile) and not isinstance(value, ProcessedUpload):
+        return process(value)
+    return value
+
+
+def _upload_variants(model, field_name, stored, image):
+    urls = {}
+    for name, size in settings.IMAGE_VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        content, _ = encode(variant)
+        urls[name] = uploader.upload(content, resource_type='image')['secure_url']
+
+    # Skip rows whose image was replaced meanwhile
+    model._default_manager.filter(**{field_name: stored}).update(**{f'{field_name}_variants': urls})
+
+
+def generate_variants_for(model, field_name, stored, upload):
+    """Upload variants for every ``model`` row whose ``field_name`` holds ``stored``"""
+    if isinstance(upload, ProcessedUpload) and stored:
+        after_commit(_upload_variants, model, field_name, stored, upload.image)
+
+
+def generate_variants(instance, field_name, upload):
+    """Upload variants of ``upload`` once ``instance`` (already saved with it) is committed"""
+    if not isinstance(upload, ProcessedUpload):
+        return
+    # The old variants belong to the old image
+    setattr(instance, f'{field_name}_variants', {})
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{f'{field_name}_variants': {}})
+
+    stored = instance._meta.get_field(field_name).get_prep_value(getattr(instance, field_name))
+    generate_variants_for(type(instance), field_name, stored, upload)
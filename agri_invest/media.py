@@ -0,0 +1,89 @@
+"""
+Public URLs of Cloudinary images, resolved once.
+
+Building a URL through the Cloudinary SDK costs enough to show up when a list
+serializes hundreds of rows. Each image field in ``MEDIA_FIELDS`` has a
+``<field>_url`` column, filled after save whenever the image changes, and
+serializers read it with ``url_for``. Rows saved before the column existed
+resolve their stored value through an LRU cache instead, so each distinct
+image is built once per process. Variant URLs are stored the same way by
+agri_invest/imaging.py.
+
+Only ``save()`` fills the column; code that bulk creates rows with an image
+sets it itself (see storage/services/broadcast.py).
+"""
+from functools import lru_cache
+
+from cloudinary.models import CloudinaryField
+from django.conf import settings
+from django.db.models.signals import post_save
+from rest_framework import serializers
+
+MEDIA_FIELDS = {
+    'users.User': ('profile_picture',),
+    'ecommerce.Product': ('image',),
+    'storage.StoragePlan': ('product_image',),
+    'storage.StorageUpdate': ('image',),
+}
+
+_parser = CloudinaryField('image')
+
+
+@lru_cache(maxsize=settings.MEDIA_URL_CACHE_SIZE)
+def resolve(stored):
+    """Public URL of a stored field value ('' for none)"""
+    if not stored:
+        return ''
+    return _parser.to_python(stored).url
+
+
+def stored_value(instance, field_name):
+    """The field's value as stored, '' for no image or the placeholder default (User.profile_picture)"""
+    value = getattr(instance, field_name)
+    if not value:
+        return ''
+    field = instance._meta.get_field(field_name)
+    stored = field.get_prep_value(field.to_python(value))
+    default = field.get_default()
+    if default and stored == field.get_prep_value(field.to_python(default)):
+        return ''
+    return stored
+
+
+def url_for(instance, field_name):
+    """Public URL of ``instance``'s image field, None if it has no image"""
+    return getattr(instance, f'{field_name}_url') or resolve(stored_value(instance, field_name)) or None
+
+
+def store_urls(sender, instance, update_fields=None, **kwargs):
+    changes = {}
+    for field_name in MEDIA_FIELDS[sender._meta.label]:
+        # Skip fields this save did not write, or that were never loaded
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        if field_name not in instance.__dict__:
+            continue
+        url = resolve(stored_value(instance, field_name))
+        if getattr(instance, f'{field_name}_url') != url:
+            changes[f'{field_name}_url'] = url
+
+    if changes:
+        sender._default_manager.filter(pk=instance.pk).update(**changes)
+        for name, url in changes.items():
+            setattr(instance, name, url)
+
+
+def connect():
+    for sender in MEDIA_FIELDS:
+        post_save.connect(store_urls, sender=sender, dispatch_uid=f'media_urls_{sender}')
+
+
+class MediaURLField(serializers.ReadOnlyField):
+    """Read-only public URL of ``image_field`` on the source object"""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return url_for(value, self.image_field) if value is not None else None
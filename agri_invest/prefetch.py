@@ -0,0 +1,97 @@
+"""
+Derive ``select_related``/``prefetch_related`` from a serializer's field tree.
+
+Every field's ``source`` is walked against the model: forward foreign keys
+and one-to-ones become ``select_related`` paths, reverse and many-to-many
+relations become ``Prefetch`` objects whose querysets are optimized for the
+nested serializer in turn. A serializer can cap a prefetched reverse
+foreign key list to its first N rows (in the related model's default
+ordering) with ``Meta.prefetch_limits = {'field_name': N}``.
+
+Only ``source`` paths are visible here; properties that touch relations
+should be replaced by dotted-source fields.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def _first_rows(queryset, fk_name, count):
+    # A sliced Prefetch needs to_attr, which would hide it from the
+    # serializer, so number the rows per parent instead
+    ordering = queryset.query.order_by or queryset.model._meta.ordering or ['pk']
+    order_by = [F(name[1:]).desc() if name.startswith('-') else F(name).asc() for name in ordering]
+    return queryset.annotate(
+        _prefetch_row=Window(RowNumber(), partition_by=F(fk_name), order_by=order_by)
+    ).filter(_prefetch_row__lte=count)
+
+
+def _walk(serializer, model, prefix, select, prefetch, limit):
+    limits = getattr(getattr(serializer, 'Meta', None), 'prefetch_limits', {}) if limit else {}
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        nested = field.child if isinstance(field, ListSerializer) else field
+        attrs = field.source.split('.')
+
+        current = model
+        path = []
+        for position, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            if isinstance(field, PrimaryKeyRelatedField) and position == len(attrs) - 1:
+                # The id is already on the row
+                break
+            path.append(attr)
+            lookup = prefix + '__'.join(path)
+
+            if model_field.one_to_many or model_field.many_to_many:
+                queryset = model_field.related_model._default_manager.all()
+                if isinstance(nested, BaseSerializer) and position == len(attrs) - 1:
+                    queryset = optimize(queryset, nested, limit)
+                if limits.get(field.field_name) and model_field.one_to_many:
+                    queryset = _first_rows(queryset, model_field.field.name, limits[field.field_name])
+                prefetch[lookup] = Prefetch(lookup, queryset=queryset)
+                break
+
+            select.add(lookup)
+            current = model_field.related_model
+        else:
+            if isinstance(nested, BaseSerializer) and path:
+                _walk(nested, current, prefix + '__'.join(path) + '__', select, prefetch, limit)
+
+
+def optimize(queryset, serializer, limit=True):
+    """
+    Apply the joins and prefetches ``serializer`` (a class or instance) needs.
+    Pass ``limit=False`` for detail views so capped lists come back whole.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    select = set()
+    prefetch = {}
+    _walk(serializer, queryset.model, '', select, prefetch, limit)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch.values())
+    return queryset
+
+
+class OptimizedQuerysetMixin:
+    """
+    Generic view mixin that optimizes the queryset for the view's serializer.
+    Hooks ``filter_queryset`` so views that override ``get_queryset`` are covered too.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        detail = (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+        return optimize(queryset, self.get_serializer_class(), limit=not detail)
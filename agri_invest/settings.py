@@ -57,6 +57,7 @@ INSTALLED_APPS = [
     'ecommerce',
     'storage',
     'admin_api',
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -218,6 +219,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
@@ -262,6 +264,52 @@ PAYSTACK_PUBLIC_KEY = 'pk_test_e0945fecdba378d883c456ed97949fb8dfac93ed'  # Repl
 #FRONTEND_URL = 'http://localhost:5173'  # Frontend URL for callbacks
 FRONTEND_URL = 'https://agric-investment.onrender.com/'  # Frontend URL for callbacks
 
+# How long a payment request's Idempotency-Key is remembered
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Key for the referral code permutation. Never change it once codes are issued.
+REFERRAL_CODE_KEY = 'agri-invest-referral-codes'
+
+# Server-Sent Events status stream (served from the ASGI app)
+STATUS_STREAM_POLL_SECONDS = 2
+STATUS_STREAM_HEARTBEAT_SECONDS = 15
+STATUS_STREAM_MAX_SECONDS = 300
+
+# Settled transactions and read notifications older than this are moved to
+# gzipped JSONL segments under ARCHIVE_ROOT by the archive_history command
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT', os.path.join(BASE_DIR, 'archive'))
+ARCHIVE_HORIZON_DAYS = 365
+ARCHIVE_BATCH_SIZE = 5000
+
+# Most ranked ids a full-text search returns to the viewset filtering on it
+SEARCH_RESULT_LIMIT = 200
+
+# How long storage stock stays held for an unpaid purchase before
+# release_expired_reservations puts it back
+STORAGE_RESERVATION_TTL_MINUTES = 30
+
+# Storage positions valued per NumPy batch by the mark-to-market engine
+STORAGE_VALUATION_BATCH_SIZE = 10000
+
+# StorageUpdate and Notification rows written per bulk_create by a plan broadcast
+STORAGE_BROADCAST_CHUNK_SIZE = 1000
+
+# Upload pipeline (agri_invest/imaging.py): limits, the stored size and the
+# variant sizes (longest side, in pixels) uploaded in the background
+IMAGE_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_DIMENSION = 1600
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 82
+IMAGE_VARIANTS = {
+    'thumb': 160,
+    'small': 480,
+    'medium': 960,
+}
+
+# Image URLs resolved for rows saved before <field>_url existed (agri_invest/media.py)
+MEDIA_URL_CACHE_SIZE = 4096
+
 
 SOCIAL_AUTH_GOOGLE_OAUTH2_REDIRECT_URI = FRONTEND_URL + '/google-callback'
 
@@ -19,10 +19,11 @@ from django.urls import path, include, re_path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from users.views import google_oauth_login, google_oauth_callback, custom_activation, submit_referral_code, submit_kyc, get_user_profile, get_user_profile_details
 from users.profile_views import update_profile_picture
+from users.event_views import status_stream
 from rest_framework.routers import DefaultRouter
 from users.views import NotificationViewSet, AdminUserViewSet, bank_account, FrontendAppView
 from ecommerce.views import ProductViewSet, OrderViewSet, CartViewSet, CartItemView, InitializePaymentView, VerifyPaymentView, PaystackWebhookView, PaymentCallbackView
-from storage.views import StoragePlanListView, StoragePlanDetailView, purchase_storage_plan,  MyInvestmentsView, InvestmentDetailView, dashboard_stats, verify_payment, paystack_webhook, mature_investment, AdminStorageInvestmentsView, AdminStorageInvestmentDetailView
+from storage.views import StoragePlanListView, StoragePlanDetailView, purchase_storage_plan,  MyInvestmentsView, InvestmentDetailView, dashboard_stats, verify_payment, paystack_webhook, mature_investment, AdminStorageInvestmentsView, AdminStorageInvestmentDetailView, storage_valuation, broadcast_storage_update
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -92,6 +93,7 @@ urlpatterns = [
     path('api/user/profile/', get_user_profile, name='get_user_profile'),
     path('api/user/profile-details/', get_user_profile_details, name='get_user_profile_details'),
     path('api/user/profile-picture/', update_profile_picture, name='update_profile_picture'),
+    path('api/user/status-stream/', status_stream, name='status_stream'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
@@ -116,8 +118,10 @@ urlpatterns = [
     path('api/storage/storage-plans/', StoragePlanListView.as_view(), name='storage-plans-list'),
     path('api/storage/storage-plans/<uuid:pk>/', StoragePlanDetailView.as_view(), name='storage-plan-detail'),
     path('api/storage/storage-plans/purchase/', purchase_storage_plan, name='purchase-storage-plan'),
+    path('api/storage/admin/storage-plans/<uuid:pk>/broadcast/', broadcast_storage_update, name='admin-storage-plan-broadcast'),
     path('api/storage/admin/investments/', AdminStorageInvestmentsView.as_view(), name='admin-storage-investments'),
     path('api/storage/admin/investments/<uuid:pk>/', AdminStorageInvestmentDetailView.as_view(), name='admin-storage-investment-detail'),
+    path('api/storage/admin/valuation/', storage_valuation, name='admin-storage-valuation'),
     path('api/storage/payment/verify/', verify_payment, name='verify-payment'),
     path('api/storage/webhooks/paystack/', paystack_webhook, name='paystack-webhook'),
 
@@ -11,6 +11,8 @@ class Product(models.Model):
     description = models.TextField()
     # image = models.ImageField(upload_to='product_images/')
     image = CloudinaryField('image', blank=True, null=True)
+    image_url = models.URLField(max_length=500, blank=True)  # see agri_invest/media.py
+    image_variants = models.JSONField(default=dict, blank=True)  # size name -> URL
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)  # Available quantity
     category = models.CharField(max_length=100, blank=True)
@@ -39,6 +41,11 @@ class Order(models.Model):
         ('cancelled', 'Cancelled')
     ], default='pending')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='ecommerce_order_user_created'),
+        ]
+
     def __str__(self):
         return f"Order {self.reference} - {self.email}"
 
@@ -59,6 +66,9 @@ class OrderItem(models.Model):
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Kept up to date by CartService
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)  # Units across all lines
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -1,5 +1,6 @@
 # ecommerce/serializers.py
 from rest_framework import serializers
+from agri_invest import imaging, media
 from .models import Product, Order, OrderItem, Cart, CartItem
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -7,16 +8,24 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = '__all__'
         extra_kwargs = {
-            'image': {'required': False}  # Make image not required for updates
+            'image': {'required': False},  # Make image not required for updates
+            'image_url': {'read_only': True},
+            'image_variants': {'read_only': True},
         }
 
+    def validate_image(self, value):
+        return imaging.clean(value)
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and instance.image:
-            data['image'] = request.build_absolute_uri(instance.image.url)
+        data['image'] = media.url_for(instance, 'image')
         return data
 
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        imaging.generate_variants(instance, 'image', validated_data.get('image'))
+        return instance
+
     def update(self, instance, validated_data):
         # Handle the image separately
         image = validated_data.pop('image', None)
@@ -31,6 +40,7 @@ class ProductSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         
         instance.save()
+        imaging.generate_variants(instance, 'image', image)
         return instance
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -52,6 +62,19 @@ class OrderItemSerializer(serializers.ModelSerializer):
         }
 
 
+class OrderHistorySerializer(serializers.ModelSerializer):
+    """Compact order row for history lists; expects the annotations added by OrderViewSet.history"""
+    item_count = serializers.IntegerField(read_only=True)
+    first_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ['id', 'reference', 'status', 'total_amount', 'item_count', 'first_image', 'created_at']
+
+    def get_first_image(self, obj):
+        return obj.first_image_url or media.resolve(obj.first_image) or None
+
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     full_name = serializers.SerializerMethodField()
@@ -77,6 +100,14 @@ class OrderSerializer(serializers.ModelSerializer):
             'total_amount': {'read_only': True},  # Should be calculated
         }
     
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only staff move an order through its statuses
+        request = self.context.get('request')
+        if not (request and request.user.is_staff):
+            fields['status'].read_only = True
+        return fields
+
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
 
@@ -113,9 +144,25 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    """Serializes a cart loaded by CartService.load(), whose lines carry their products"""
+    items = CartItemSerializer(many=True, read_only=True, source='lines')
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'updated_at']
-        read_only_fields = ['user']
\ No newline at end of file
+        fields = ['id', 'user', 'items', 'subtotal', 'item_count', 'updated_at']
+        read_only_fields = ['user', 'subtotal', 'item_count']
+
+
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class SetCartSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True)
+
+    def validate_items(self, value):
+        product_ids = [line['product_id'] for line in value]
+        if len(product_ids) != len(set(product_ids)):
+            raise serializers.ValidationError("Each product may appear only once.")
+        return value
\ No newline at end of file
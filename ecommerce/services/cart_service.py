@@ -0,0 +1,154 @@
+"""
+Cart reads and writes.
+
+Cart.subtotal and Cart.item_count are stored, so the cart badge and checkout
+summary never add up lines. Every change goes through CartService, which
+recomputes both with one correlated UPDATE. A product price change or
+deletion refreshes the carts holding it (see ecommerce/signals.py). Mutations
+respond with the changed line and the new totals rather than the whole cart.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Cart, CartItem, Product
+
+
+class CartError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _cart_totals(cart_ref):
+    """Subquery expressions for a cart's subtotal and unit count"""
+    lines = CartItem.objects.filter(cart=cart_ref).order_by().values('cart')
+    subtotal = lines.annotate(total=Sum(F('quantity') * F('product__price'))).values('total')
+    units = lines.annotate(total=Sum('quantity')).values('total')
+    return (
+        Coalesce(Subquery(subtotal), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        Coalesce(Subquery(units), Value(0)),
+    )
+
+
+def _product_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CartError('Product not found', status=404)
+
+
+def refresh_carts(carts):
+    """Recompute the stored totals of ``carts`` (a queryset) in one UPDATE"""
+    subtotal, item_count = _cart_totals(OuterRef('pk'))
+    return carts.update(subtotal=subtotal, item_count=item_count, updated_at=timezone.now())
+
+
+class CartService:
+    """Reads and changes a user's cart, keeping Cart.subtotal and Cart.item_count current"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        return cart
+
+    def load(self):
+        """The cart with its lines (products joined) on ``cart.lines``; one query when the cart has items"""
+        items = list(
+            CartItem.objects.filter(cart__user=self.user).select_related('cart', 'product').order_by('id')
+        )
+        cart = items[0].cart if items else self.get_cart()
+        cart.lines = items
+        return cart
+
+    def _refresh(self, cart):
+        refresh_carts(Cart.objects.filter(pk=cart.pk))
+        cart.refresh_from_db(fields=['subtotal', 'item_count', 'updated_at'])
+        return cart
+
+    def _totals(self, cart):
+        return {'subtotal': cart.subtotal, 'item_count': cart.item_count}
+
+    def _check_stock(self, product, quantity):
+        if quantity > product.stock:
+            raise CartError(f'Only {product.stock} units of {product.name} available in stock.')
+
+    def set_item(self, product_id, quantity):
+        """Set one line's quantity (0 removes it). Returns the line and the new cart totals."""
+        if quantity < 0:
+            raise CartError('Quantity cannot be negative.')
+        if quantity == 0:
+            return self.remove_item(product_id)
+        try:
+            product = Product.objects.get(id=_product_id(product_id), is_active=True)
+        except Product.DoesNotExist:
+            raise CartError('Product not found', status=404)
+        self._check_stock(product, quantity)
+
+        with transaction.atomic():
+            cart = self.get_cart()
+            CartItem.objects.update_or_create(cart=cart, product=product, defaults={'quantity': quantity})
+            self._refresh(cart)
+        return {
+            'product_id': product.id,
+            'quantity': quantity,
+            'line_total': product.price * quantity,
+            'removed': False,
+            'cart': self._totals(cart),
+        }
+
+    def remove_item(self, product_id):
+        product_id = _product_id(product_id)
+        with transaction.atomic():
+            cart = Cart.objects.filter(user=self.user).first()
+            if cart is None:
+                raise CartError('Cart not found', status=404)
+            CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+            self._refresh(cart)
+        return {
+            'product_id': product_id,
+            'quantity': 0,
+            'line_total': Decimal('0'),
+            'removed': True,
+            'cart': self._totals(cart),
+        }
+
+    def set_cart(self, lines):
+        """
+        Replace the whole cart with ``lines`` ({product_id: quantity}), e.g.
+        when a guest cart is synced at login. Nothing changes if any line is invalid.
+        """
+        if any(quantity < 0 for quantity in lines.values()):
+            raise CartError('Quantity cannot be negative.')
+        lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+        products = Product.objects.filter(is_active=True).in_bulk(list(lines))
+        missing = [str(product_id) for product_id in lines if product_id not in products]
+        if missing:
+            raise CartError(f"Products not found: {', '.join(missing)}", status=404)
+        for product_id, quantity in lines.items():
+            self._check_stock(products[product_id], quantity)
+
+        with transaction.atomic():
+            cart = self.get_cart()
+            cart.items.exclude(product_id__in=list(lines)).delete()
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in lines.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+            self._refresh(cart)
+        return cart
+
+    def clear(self):
+        cart = Cart.objects.filter(user=self.user).first()
+        if cart is not None:
+            with transaction.atomic():
+                cart.items.all().delete()
+                self._refresh(cart)
+        return cart
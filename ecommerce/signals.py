@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Cart, Product
+from .services.cart_service import refresh_carts
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    refresh_carts(Cart.objects.filter(items__product=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts(sender, instance, **kwargs):
+    instance._cart_ids = list(Cart.objects.filter(items__product=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def refresh_emptied_carts(sender, instance, **kwargs):
+    if getattr(instance, '_cart_ids', None):
+        refresh_carts(Cart.objects.filter(id__in=instance._cart_ids))
@@ -1,3 +1,224 @@
+import io
+from decimal import Decimal
+from unittest import mock
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.core.cache import cache
 from django.test import TestCase
+from PIL import Image
+from rest_framework.test import APIClient
+
+from agri_invest import imaging, media
+from users.models import User
+from users.tests import png_upload
+
+from .models import Cart, Order, OrderItem, Product
+from .serializers import ProductSerializer
+from .views import mark_order_cancelled, mark_order_paid, order_verifier
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+
+    @mock.patch('agri_invest.background.dispatch', side_effect=lambda task, *args: task(*args))
+    def test_variants_are_uploaded_at_each_size(self, _):
+        stored = CloudinaryResource('products/abc', format='webp', type='upload', resource_type='image', version='1')
+        product = Product.objects.create(name='Maize', description='Dry maize', price=1, image=stored)
+        sizes = []
+
+        def upload(content, **options):
+            sizes.append(max(Image.open(io.BytesIO(content)).size))
+            return {'secure_url': f'https://cdn/{len(sizes)}.webp'}
+
+        with mock.patch('agri_invest.imaging.uploader.upload', side_effect=upload), \
+             self.captureOnCommitCallbacks(execute=True):
+            imaging.generate_variants(product, 'image', imaging.clean(png_upload()))
+
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), {'thumb', 'small', 'medium'})
+        self.assertEqual(sorted(sizes), [160, 480, 960])
+
+
+class OrderTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='x')
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        pictured = Product.objects.create(
+            name='Maize', description='d', price=Decimal('10'), stock=5, image='image/upload/v1/maize.jpg'
+        )
+        plain = Product.objects.create(name='Beans', description='d', price=Decimal('10'), stock=5)
+        for i in range(25):
+            order = Order.objects.create(user=self.buyer, reference=f'ORD{i}', total_amount=30)
+            OrderItem.objects.create(order=order, product=pictured, quantity=1, price=10)
+            OrderItem.objects.create(order=order, product=plain, quantity=2, price=10)
+        self.others = Order.objects.create(reference='OTHER', total_amount=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_history_is_one_query_per_page(self):
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/orders/history/').json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertEqual(first['results'][0]['item_count'], 3)
+        self.assertIn('maize.jpg', first['results'][0]['first_image'])
+        self.assertEqual(len(self.client.get(first['next']).json()['results']), 5)
+
+    def test_buyers_see_only_their_orders(self):
+        self.assertEqual(len(self.client.get('/api/orders/').json()), 25)
+        self.assertEqual(self.client.get(f'/api/orders/{self.others.pk}/').status_code, 404)
+
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(len(self.client.get('/api/orders/').json()), 26)
+        self.assertEqual(APIClient().get('/api/orders/').status_code, 401)
+
+    def test_only_staff_change_an_order(self):
+        order = Order.objects.filter(user=self.buyer).first()
+        url = f'/api/orders/{order.pk}/'
+
+        self.assertEqual(self.client.patch(url, {'status': 'delivered', 'total_amount': '1'}).status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        response = self.client.post('/api/orders/', {'email': 'buyer@example.com', 'status': 'paid'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Order.objects.get(pk=response.data['id']).status, 'pending')
+
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.patch(url, {'status': 'delivered', 'total_amount': '1'}).status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.total_amount), ('delivered', Decimal('30')))
+
+
+class PaymentVerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.order = Order.objects.create(reference='ORD1', total_amount=Decimal('20'))
+
+    def verify(self):
+        return order_verifier.verify(Order.objects.get(pk=self.order.pk), mark_order_paid, mark_order_cancelled)
+
+    def gateway(self, status):
+        return mock.patch(
+            'investments.utils.paystack.verify_transaction',
+            return_value={'status': status, 'reference': self.order.reference, 'id': 1},
+        )
+
+    def test_repeat_verifications_share_one_gateway_call(self):
+        with self.gateway('success') as verify_transaction:
+            result, _ = self.verify()
+            self.assertEqual(result['status'], 'success')
+            self.assertTrue(result['verified'])
+
+            result, _ = self.verify()
+            self.assertFalse(result['verified'])
+
+            # A settled order answers from the database even with the cache gone
+            cache.clear()
+            result, _ = self.verify()
+            self.assertEqual(result['status'], 'success')
+        self.assertEqual(verify_transaction.call_count, 1)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'paid')
+
+    def test_abandoned_payment_leaves_the_order_pending(self):
+        with self.gateway('abandoned'):
+            result, order = self.verify()
+        self.assertEqual(result['status'], 'pending')
+        self.assertEqual(order.status, 'pending')
+
+    def test_verify_endpoint_and_callback(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='payer@example.com', password='x'))
+
+        with self.gateway('success') as verify_transaction:
+            for _ in range(3):
+                response = client.post('/api/payments/verify/', {'reference': 'ORD1'}, format='json')
+                self.assertEqual(response.data['status'], 'success')
+            response = client.get('/api/payments/callback/?reference=ORD1')
+            self.assertIn('status=success', response['Location'])
+        self.assertEqual(verify_transaction.call_count, 1)
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='shopper@example.com', password='x'))
+        self.products = [
+            Product.objects.create(name=f'Product {i}', description='d', price=Decimal('10.50') * (i + 1), stock=5)
+            for i in range(4)
+        ]
+
+    def set_line(self, product_id, quantity):
+        return self.client.post('/api/cart/items/', {'product_id': product_id, 'quantity': quantity}, format='json')
+
+    def test_line_changes_answer_with_the_new_totals(self):
+        response = self.set_line(self.products[0].id, 2)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['cart'], {'subtotal': Decimal('21.00'), 'item_count': 2})
+        self.assertEqual(self.set_line(self.products[0].id, 9).status_code, 400)
+        self.assertEqual(self.set_line(999, 1).status_code, 404)
+
+        response = self.client.delete('/api/cart/items/', {'product_id': self.products[0].id}, format='json')
+        self.assertTrue(response.data['removed'])
+        self.assertEqual(response.data['cart']['item_count'], 0)
+
+    def test_set_replaces_the_cart_and_totals_follow_products(self):
+        response = self.client.put(
+            '/api/cart/set/', {'items': [{'product_id': p.id, 'quantity': 1} for p in self.products[1:]]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['items']), 3)
+        self.assertEqual(Decimal(response.json()['subtotal']), Decimal('94.50'))
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/cart/').json()['items']), 3)
+
+        self.products[1].price = Decimal('1')
+        self.products[1].save()
+        self.assertEqual(Cart.objects.get().subtotal, Decimal('1') + Decimal('31.50') + Decimal('42.00'))
+        self.products[2].delete()
+        self.assertEqual(Cart.objects.get().item_count, 2)
+
+        duplicate = [{'product_id': self.products[3].id, 'quantity': 1}] * 2
+        self.assertEqual(self.client.put('/api/cart/set/', {'items': duplicate}, format='json').status_code, 400)
+
+
+def cloudinary_image(public_id):
+    return CloudinaryResource(public_id, format='webp', type='upload', resource_type='image', version='1')
+
+
+class StoredImageURLTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        media.resolve.cache_clear()
+
+    def test_url_is_stored_when_the_image_changes(self):
+        product = Product.objects.create(name='Maize', description='d', price=1, image=cloudinary_image('products/a'))
+        product.refresh_from_db()
+        self.assertIn('products/a', product.image_url)
+
+        product.image = cloudinary_image('products/b')
+        product.save()
+        product.refresh_from_db()
+        self.assertIn('products/b', product.image_url)
+
+    def test_serializing_stored_urls_builds_none(self):
+        for public_id in ('products/a', 'products/b'):
+            Product.objects.create(name='Maize', description='d', price=1, image=cloudinary_image(public_id))
+        Product.objects.create(name='Beans', description='d', price=1)
+        media.resolve.cache_clear()
+
+        with mock.patch.object(CloudinaryResource, 'build_url', side_effect=AssertionError):
+            data = ProductSerializer(Product.objects.all(), many=True).data
+        self.assertEqual(len([product for product in data if product['image']]), 2)
+
+    def test_rows_without_a_stored_url_resolve_each_image_once(self):
+        for _ in range(3):
+            Product.objects.create(name='Maize', description='d', price=1, image=cloudinary_image('products/same'))
+        Product.objects.update(image_url='')
+        media.resolve.cache_clear()
 
-# Create your tests here.
+        data = ProductSerializer(Product.objects.all(), many=True).data
+        self.assertTrue(all('products/same' in product['image'] for product in data))
+        self.assertEqual(media.resolve.cache_info().misses, 1)
@@ -1,10 +1,14 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from .models import Product, Order, Cart, CartItem, OrderItem
-from .serializers import ProductSerializer, OrderSerializer, CartSerializer, CartItemSerializer
+from .serializers import (
+    ProductSerializer, OrderSerializer, OrderHistorySerializer, CartSerializer, CartItemSerializer, SetCartSerializer
+)
+from .services.cart_service import CartError, CartService
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
 
 import requests
@@ -17,7 +21,36 @@ from django.utils.decorators import method_decorator
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import redirect
+from investments.utils.idempotency import idempotent
+from investments.utils.paystack import PaystackError
+from investments.utils.verification import VerificationCoordinator
+from search import index as search_index
+from agri_invest.pagination import NewestFirstCursorPagination, OptionalCursorPagination
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
+order_verifier = VerificationCoordinator(
+    Order, 'reference',
+    success_statuses=['paid', 'delivered'],
+    failure_statuses=['cancelled'],
+)
+
+
+def mark_order_paid(order, data):
+    """Mark a verified order paid and take its items out of stock"""
+    order.status = 'paid'
+    order.paystack_reference = data['reference']
+    order.save()
+
+    for item in order.items.all():
+        if item.product and item.product.stock >= item.quantity:
+            item.product.stock -= item.quantity
+            item.product.save()
+
+
+def mark_order_cancelled(order, data):
+    order.status = 'cancelled'
+    order.save()
 
 
 # Create your views here.
@@ -31,10 +64,15 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         # Admins see all products
         if user.is_staff or user.is_superuser:
-            return Product.objects.all()
-        
-        # Regular users see only active ones
-        return Product.objects.filter(is_active=True)
+            queryset = Product.objects.all()
+        else:
+            # Regular users see only active ones
+            queryset = Product.objects.filter(is_active=True)
+
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_index.filter_queryset(queryset, 'product', search)
+        return queryset
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -45,9 +83,37 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+    """Staff see every order, everyone else only their own"""
     serializer_class = OrderSerializer
-    permission_classes = [IsAuthenticatedOrReadOnly]
+    permission_classes = [IsAuthenticated]
+    pagination_class = OptionalCursorPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related('items__product')
+        return queryset.order_by('-created_at', '-id')
+
+    def get_permissions(self):
+        # Buyers place and read orders; changing or deleting one is for staff
+        if self.action in ('update', 'partial_update', 'destroy'):
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """The user's own orders, newest first, as compact rows with keyset pagination"""
+        first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id')
+        orders = Order.objects.filter(user=request.user).annotate(
+            item_count=Coalesce(Sum('items__quantity'), 0),
+            first_image=Subquery(first_item.values('product__image')[:1]),
+            first_image_url=Subquery(first_item.values('product__image_url')[:1]),
+        )
+
+        paginator = NewestFirstCursorPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        return paginator.get_paginated_response(OrderHistorySerializer(page, many=True).data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -63,58 +129,54 @@ class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def list(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
+        serializer = CartSerializer(CartService(request.user).load())
         return Response(serializer.data)
 
+    @action(detail=False, methods=['put'], url_path='set')
+    def set_cart(self, request):
+        """Replace the cart's contents, e.g. with a guest cart after login"""
+        serializer = SetCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        service = CartService(request.user)
+        try:
+            service.set_cart({line['product_id']: line['quantity'] for line in serializer.validated_data['items']})
+        except CartError as e:
+            return Response({'error': str(e)}, status=e.status)
+        return Response(CartSerializer(service.load()).data, status=status.HTTP_200_OK)
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CartItemView(APIView):
+    """Changes one cart line and responds with that line and the new cart totals"""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         """Add or update item in cart"""
-        product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
-
         try:
-            product = Product.objects.get(id=product_id, is_active=True)
-        except Product.DoesNotExist:
-            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        if quantity > product.stock:
-            return Response(
-                {'error': f'Only {product.stock} units available in stock.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'Quantity must be a whole number.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
             # Always set to the specified quantity (not add to it)
-            cart_item.quantity = quantity
-            cart_item.save()
-
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+            delta = CartService(request.user).set_item(request.data.get('product_id'), quantity)
+        except CartError as e:
+            return Response({'error': str(e)}, status=e.status)
+        return Response(delta, status=status.HTTP_200_OK)
 
     def delete(self, request):
         """Remove item from cart"""
-        product_id = request.data.get('product_id')
-        cart = Cart.objects.filter(user=request.user).first()
-        if not cart:
-            return Response({'detail': 'Cart not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        CartItem.objects.filter(cart=cart, product_id=product_id).delete()
-        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+        try:
+            delta = CartService(request.user).remove_item(request.data.get('product_id'))
+        except CartError as e:
+            return Response({'detail': str(e)}, status=e.status)
+        return Response(delta, status=status.HTTP_200_OK)
 
 
 class InitializePaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         try:
             print("InitializePaymentView: Starting payment initialization")
@@ -242,57 +304,28 @@ class VerifyPaymentView(APIView):
                     'error': 'Order not found'
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Verify payment with Paystack
-            headers = {
-                'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
-                'Content-Type': 'application/json',
-            }
-
-            response = requests.get(
-                f'https://api.paystack.co/transaction/verify/{reference}',
-                headers=headers
-            )
+            result, order = order_verifier.verify(order, mark_order_paid, mark_order_cancelled)
 
-            if response.status_code == 200:
-                paystack_data = response.json()
-                
-                if paystack_data['data']['status'] == 'success':
-                    # Update order status
-                    order.status = 'paid'
-                    order.paystack_reference = paystack_data['data']['reference']
-                    order.save()
-
-                    for item in order.items.all():
-                        if item.product and item.product.stock >= item.quantity:
-                            item.product.stock -= item.quantity
-                            item.product.save()
-
-                    # Clear user's cart if authenticated
-                    if request.user.is_authenticated:
-                        try:
-                            cart = Cart.objects.get(user=request.user)
-                            cart.items.all().delete()
-
-                        except Cart.DoesNotExist:
-                            pass
+            if result['status'] == 'success':
+                # Clear user's cart if authenticated
+                if request.user.is_authenticated:
+                    CartService(request.user).clear()
 
-                    return Response({
-                        'status': 'success',
-                        'message': 'Payment verified successfully',
-                        'order_id': order.id
-                    })
-                else:
-                    order.status = 'cancelled'
-                    order.save()
-                    return Response({
-                        'status': 'failed',
-                        'message': 'Payment verification failed'
-                    })
+                return Response({
+                    'status': 'success',
+                    'message': result['message'],
+                    'order_id': order.id
+                })
             else:
                 return Response({
-                    'error': 'Failed to verify payment'
-                }, status=status.HTTP_400_BAD_REQUEST)
+                    'status': result['status'],
+                    'message': result['message']
+                })
 
+        except (PaystackError, requests.RequestException):
+            return Response({
+                'error': 'Failed to verify payment'
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -328,8 +361,10 @@ class PaystackWebhookView(APIView):
                 reference = data['data']['reference']
                 try:
                     order = Order.objects.get(reference=reference)
-                    order.status = 'confirmed'
-                    order.save()
+                    if order.status == 'pending':
+                        order.status = 'paid'
+                        order.paystack_reference = data['data']['reference']
+                        order.save()
                 except Order.DoesNotExist:
                     pass
 
@@ -350,37 +385,21 @@ class PaymentCallbackView(APIView):
             return redirect(f"{settings.FRONTEND_URL}/payment-success?status=error&message=No reference provided")
 
         try:
-            # Verify the payment
-            headers = {
-                "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-                "Content-Type": "application/json",
-            }
+            order = Order.objects.get(reference=reference)
+        except Order.DoesNotExist:
+            return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message=Order not found")
 
-            response = requests.get(
-                f"https://api.paystack.co/transaction/verify/{reference}",
-                headers=headers
-            )
+        try:
+            result, order = order_verifier.verify(order, mark_order_paid, mark_order_cancelled)
 
-            if response.status_code == 200:
-                paystack_data = response.json()
-
-                if paystack_data["data"]["status"] == "success":
-                    # Update order status
-                    try:
-                        order = Order.objects.get(reference=reference)
-                        order.status = "paid"
-                        order.paystack_reference = paystack_data["data"]["reference"]
-                        order.save()
-                    except Order.DoesNotExist:
-                        pass
-
-                    # Redirect to frontend success page
-                    return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=success")
-                else:
-                    # Payment failed
-                    return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message=Payment failed")
+            if result["status"] == "success":
+                # Redirect to frontend success page
+                return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=success")
             else:
-                return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message=Verification failed")
+                # Payment failed
+                return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message=Payment failed")
 
+        except (PaystackError, requests.RequestException):
+            return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message=Verification failed")
         except Exception as e:
             return redirect(f"{settings.FRONTEND_URL}/payment-success?reference={reference}&status=error&message={str(e)}")
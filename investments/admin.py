@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest, BankAccount
+from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest, BankAccount, PayoutBatch, PayoutItem, IdempotencyKey, ArchiveSegment, ArchiveSegmentUser, TransactionArchiveSummary, MaturityBucket
 
 admin.site.register(InvestmentPackage)
 admin.site.register(Investment)
@@ -8,3 +8,10 @@ admin.site.register(Portfolio)
 admin.site.register(Payment)
 admin.site.register(WithdrawalRequest)
 admin.site.register(BankAccount)
+admin.site.register(PayoutBatch)
+admin.site.register(PayoutItem)
+admin.site.register(IdempotencyKey)
+admin.site.register(ArchiveSegment)
+admin.site.register(ArchiveSegmentUser)
+admin.site.register(TransactionArchiveSummary)
+admin.site.register(MaturityBucket)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from investments.services import archive
+
+
+class Command(BaseCommand):
+    help = 'Move settled transactions and read notifications older than the retention horizon into archive segments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['transaction', 'notification', 'all'], default='all')
+        parser.add_argument('--days', type=int, help='Retention horizon (default: ARCHIVE_HORIZON_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows per segment (default: ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        kinds = ['transaction', 'notification'] if options['kind'] == 'all' else [options['kind']]
+        for kind in kinds:
+            count = archive.archive(kind, options['days'], options['batch_size'], options['dry_run'])
+            verb = 'Would archive' if options['dry_run'] else 'Archived'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {count} {kind} rows.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from investments.services.payout_service import PayoutService
+
+class Command(BaseCommand):
+    help = 'Pay out approved withdrawals through Paystack bulk transfers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Only pay these withdrawal ids')
+        parser.add_argument(
+            '--sync-pending',
+            action='store_true',
+            help='Verify transfers still waiting for a webhook instead of sending new ones'
+        )
+
+    def handle(self, *args, **options):
+        service = PayoutService()
+
+        if options['sync_pending']:
+            updated = service.sync_pending()
+            self.stdout.write(self.style.SUCCESS(f'Updated {updated} pending transfers.'))
+            return
+
+        batches, skipped = service.run(options['ids'])
+        for batch in batches:
+            self.stdout.write(f'Batch {batch.id}: {batch.item_count} transfers, ₦{batch.total_amount} - {batch.status}')
+        for entry in skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped withdrawal {entry['withdrawal_id']}: {entry['error']}"))
+        self.stdout.write(self.style.SUCCESS(f'Done. Sent {len(batches)} payout batches.'))
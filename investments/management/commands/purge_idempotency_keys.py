@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from investments.models import IdempotencyKey
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records.'
+
+    def handle(self, *args, **options):
+        count, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} expired idempotency keys.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from investments.services import maturity_calendar
+
+
+class Command(BaseCommand):
+    help = 'Recompute the maturity calendar buckets from the crop and storage investment tables.'
+
+    def handle(self, *args, **options):
+        count = maturity_calendar.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} maturity calendar buckets.'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0016_archive_segments'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investmentpackage',
+            index=models.Index(fields=['status', 'category', 'risk_level'], name='investments_status_d21c4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='investmentpackage',
+            index=models.Index(fields=['status', 'interest_rate'], name='investments_status_45fe5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='investmentpackage',
+            index=models.Index(fields=['status', 'duration_months'], name='investments_status_961c55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='investmentpackage',
+            index=models.Index(fields=['status', 'min_amount', 'max_amount'], name='investments_status_cca1c5_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:52
+
+from django.db import migrations, models
+
+
+def fill_buckets(apps, schema_editor):
+    from investments.services import maturity_calendar
+    maturity_calendar.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0017_package_catalog_indexes'),
+        ('storage', '0005_storage_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaturityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+                ('kind', models.CharField(choices=[('crop', 'Crop Investment'), ('storage', 'Storage Investment')], max_length=10)),
+                ('positions', models.IntegerField(default=0)),
+                ('principal', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('payout', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+            ],
+            options={
+                'ordering': ['due_date', 'kind'],
+                'constraints': [models.UniqueConstraint(fields=('due_date', 'kind'), name='unique_maturity_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0018_maturity_calendar'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='payoutitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'queued'])), fields=('withdrawal',), name='unique_open_payout_per_withdrawal'),
+        ),
+    ]
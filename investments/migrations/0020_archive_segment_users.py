@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-19 00:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0019_payout_item_open_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegmentUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.PositiveBigIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('oldest_created_at', models.DateTimeField()),
+                ('newest_created_at', models.DateTimeField()),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_ranges', to='investments.archivesegment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_ranges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['segment', 'offset'],
+                'indexes': [models.Index(fields=['user', 'oldest_created_at', 'newest_created_at'], name='investments_user_id_b902a6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('segment', 'user'), name='unique_archive_segment_user')],
+            },
+        ),
+    ]
@@ -1,10 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 
 from django.forms import ValidationError
-from referrals.models import Referral, ReferralEarning
 
 User = get_user_model()
 
@@ -66,6 +66,12 @@ class InvestmentPackage(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'category', 'risk_level']),
+            models.Index(fields=['status', 'interest_rate']),
+            models.Index(fields=['status', 'duration_months']),
+            models.Index(fields=['status', 'min_amount', 'max_amount']),
+        ]
     
     def __str__(self):
         return self.name
@@ -146,27 +152,8 @@ class Investment(models.Model):
             package = self.package
             if package:
                 self.expected_return = self.amount * (package.interest_rate / 100)
-        is_new = self._state.adding
+        # Referral earnings are booked by the accrue_referral_earnings job
         super().save(*args, **kwargs)
-
-        # Referral logic: Only on creation
-        if is_new:
-            # Check if this user has a pending referral
-            try:
-                referral = Referral.objects.get(referred_user=self.user, status='pending')
-                # Activate referral
-                referral.activate()
-                # Create referral earning for this investment
-                earning_amount = self.amount * (referral.commission_rate / 100)
-                ReferralEarning.objects.create(
-                    referral=referral,
-                    investment=self,
-                    amount=earning_amount,
-                    commission_rate=referral.commission_rate,
-                    status='pending',
-                )
-            except Referral.DoesNotExist:
-                pass
     
     @property
     def is_active(self):
@@ -414,7 +401,10 @@ class BankAccount(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='bank_account')
     account_number = models.CharField(max_length=10)
     bank_name = models.CharField(max_length=30)  
+    bank_code = models.CharField(max_length=10, blank=True)
     account_name = models.CharField(max_length=100, blank=True, null=True)
+    # Paystack transfer recipient, cached so payouts don't recreate it every time
+    recipient_code = models.CharField(max_length=50, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
@@ -423,3 +413,196 @@ class BankAccount(models.Model):
 
     def __str__(self):
         return f"{self.account_name} - {self.account_number}"
+
+
+class PayoutBatch(models.Model):
+    """A group of approved withdrawals sent to Paystack as one bulk transfer"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('partial', 'Partially Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payout_batches')
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Payout batch {self.id} - {self.item_count} items - {self.status}"
+
+
+class PayoutItem(models.Model):
+    """A single transfer inside a payout batch, tracked through transfer webhooks"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('queued', 'Queued'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+        ('reversed', 'Reversed'),
+    ]
+    OPEN_STATUSES = ['pending', 'queued']
+
+    batch = models.ForeignKey(PayoutBatch, on_delete=models.CASCADE, related_name='items')
+    withdrawal = models.ForeignKey(WithdrawalRequest, on_delete=models.CASCADE, related_name='payout_items')
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.SET_NULL, null=True, blank=True, related_name='payout_items')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=100, unique=True)
+    recipient_code = models.CharField(max_length=50)
+    transfer_code = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
+    failure_reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # A withdrawal has at most one transfer in flight
+            models.UniqueConstraint(
+                fields=['withdrawal'],
+                condition=models.Q(status__in=['pending', 'queued']),
+                name='unique_open_payout_per_withdrawal',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} - {self.amount} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a payment-initiating request, replayed on client retries"""
+
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.key} - {self.status}"
+
+
+class ArchiveSegment(models.Model):
+    """A gzipped JSONL file holding one batch of rows moved out of a hot table"""
+
+    KIND_CHOICES = [
+        ('transaction', 'Transaction'),
+        ('notification', 'Notification'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    path = models.CharField(max_length=255, unique=True)
+    row_count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    oldest_created_at = models.DateTimeField()
+    newest_created_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['kind', 'first_id']
+        indexes = [
+            models.Index(fields=['kind', 'oldest_created_at', 'newest_created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.first_id}-{self.last_id} ({self.row_count})"
+
+
+class ArchiveSegmentUser(models.Model):
+    """Where one user's rows sit in a segment: a gzip member of their own, read without inflating the rest"""
+
+    segment = models.ForeignKey(ArchiveSegment, on_delete=models.CASCADE, related_name='user_ranges')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archive_ranges')
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveIntegerField()
+    row_count = models.PositiveIntegerField()
+    oldest_created_at = models.DateTimeField()
+    newest_created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['segment', 'offset']
+        constraints = [
+            models.UniqueConstraint(fields=['segment', 'user'], name='unique_archive_segment_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'oldest_created_at', 'newest_created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.segment} user {self.user_id} ({self.row_count})"
+
+
+class TransactionArchiveSummary(models.Model):
+    """Running totals of a user's archived transactions, so aggregates stay correct"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction_archive_summaries')
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TYPE_CHOICES)
+    status = models.CharField(max_length=15, choices=Transaction.STATUS_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'transaction_type', 'status'],
+                name='unique_transaction_archive_summary',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.transaction_type}/{self.status}: {self.count}"
+
+
+class MaturityBucket(models.Model):
+    """
+    Payout liability falling due on one day, per kind of position.
+    Maintained incrementally by signals; see services/maturity_calendar.py.
+    """
+
+    KIND_CHOICES = [
+        ('crop', 'Crop Investment'),
+        ('storage', 'Storage Investment'),
+    ]
+
+    due_date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    positions = models.IntegerField(default=0)
+    principal = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    payout = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['due_date', 'kind']
+        constraints = [
+            models.UniqueConstraint(fields=['due_date', 'kind'], name='unique_maturity_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.due_date} {self.kind}: {self.positions} due, {self.payout}"
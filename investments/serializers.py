@@ -1,10 +1,13 @@
+import uuid
 from django.utils import timezone
 from django.forms import ValidationError
 from rest_framework import serializers
-from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest, BankAccount
+from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest, BankAccount, PayoutBatch, PayoutItem
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer as DjoserUserCreateSerializer
 from referrals.models import ReferralCode, Referral
+from agri_invest import imaging, media
+from .services import projections
 
 User = get_user_model()
 
@@ -55,7 +58,7 @@ class InvestmentPackageSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create a new package with proper defaults"""
-        from datetime import date, timedelta
+        from datetime import date
 
         # Set available_slots to total_slots if not provided
         if 'available_slots' not in validated_data and 'total_slots' in validated_data:
@@ -74,7 +77,7 @@ class InvestmentPackageSerializer(serializers.ModelSerializer):
             validated_data['start_date'] = date.today()
         if 'end_date' not in validated_data:
             duration_months = validated_data.get('duration_months', 1)
-            validated_data['end_date'] = validated_data['start_date'] + timedelta(days=duration_months * 30)
+            validated_data['end_date'] = projections.maturity_date(validated_data['start_date'], duration_months)
 
         return super().create(validated_data)
 
@@ -205,9 +208,9 @@ class InvestmentCreateSerializer(serializers.ModelSerializer):
         package = validated_data['package']
         
         # Calculate dates
-        from datetime import date, timedelta
+        from datetime import date
         start_date = date.today()
-        end_date = start_date + timedelta(days=package.duration_months * 30)
+        end_date = projections.maturity_date(start_date, package.duration_months)
         
         # Create investment
         investment = Investment.objects.create(
@@ -274,10 +277,19 @@ class UserInvestmentSummarySerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
-            'id', 'email', 'first_name', 'last_name', 'phone', 'profile_picture', 'is_staff', 'is_superuser',
-            'total_investments', 'active_investments', 'total_invested',
+            'id', 'email', 'first_name', 'last_name', 'phone', 'profile_picture', 'profile_picture_variants',
+            'is_staff', 'is_superuser', 'total_investments', 'active_investments', 'total_invested',
             'total_returns', 'portfolio_value', 'referred_by'
         ]
+        read_only_fields = ['profile_picture_variants']
+
+    def validate_profile_picture(self, value):
+        return imaging.clean(value)
+
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        imaging.generate_variants(instance, 'profile_picture', validated_data.get('profile_picture'))
+        return instance
 
     def get_total_investments(self, obj):
         return obj.investments.count()
@@ -315,11 +327,7 @@ class UserInvestmentSummarySerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and instance.profile_picture and instance.profile_picture != 'default.jpg':
-            data['profile_picture'] = request.build_absolute_uri(instance.profile_picture.url)
-        else:
-            data['profile_picture'] = None
+        data['profile_picture'] = media.url_for(instance, 'profile_picture')
         return data
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -384,7 +392,7 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         investment = validated_data.pop('_investment_object')
         
         # Generate unique reference
-        reference = f"INV_{investment.id}_{int(time.time())}"
+        reference = f"INV_{investment.id}_{uuid.uuid4().hex[:12].upper()}"
         
         # Create payment with reference
         payment = Payment.objects.create(
@@ -406,6 +414,9 @@ class CustomUserCreateSerializer(DjoserUserCreateSerializer):
     class Meta(DjoserUserCreateSerializer.Meta):
         fields = DjoserUserCreateSerializer.Meta.fields + ('referral_code', 'phone', 'profile_picture')
 
+    def validate_profile_picture(self, value):
+        return imaging.clean(value)
+
     def create(self, validated_data):
         referral_code_value = validated_data.pop('referral_code', None)
         phone_value = validated_data.pop('phone', None)
@@ -421,6 +432,7 @@ class CustomUserCreateSerializer(DjoserUserCreateSerializer):
             user.profile_picture = profile_picture_value
 
         user.save()
+        imaging.generate_variants(user, 'profile_picture', profile_picture_value)
 
         # Auto-create a referral code for the new user
         ReferralCode.objects.get_or_create(user=user)
@@ -448,9 +460,18 @@ class CustomUserCreateSerializer(DjoserUserCreateSerializer):
 class BankAccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = BankAccount
-        fields = ['id', 'account_number', 'bank_name', 'account_name', 'created_at']
+        fields = ['id', 'account_number', 'bank_name', 'bank_code', 'account_name', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def update(self, instance, validated_data):
+        # A cached transfer recipient points at the old account details
+        for field in ('account_number', 'bank_name', 'bank_code', 'account_name'):
+            if field in validated_data and validated_data[field] != getattr(instance, field):
+                validated_data['recipient_code'] = ''
+                if field == 'bank_name' and 'bank_code' not in validated_data:
+                    validated_data['bank_code'] = ''
+        return super().update(instance, validated_data)
+
 class UserSerializer(serializers.ModelSerializer):
     bank_account = BankAccountSerializer(read_only=True)
 
@@ -485,6 +506,26 @@ class WithdrawalRequestSerializer(serializers.ModelSerializer):
             return obj.available_balance
         return None
 
+class PayoutItemSerializer(serializers.ModelSerializer):
+    user_email = serializers.CharField(source='withdrawal.user.email', read_only=True)
+
+    class Meta:
+        model = PayoutItem
+        fields = [
+            'id', 'withdrawal', 'user_email', 'amount', 'reference',
+            'transfer_code', 'status', 'failure_reason', 'created_at', 'updated_at'
+        ]
+
+class PayoutBatchSerializer(serializers.ModelSerializer):
+    items = PayoutItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PayoutBatch
+        fields = [
+            'id', 'status', 'total_amount', 'item_count', 'error_message',
+            'created_by', 'created_at', 'updated_at', 'items'
+        ]
+
 class CreateWithdrawalRequestSerializer(serializers.Serializer):
     type = serializers.ChoiceField(choices=WithdrawalRequest.TYPE_CHOICES)
     investment_ids = serializers.ListField(
@@ -547,9 +588,9 @@ class AdminInvestmentCreateSerializer(serializers.ModelSerializer):
         status = validated_data.get('status', 'active')
 
         # Calculate dates
-        from datetime import date, timedelta
+        from datetime import date
         start_date = date.today()
-        end_date = start_date + timedelta(days=package.duration_months * 30)
+        end_date = projections.maturity_date(start_date, package.duration_months)
 
         # Create investment
         investment = Investment.objects.create(
@@ -0,0 +1,239 @@
+"""
+Retention for the append-only Transaction and Notification tables.
+
+Rows older than ``ARCHIVE_HORIZON_DAYS`` are written, a batch at a time, to a
+gzipped JSONL segment under ``ARCHIVE_ROOT`` and then deleted from the hot
+table. Only settled rows move: pending transactions and unread notifications
+stay put. Archived transactions are folded into TransactionArchiveSummary so
+per-user totals keep adding up, and ``statement`` reads segments back on
+demand.
+
+Each user's rows in a segment are a gzip member of their own, located by an
+ArchiveSegmentUser row, so a statement inflates only that user's rows. The
+file as a whole still reads as one gzip stream.
+"""
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import Notification
+from ..models import ArchiveSegment, ArchiveSegmentUser, Investment, Transaction, TransactionArchiveSummary
+
+logger = logging.getLogger(__name__)
+
+SETTLED_TRANSACTION_STATUSES = ['completed', 'failed', 'cancelled']
+
+TRANSACTION_FIELDS = [
+    'id', 'user_id', 'investment_id', 'transaction_type', 'amount', 'status',
+    'payment_method', 'payment_reference', 'created_at', 'completed_at', 'description',
+]
+NOTIFICATION_FIELDS = ['id', 'user_id', 'notification_type', 'message', 'is_read', 'created_at', 'read_at']
+
+
+def archivable_transactions(cutoff):
+    return Transaction.objects.filter(
+        created_at__lt=cutoff,
+        status__in=SETTLED_TRANSACTION_STATUSES,
+        # Bonus awards point at their transaction; keep those rows live
+        referral_bonus_award__isnull=True,
+    )
+
+
+def archivable_notifications(cutoff):
+    return Notification.objects.filter(created_at__lt=cutoff, is_read=True)
+
+
+KINDS = {
+    'transaction': (archivable_transactions, TRANSACTION_FIELDS),
+    'notification': (archivable_notifications, NOTIFICATION_FIELDS),
+}
+
+
+def _segment_path(kind, rows):
+    month = rows[0]['created_at'].strftime('%Y%m')
+    return os.path.join(kind, month, f"{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz")
+
+
+def _write_segment(relative_path, rows):
+    """Write ``rows`` as one gzip member per user. Returns the path and the user ranges (unsaved)."""
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row['user_id']].append(row)
+
+    path = os.path.join(settings.ARCHIVE_ROOT, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    ranges = []
+    with open(tmp_path, 'wb') as fh:
+        for user_id, user_rows in by_user.items():
+            member = gzip.compress(''.join(
+                json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n' for row in user_rows
+            ).encode('utf-8'))
+            ranges.append(ArchiveSegmentUser(
+                user_id=user_id,
+                offset=fh.tell(),
+                length=len(member),
+                row_count=len(user_rows),
+                oldest_created_at=min(row['created_at'] for row in user_rows),
+                newest_created_at=max(row['created_at'] for row in user_rows),
+            ))
+            fh.write(member)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+    return path, ranges
+
+
+def _read_segment(segment):
+    with gzip.open(os.path.join(settings.ARCHIVE_ROOT, segment.path), 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            yield json.loads(line)
+
+
+def _read_user_range(user_range):
+    with open(os.path.join(settings.ARCHIVE_ROOT, user_range.segment.path), 'rb') as fh:
+        fh.seek(user_range.offset)
+        member = fh.read(user_range.length)
+    return [json.loads(line) for line in gzip.decompress(member).decode('utf-8').splitlines()]
+
+
+def _add_to_summaries(rows):
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    for row in rows:
+        entry = totals[(row['user_id'], row['transaction_type'], row['status'])]
+        entry[0] += 1
+        entry[1] += row['amount']
+
+    TransactionArchiveSummary.objects.bulk_create([
+        TransactionArchiveSummary(user_id=user_id, transaction_type=tx_type, status=tx_status)
+        for user_id, tx_type, tx_status in totals
+    ], ignore_conflicts=True)
+    for (user_id, tx_type, tx_status), (count, amount) in totals.items():
+        TransactionArchiveSummary.objects.filter(
+            user_id=user_id, transaction_type=tx_type, status=tx_status
+        ).update(count=F('count') + count, total_amount=F('total_amount') + amount)
+
+
+def archive_batch(kind, cutoff, batch_size):
+    """Move the oldest ``batch_size`` archivable rows of ``kind`` into a new segment. Returns the row count."""
+    queryset_for, fields = KINDS[kind]
+    rows = list(queryset_for(cutoff).order_by('id').values(*fields)[:batch_size])
+    if not rows:
+        return 0
+
+    relative_path = _segment_path(kind, rows)
+    path, user_ranges = _write_segment(relative_path, rows)
+    ids = [row['id'] for row in rows]
+    try:
+        with transaction.atomic():
+            segment = ArchiveSegment.objects.create(
+                kind=kind,
+                path=relative_path,
+                row_count=len(rows),
+                first_id=ids[0],
+                last_id=ids[-1],
+                oldest_created_at=min(row['created_at'] for row in rows),
+                newest_created_at=max(row['created_at'] for row in rows),
+            )
+            for user_range in user_ranges:
+                user_range.segment = segment
+            ArchiveSegmentUser.objects.bulk_create(user_ranges)
+            if kind == 'transaction':
+                _add_to_summaries(rows)
+            queryset_for(cutoff).filter(id__in=ids).delete()
+    except Exception:
+        os.remove(path)
+        raise
+    return len(rows)
+
+
+def archive(kind, days=None, batch_size=None, dry_run=False):
+    """Archive everything of ``kind`` older than the horizon. Returns the number of rows moved (or eligible)."""
+    days = settings.ARCHIVE_HORIZON_DAYS if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+
+    queryset_for, _ = KINDS[kind]
+    if dry_run:
+        return queryset_for(cutoff).count()
+
+    total = 0
+    while True:
+        moved = archive_batch(kind, cutoff, batch_size)
+        if not moved:
+            return total
+        total += moved
+        logger.info("Archived %s %s rows (%s so far)", moved, kind, total)
+
+
+def archived_totals(user=None, **filters):
+    """Count and amount of archived transactions, optionally for one user"""
+    summaries = TransactionArchiveSummary.objects.filter(**filters)
+    if user is not None:
+        summaries = summaries.filter(user=user)
+    totals = summaries.aggregate(count=Sum('count'), amount=Sum('total_amount'))
+    return {'count': totals['count'] or 0, 'amount': totals['amount'] or Decimal('0')}
+
+
+def archived_transactions(user, start=None, end=None):
+    """Rehydrate a user's archived transactions in [start, end) as unsaved Transaction instances"""
+    user_ranges = ArchiveSegmentUser.objects.filter(segment__kind='transaction', user=user).select_related('segment')
+    # Segments written before ranges were recorded are read whole
+    unranged = ArchiveSegment.objects.filter(kind='transaction', user_ranges__isnull=True)
+    if start:
+        user_ranges = user_ranges.filter(newest_created_at__gte=start)
+        unranged = unranged.filter(newest_created_at__gte=start)
+    if end:
+        user_ranges = user_ranges.filter(oldest_created_at__lt=end)
+        unranged = unranged.filter(oldest_created_at__lt=end)
+
+    sources = [(user_range.segment, _read_user_range, user_range) for user_range in user_ranges]
+    sources += [(segment, _read_segment, segment) for segment in unranged]
+    for segment, read, source in sources:
+        try:
+            rows = list(read(source))
+        except OSError:
+            logger.exception("Archive segment %s is unreadable", segment.path)
+            continue
+        for row in rows:
+            if row['user_id'] != user.id:
+                continue
+            for field in ('created_at', 'completed_at'):
+                if row[field]:
+                    row[field] = parse_datetime(row[field])
+            if (start and row['created_at'] < start) or (end and row['created_at'] >= end):
+                continue
+            row['amount'] = Decimal(row['amount'])
+            yield Transaction(**row)
+
+
+def statement(user, start=None, end=None):
+    """Live and archived transactions for a statement period, newest first"""
+    live = Transaction.objects.filter(user=user).select_related('investment__package')
+    if start:
+        live = live.filter(created_at__gte=start)
+    if end:
+        live = live.filter(created_at__lt=end)
+
+    archived = list(archived_transactions(user, start, end))
+    investments = Investment.objects.select_related('package').in_bulk(
+        {tx.investment_id for tx in archived if tx.investment_id}
+    )
+    for tx in archived:
+        # The investment may have been deleted since the row was archived
+        tx.investment = investments.get(tx.investment_id)
+
+    rows = list(live) + archived
+    rows.sort(key=lambda tx: (tx.created_at, tx.id), reverse=True)
+    return rows
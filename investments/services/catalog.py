@@ -0,0 +1,130 @@
+"""
+Query engine behind the investment package browse screen.
+
+A browse is two queries whatever the filters: the sorted page of packages,
+and one ``GROUP BY category, risk_level`` over the same filters from which
+both facet lists (and the total) are folded. Facets are disjunctive: the
+category counts ignore the category filter, the risk level counts ignore the
+risk level filter, so the client can show what each choice would yield.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from ..models import InvestmentPackage
+
+
+class CatalogError(ValueError):
+    pass
+
+
+filled_pct = Case(
+    When(total_slots=0, then=Value(0.0)),
+    default=Cast(F('total_slots') - F('available_slots'), FloatField()) * Value(100.0) / F('total_slots'),
+    output_field=FloatField(),
+)
+
+SORTS = {
+    'interest_rate': 'interest_rate',
+    'duration': 'duration_months',
+    'filled': 'filled_pct',
+    'newest': 'created_at',
+}
+
+
+def _choices(value, allowed, name):
+    """Comma-separated multi-select, e.g. ?category=grains,livestock"""
+    if not value:
+        return []
+    values = [v for v in value.split(',') if v]
+    unknown = set(values) - set(allowed)
+    if unknown:
+        raise CatalogError(f"Unknown {name}: {', '.join(sorted(unknown))}")
+    return values
+
+
+def _amount(value, name):
+    if not value:
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise CatalogError(f"{name} must be a number")
+    if not amount.is_finite():
+        raise CatalogError(f"{name} must be a number")
+    return amount
+
+
+class PackageCatalog:
+    """Filters, sorts and facets a queryset of investment packages from query params"""
+
+    def __init__(self, queryset, params):
+        self.queryset = queryset
+        self.categories = _choices(
+            params.get('category'), dict(InvestmentPackage.CATEGORY_CHOICES), 'category'
+        )
+        self.risk_levels = _choices(
+            params.get('risk_level'), dict(InvestmentPackage.RISK_LEVEL_CHOICES), 'risk_level'
+        )
+        self.min_amount = _amount(params.get('min_amount'), 'min_amount')
+        self.max_amount = _amount(params.get('max_amount'), 'max_amount')
+        self.available_only = params.get('available_only', '').lower() == 'true'
+
+        sort = params.get('sort')
+        if sort and sort.lstrip('-') not in SORTS:
+            raise CatalogError(f"sort must be one of: {', '.join(SORTS)} (prefix with - for descending)")
+        self.sort = sort
+
+    def _base(self):
+        """Every filter except the faceted ones"""
+        queryset = self.queryset
+        if self.min_amount is not None:
+            queryset = queryset.filter(min_amount__gte=self.min_amount)
+        if self.max_amount is not None:
+            queryset = queryset.filter(max_amount__lte=self.max_amount)
+        if self.available_only:
+            queryset = queryset.filter(available_slots__gt=0)
+        return queryset
+
+    def results(self):
+        queryset = self._base()
+        if self.categories:
+            queryset = queryset.filter(category__in=self.categories)
+        if self.risk_levels:
+            queryset = queryset.filter(risk_level__in=self.risk_levels)
+        queryset = queryset.annotate(filled_pct=filled_pct)
+
+        if self.sort:
+            descending = self.sort.startswith('-')
+            field = SORTS[self.sort.lstrip('-')]
+            queryset = queryset.order_by(f"{'-' if descending else ''}{field}", '-created_at')
+        return queryset
+
+    def facets(self):
+        """Facet counts and the matching total, from one grouped query"""
+        cells = self._base().order_by().values('category', 'risk_level').annotate(count=Count('id'))
+
+        categories = {value: 0 for value, _ in InvestmentPackage.CATEGORY_CHOICES}
+        risk_levels = {value: 0 for value, _ in InvestmentPackage.RISK_LEVEL_CHOICES}
+        total = 0
+        for cell in cells:
+            in_category = not self.categories or cell['category'] in self.categories
+            in_risk_level = not self.risk_levels or cell['risk_level'] in self.risk_levels
+            if in_risk_level and cell['category'] in categories:
+                categories[cell['category']] += cell['count']
+            if in_category and cell['risk_level'] in risk_levels:
+                risk_levels[cell['risk_level']] += cell['count']
+            if in_category and in_risk_level:
+                total += cell['count']
+
+        return total, {
+            'category': [
+                {'value': value, 'label': label, 'count': categories[value], 'selected': value in self.categories}
+                for value, label in InvestmentPackage.CATEGORY_CHOICES
+            ],
+            'risk_level': [
+                {'value': value, 'label': label, 'count': risk_levels[value], 'selected': value in self.risk_levels}
+                for value, label in InvestmentPackage.RISK_LEVEL_CHOICES
+            ],
+        }
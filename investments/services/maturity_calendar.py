@@ -0,0 +1,176 @@
+"""
+Maturity calendar: payout liability per due date.
+
+Every open position adds its principal and payout to the MaturityBucket for
+its due date and kind. Signal handlers apply the difference between a row's
+old and new contribution whenever a crop or storage investment is saved or
+deleted. The old contribution is taken when the row is loaded, so no extra
+query is needed. The calendar endpoint then only sums a date range of
+buckets. Bulk ``update()`` calls bypass the signals; run
+``rebuild_maturity_calendar`` after one that changes open positions.
+
+A crop investment pays ``amount + expected_return`` on ``end_date`` while
+active. A storage investment pays ``projected_returns`` on ``due_date``
+until it is sold.
+"""
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from ..models import MaturityBucket
+
+
+class Source:
+    def __init__(self, model, date_field, statuses, principal_field, payout_fields):
+        self.model_label = model
+        self.date_field = date_field
+        self.statuses = statuses
+        self.principal_field = principal_field
+        self.payout_fields = payout_fields
+        self.fields = {'status', date_field, principal_field, *payout_fields}
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def payout_expression(self):
+        return sum((F(name) for name in self.payout_fields[1:]), F(self.payout_fields[0]))
+
+
+SOURCES = {
+    'crop': Source('investments.Investment', 'end_date', ('active',), 'amount', ('amount', 'expected_return')),
+    'storage': Source(
+        'storage.StorageInvestment', 'due_date', ('active', 'matured'),
+        'total_investment_amount', ('projected_returns',),
+    ),
+}
+
+GRANULARITIES = {
+    'day': F('due_date'),
+    'week': TruncWeek('due_date'),
+    'month': TruncMonth('due_date'),
+}
+
+# Marks a snapshot taken from a partially loaded row
+UNKNOWN = object()
+
+
+def contribution(source, values):
+    """(due_date, principal, payout) a row adds to the calendar, None if it adds nothing"""
+    if not source.fields.issubset(values):
+        return UNKNOWN
+    if values['status'] not in source.statuses or values[source.date_field] is None:
+        return None
+    return (
+        values[source.date_field],
+        values[source.principal_field] or 0,
+        sum(values[name] or 0 for name in source.payout_fields),
+    )
+
+
+def stored_contribution(source, pk):
+    values = source.model._default_manager.filter(pk=pk).values(*source.fields).first()
+    return contribution(source, values) if values else None
+
+
+def apply(kind, entry, sign):
+    due_date, principal, payout = entry
+    changes = {
+        'positions': F('positions') + sign,
+        'principal': F('principal') + sign * principal,
+        'payout': F('payout') + sign * payout,
+    }
+    buckets = MaturityBucket.objects.filter(due_date=due_date, kind=kind)
+    if buckets.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            MaturityBucket.objects.create(
+                due_date=due_date, kind=kind, positions=sign, principal=sign * principal, payout=sign * payout
+            )
+    except IntegrityError:
+        # Created concurrently
+        buckets.update(**changes)
+
+
+def move(kind, old, new):
+    """Replace a row's old contribution with its new one"""
+    if old == new:
+        return
+    if old is not None:
+        apply(kind, old, -1)
+    if new is not None:
+        apply(kind, new, 1)
+
+
+def rebuild(registry=apps):
+    """
+    Recompute every bucket from the investment tables. Returns the number of buckets.
+    Migrations pass their historical app registry.
+    """
+    bucket_model = registry.get_model('investments', 'MaturityBucket')
+    buckets = []
+    for kind, source in SOURCES.items():
+        rows = (
+            registry.get_model(source.model_label)._default_manager
+            .filter(status__in=source.statuses, **{f'{source.date_field}__isnull': False})
+            .order_by()
+            .values(source.date_field)
+            .annotate(
+                count=Count('pk'),
+                principal_due=Sum(source.principal_field),
+                payout_due=Sum(source.payout_expression()),
+            )
+        )
+        buckets.extend(
+            bucket_model(
+                due_date=row[source.date_field], kind=kind, positions=row['count'],
+                principal=row['principal_due'] or 0, payout=row['payout_due'] or 0,
+            )
+            for row in rows
+        )
+
+    with transaction.atomic():
+        bucket_model.objects.all().delete()
+        bucket_model.objects.bulk_create(buckets, batch_size=1000)
+    return len(buckets)
+
+
+def _totals():
+    return {'positions': 0, 'principal': 0, 'payout': 0}
+
+
+def calendar(start, end, granularity='day', kind=None):
+    """Payout liability due between ``start`` and ``end`` (inclusive), one entry per period"""
+    buckets = MaturityBucket.objects.filter(due_date__range=(start, end))
+    if kind:
+        buckets = buckets.filter(kind=kind)
+    rows = (
+        buckets.annotate(period=GRANULARITIES[granularity])
+        .values('period', 'kind')
+        .annotate(count=Sum('positions'), principal_due=Sum('principal'), payout_due=Sum('payout'))
+        .order_by('period', 'kind')
+    )
+
+    periods = {}
+    overall = _totals()
+    for row in rows:
+        if not row['count']:
+            continue
+        period = periods.setdefault(row['period'], {'period': row['period'], **_totals(), 'by_kind': {}})
+        period['by_kind'][row['kind']] = {
+            'positions': row['count'], 'principal': row['principal_due'], 'payout': row['payout_due'],
+        }
+        for totals in (period, overall):
+            totals['positions'] += row['count']
+            totals['principal'] += row['principal_due']
+            totals['payout'] += row['payout_due']
+
+    return {
+        'from': start,
+        'to': end,
+        'granularity': granularity,
+        'totals': overall,
+        'periods': list(periods.values()),
+    }
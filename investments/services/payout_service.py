@@ -0,0 +1,307 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+
+from ..models import BankAccount, PayoutBatch, PayoutItem, WithdrawalRequest
+from ..utils import paystack
+
+logger = logging.getLogger(__name__)
+
+# Paystack's transfer statuses mapped onto PayoutItem statuses
+TRANSFER_STATUS_MAP = {
+    'pending': 'queued',
+    'received': 'queued',
+    'otp': 'queued',
+    'queued': 'queued',
+    'processing': 'queued',
+    'success': 'success',
+    'failed': 'failed',
+    'abandoned': 'failed',
+    'blocked': 'failed',
+    'rejected': 'failed',
+    'reversed': 'reversed',
+}
+
+TRANSFER_EVENTS = {
+    'transfer.success': 'success',
+    'transfer.failed': 'failed',
+    'transfer.reversed': 'reversed',
+}
+
+
+class PayoutService:
+    """Pays approved withdrawals out through Paystack bulk transfers"""
+
+    BATCH_SIZE = 100  # Paystack accepts at most 100 transfers per bulk request
+
+    def generate_reference(self):
+        """Generate unique transfer reference"""
+        return f"WDR_{uuid.uuid4().hex[:16].upper()}"
+
+    def get_recipient_code(self, bank_account):
+        """Return the cached Paystack recipient for an account, creating it once"""
+        if bank_account.recipient_code:
+            return bank_account.recipient_code
+
+        if not bank_account.bank_code:
+            bank_account.bank_code = paystack.resolve_bank_code(bank_account.bank_name)
+        bank_account.recipient_code = paystack.create_transfer_recipient(bank_account.user)
+        bank_account.save(update_fields=['bank_code', 'recipient_code', 'updated_at'])
+        return bank_account.recipient_code
+
+    def eligible_withdrawals(self, withdrawal_ids=None):
+        """Approved withdrawals that have no transfer in flight"""
+        queryset = WithdrawalRequest.objects.filter(status='approved').exclude(
+            payout_items__status__in=PayoutItem.OPEN_STATUSES
+        ).select_related('user__bank_account').order_by('request_date')
+        if withdrawal_ids:
+            queryset = queryset.filter(id__in=withdrawal_ids)
+        return queryset
+
+    def run(self, withdrawal_ids=None, created_by=None):
+        """Send every eligible withdrawal to Paystack, 100 per bulk request"""
+        withdrawals = list(self.eligible_withdrawals(withdrawal_ids))
+        batches = []
+        skipped = []
+        for start in range(0, len(withdrawals), self.BATCH_SIZE):
+            batch, batch_skipped = self.dispatch_batch(
+                withdrawals[start:start + self.BATCH_SIZE], created_by=created_by
+            )
+            if batch is not None:
+                batches.append(batch)
+            skipped.extend(batch_skipped)
+        return batches, skipped
+
+    def dispatch_batch(self, withdrawals, created_by=None):
+        """Create the batch locally, then submit it as a single bulk transfer"""
+        items = []
+        skipped = []
+        for withdrawal in withdrawals:
+            try:
+                bank_account = withdrawal.user.bank_account
+                recipient_code = self.get_recipient_code(bank_account)
+            except BankAccount.DoesNotExist:
+                skipped.append({'withdrawal_id': withdrawal.id, 'error': 'User has no bank account'})
+                continue
+            except (paystack.PaystackError, requests.RequestException) as e:
+                skipped.append({'withdrawal_id': withdrawal.id, 'error': str(e)})
+                continue
+
+            items.append(PayoutItem(
+                withdrawal=withdrawal,
+                bank_account=bank_account,
+                amount=withdrawal.amount,
+                reference=self.generate_reference(),
+                recipient_code=recipient_code,
+            ))
+
+        if not items:
+            return None, skipped
+
+        try:
+            with transaction.atomic():
+                # Another run (or mark_paid) may have taken some of these while
+                # recipients were being resolved; lock and re-check them
+                still_eligible = set(
+                    self.eligible_withdrawals([item.withdrawal_id for item in items])
+                    .select_for_update(skip_locked=True)
+                    .values_list('id', flat=True)
+                )
+                for item in items:
+                    if item.withdrawal_id not in still_eligible:
+                        skipped.append({'withdrawal_id': item.withdrawal_id, 'error': 'Already paid or in flight'})
+                items = [item for item in items if item.withdrawal_id in still_eligible]
+                if not items:
+                    return None, skipped
+
+                batch = PayoutBatch.objects.create(
+                    created_by=created_by,
+                    status='processing',
+                    total_amount=sum(item.amount for item in items),
+                    item_count=len(items),
+                )
+                for item in items:
+                    item.batch = batch
+                PayoutItem.objects.bulk_create(items)
+        except IntegrityError:
+            # unique_open_payout_per_withdrawal: a concurrent run got there first
+            skipped.extend(
+                {'withdrawal_id': item.withdrawal_id, 'error': 'Already paid or in flight'} for item in items
+            )
+            return None, skipped
+
+        transfers = [
+            {
+                'amount': item.amount,
+                'recipient': item.recipient_code,
+                'reference': item.reference,
+                'reason': f"Withdrawal payout #{item.withdrawal_id}",
+            }
+            for item in items
+        ]
+
+        try:
+            results = paystack.initiate_bulk_transfer(transfers)
+        except paystack.PaystackError as e:
+            # Paystack rejected the whole request, nothing was sent
+            self.apply_transfer_results(
+                [{'reference': item.reference, 'status': 'failed', 'reason': str(e)} for item in items]
+            )
+            batch.error_message = str(e)
+            batch.status = 'failed'
+            batch.save(update_fields=['error_message', 'status', 'updated_at'])
+            return batch, skipped
+        except requests.RequestException as e:
+            # The request may or may not have reached Paystack. Leave the items
+            # pending so transfer webhooks or sync_pending() settle them.
+            logger.warning("Bulk transfer for batch %s failed in transit: %s", batch.id, e)
+            batch.error_message = f"Network error: {e}"
+            batch.save(update_fields=['error_message', 'updated_at'])
+            return batch, skipped
+
+        self.apply_transfer_results(results)
+        batch.refresh_from_db()
+        return batch, skipped
+
+    def apply_transfer_results(self, results):
+        """Apply a set of transfer outcomes with a handful of bulk updates.
+
+        ``results`` is an iterable of dicts with ``reference``, ``status`` and
+        optionally ``transfer_code`` and ``reason``. Withdrawals whose transfer
+        succeeded are completed and those whose transfer failed or was reversed
+        are marked failed, so they can be re-approved and retried.
+        """
+        now = timezone.now()
+        by_status = defaultdict(list)
+        transfer_codes = {}
+        reasons = {}
+        for result in results:
+            reference = result.get('reference')
+            status = TRANSFER_STATUS_MAP.get(result.get('status'))
+            if not reference or not status:
+                continue
+            by_status[status].append(reference)
+            if result.get('transfer_code'):
+                transfer_codes[reference] = result['transfer_code']
+            if result.get('reason'):
+                reasons[reference] = result['reason']
+
+        if not by_status:
+            return 0
+
+        all_references = [ref for refs in by_status.values() for ref in refs]
+        with transaction.atomic():
+            updated = 0
+            for status, references in by_status.items():
+                items = PayoutItem.objects.filter(reference__in=references)
+                if status == 'queued':
+                    # A late "received" must not reopen a settled transfer
+                    items = items.filter(status__in=PayoutItem.OPEN_STATUSES)
+                updated += items.update(status=status, updated_at=now)
+
+            if transfer_codes or reasons:
+                changed = list(PayoutItem.objects.filter(
+                    reference__in=set(transfer_codes) | set(reasons)
+                ))
+                for item in changed:
+                    item.transfer_code = transfer_codes.get(item.reference, item.transfer_code)
+                    item.failure_reason = reasons.get(item.reference, item.failure_reason)
+                PayoutItem.objects.bulk_update(changed, ['transfer_code', 'failure_reason'])
+
+            if by_status.get('success'):
+                WithdrawalRequest.objects.filter(
+                    payout_items__reference__in=by_status['success'],
+                    status='approved',
+                ).update(
+                    status='completed',
+                    processed_date=now,
+                    admin_notes=Concat(
+                        Coalesce('admin_notes', Value('')),
+                        Value('\nPaid via Paystack bulk transfer.'),
+                    ),
+                )
+
+            failed_references = by_status.get('failed', []) + by_status.get('reversed', [])
+            if failed_references:
+                WithdrawalRequest.objects.filter(
+                    payout_items__reference__in=failed_references,
+                    status__in=['approved', 'completed'],
+                ).update(
+                    status='failed',
+                    processed_date=now,
+                    admin_notes=Concat(
+                        Coalesce('admin_notes', Value('')),
+                        Value('\nPaystack transfer failed.'),
+                    ),
+                )
+
+            batch_ids = PayoutItem.objects.filter(
+                reference__in=all_references
+            ).values_list('batch_id', flat=True).distinct()
+            self.refresh_batch_status(batch_ids)
+
+        return updated
+
+    def refresh_batch_status(self, batch_ids):
+        """Recompute batch statuses from their items in one grouped query"""
+        counts = PayoutBatch.objects.filter(id__in=list(batch_ids)).annotate(
+            open_items=Count('items', filter=Q(items__status__in=PayoutItem.OPEN_STATUSES)),
+            succeeded=Count('items', filter=Q(items__status='success')),
+            total_items=Count('items'),
+        ).values('id', 'open_items', 'succeeded', 'total_items')
+
+        by_status = defaultdict(list)
+        for row in counts:
+            if row['open_items']:
+                status = 'processing'
+            elif row['succeeded'] == row['total_items']:
+                status = 'completed'
+            elif row['succeeded']:
+                status = 'partial'
+            else:
+                status = 'failed'
+            by_status[status].append(row['id'])
+
+        for status, ids in by_status.items():
+            PayoutBatch.objects.filter(id__in=ids).update(status=status, updated_at=timezone.now())
+
+    def handle_transfer_event(self, event, data):
+        """Apply a transfer.success / transfer.failed / transfer.reversed webhook"""
+        status = TRANSFER_EVENTS.get(event)
+        if status is None:
+            return 0
+        return self.apply_transfer_results([{
+            'reference': data.get('reference'),
+            'status': status,
+            'transfer_code': data.get('transfer_code'),
+            'reason': data.get('reason') if status != 'success' else None,
+        }])
+
+    def sync_pending(self, older_than=None):
+        """Ask Paystack about transfers that never got a webhook"""
+        older_than = older_than or timedelta(hours=1)
+        stale = PayoutItem.objects.filter(
+            status__in=PayoutItem.OPEN_STATUSES,
+            updated_at__lt=timezone.now() - older_than,
+        ).values_list('reference', flat=True)
+
+        results = []
+        for reference in stale:
+            try:
+                data = paystack.verify_transfer(reference)
+            except (paystack.PaystackError, requests.RequestException) as e:
+                logger.warning("Could not verify transfer %s: %s", reference, e)
+                continue
+            results.append({
+                'reference': reference,
+                'status': data.get('status'),
+                'transfer_code': data.get('transfer_code'),
+            })
+        return self.apply_transfer_results(results)
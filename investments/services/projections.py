@@ -0,0 +1,146 @@
+"""
+Return projections for crop investments.
+
+Terms run by calendar month, so a 6-month investment started on 31 August
+matures on 28 February, as ``relativedelta`` gives. The return is the
+package's ``interest_rate`` percent over the whole term. It accrues evenly
+per day of the actual term.
+
+Everything works on NumPy arrays, so a package or the whole book is
+projected in one pass. The daily accrual schedule is a difference array:
+each position adds its daily accrual on its start day and removes it on its
+end day.
+"""
+from datetime import timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+
+from ..models import Investment
+
+
+def maturity_date(start_date, months):
+    """End of a term of ``months`` calendar months"""
+    return start_date + relativedelta(months=months)
+
+
+def project(amounts, rates, start_dates, end_dates, as_of, expected=None):
+    """
+    Expected return, return accrued by ``as_of`` and daily accrual per
+    position. Pass ``expected`` to use stored returns instead of rates.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    end_dates = np.asarray(end_dates, dtype='datetime64[D]')
+    if expected is None:
+        expected = amounts * np.asarray(rates, dtype=np.float64) / 100
+    else:
+        expected = np.asarray(expected, dtype=np.float64)
+
+    term_days = np.maximum((end_dates - start_dates).astype(np.int64), 1)
+    elapsed = np.clip((np.datetime64(as_of, 'D') - start_dates).astype(np.int64), 0, term_days)
+    daily = expected / term_days
+    return {
+        'term_days': term_days,
+        'expected_return': expected,
+        'accrued_return': daily * elapsed,
+        'daily_accrual': daily,
+    }
+
+
+def accrual_schedule(start_dates, end_dates, daily, first_day, days):
+    """Total accrual on each of ``days`` days from ``first_day``"""
+    first_day = np.datetime64(first_day, 'D')
+    starts = np.clip((np.asarray(start_dates, dtype='datetime64[D]') - first_day).astype(np.int64), 0, days)
+    ends = np.clip((np.asarray(end_dates, dtype='datetime64[D]') - first_day).astype(np.int64), 0, days)
+    steps = np.zeros(days + 1)
+    np.add.at(steps, starts, daily)
+    np.add.at(steps, ends, -daily)
+    return np.cumsum(steps)[:days]
+
+
+def what_if(package, amounts, start_date):
+    """Projected outcome of investing each of ``amounts`` in ``package`` from ``start_date``"""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    end_date = maturity_date(start_date, package.duration_months)
+    starts = np.full(len(amounts), start_date, dtype='datetime64[D]')
+    ends = np.full(len(amounts), end_date, dtype='datetime64[D]')
+    projection = project(amounts, float(package.interest_rate), starts, ends, start_date)
+
+    return {
+        'package': package.id,
+        'start_date': start_date,
+        'end_date': end_date,
+        'term_days': (end_date - start_date).days,
+        'interest_rate': package.interest_rate,
+        'scenarios': [
+            {
+                'amount': round(float(amount), 2),
+                'expected_return': round(float(expected), 2),
+                'total_payout': round(float(amount + expected), 2),
+                'daily_accrual': round(float(daily), 2),
+            }
+            for amount, expected, daily in zip(
+                amounts, projection['expected_return'], projection['daily_accrual']
+            )
+        ],
+    }
+
+
+def book(queryset=None, as_of=None, days=30):
+    """
+    Project every active investment in ``queryset`` (the whole book by
+    default): totals, a per-package breakdown and the daily accrual for
+    ``days`` days from ``as_of``.
+    """
+    queryset = Investment.objects.all() if queryset is None else queryset
+    as_of = as_of or timezone.localdate()
+    rows = list(
+        queryset.filter(status='active').order_by().values_list(
+            'package_id', 'amount', 'expected_return', 'start_date', 'end_date'
+        )
+    )
+    count = len(rows)
+    package_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    amounts = np.fromiter((row[1] for row in rows), dtype=np.float64, count=count)
+    expected = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=count)
+    start_dates = np.array([row[3] for row in rows], dtype='datetime64[D]')
+    end_dates = np.array([row[4] for row in rows], dtype='datetime64[D]')
+
+    projection = project(amounts, None, start_dates, end_dates, as_of, expected=expected)
+    schedule = accrual_schedule(start_dates, end_dates, projection['daily_accrual'], as_of, days)
+
+    packages, index = np.unique(package_ids, return_inverse=True)
+    width = len(packages)
+
+    def per_package(values):
+        return np.bincount(index, weights=values, minlength=width)
+
+    principal = per_package(amounts)
+    expected_by_package = per_package(projection['expected_return'])
+    accrued_by_package = per_package(projection['accrued_return'])
+    positions = np.bincount(index, minlength=width)
+
+    return {
+        'as_of': as_of,
+        'positions': count,
+        'principal': round(float(amounts.sum()), 2),
+        'expected_return': round(float(projection['expected_return'].sum()), 2),
+        'accrued_return': round(float(projection['accrued_return'].sum()), 2),
+        'remaining_return': round(float((projection['expected_return'] - projection['accrued_return']).sum()), 2),
+        'packages': [
+            {
+                'package': int(package_id),
+                'positions': int(positions[i]),
+                'principal': round(float(principal[i]), 2),
+                'expected_return': round(float(expected_by_package[i]), 2),
+                'accrued_return': round(float(accrued_by_package[i]), 2),
+            }
+            for i, package_id in enumerate(packages)
+        ],
+        'schedule': [
+            {'date': as_of + timedelta(days=offset), 'accrual': round(float(amount), 2)}
+            for offset, amount in enumerate(schedule)
+        ],
+    }
@@ -27,4 +27,43 @@
 #             # Cancel associated investment if exists
 #             if hasattr(payment, 'investment'):
 #                 payment.investment.status = 'cancelled'
-#                 payment.investment.save(update_fields=['status'])
\ No newline at end of file
+#                 payment.investment.save(update_fields=['status'])
+
+# Maturity calendar: keep MaturityBucket in step with crop and storage investments
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from .services import maturity_calendar
+
+
+def make_calendar_handlers(kind, source):
+    def snapshot(sender, instance, **kwargs):
+        instance._maturity_contribution = maturity_calendar.contribution(source, instance.__dict__)
+
+    def before_save(sender, instance, **kwargs):
+        if not instance._state.adding and instance._maturity_contribution is maturity_calendar.UNKNOWN:
+            instance._maturity_contribution = maturity_calendar.stored_contribution(source, instance.pk)
+
+    def after_save(sender, instance, created, update_fields=None, **kwargs):
+        if update_fields is not None and not source.fields.intersection(update_fields):
+            return
+        old = None if created else instance._maturity_contribution
+        new = maturity_calendar.contribution(source, instance.__dict__)
+        if new is maturity_calendar.UNKNOWN:
+            new = maturity_calendar.stored_contribution(source, instance.pk)
+        maturity_calendar.move(kind, old, new)
+        instance._maturity_contribution = new
+
+    def before_delete(sender, instance, **kwargs):
+        if instance._maturity_contribution is maturity_calendar.UNKNOWN:
+            instance._maturity_contribution = maturity_calendar.stored_contribution(source, instance.pk)
+
+    def after_delete(sender, instance, **kwargs):
+        maturity_calendar.move(kind, instance._maturity_contribution, None)
+
+    return snapshot, before_save, after_save, before_delete, after_delete
+
+
+for kind, source in maturity_calendar.SOURCES.items():
+    handlers = make_calendar_handlers(kind, source)
+    for signal, handler in zip((post_init, pre_save, post_save, pre_delete, post_delete), handlers):
+        signal.connect(handler, sender=source.model_label, weak=False, dispatch_uid=f'maturity-calendar-{kind}-{handler.__name__}')
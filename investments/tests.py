@@ -1,3 +1,523 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from ecommerce.models import Order
+from storage.models import StorageInvestment, StoragePlan
+from users.models import Notification, User
+
+from .models import (
+    ArchiveSegment, ArchiveSegmentUser, BankAccount, IdempotencyKey, Investment, InvestmentPackage, MaturityBucket,
+    Payment, PayoutBatch, PayoutItem, Transaction, WithdrawalRequest,
+)
+from .services import archive, projections
+from .services.payout_service import PayoutService
+from .views import process_withdrawal
+
+
+def investment_package(**kwargs):
+    values = dict(
+        name='Maize', description='Maize farm', category='grains', risk_level='low',
+        min_amount=Decimal('10'), max_amount=Decimal('100000'), interest_rate=Decimal('10'),
+        duration_months=6, total_slots=10, available_slots=10,
+        start_date=date.today(), end_date=date.today() + timedelta(days=180),
+    )
+    values.update(kwargs)
+    return InvestmentPackage.objects.create(**values)
+
+
+def crop_investment(user, package, amount='1000', status='active', **kwargs):
+    return Investment.objects.create(
+        user=user, package=package, amount=Decimal(amount), status=status,
+        start_date=date.today(), end_date=date.today() + timedelta(days=180), **kwargs
+    )
+
+
+def received(transfers):
+    return [
+        {'reference': t['reference'], 'status': 'received', 'transfer_code': 'TRF_' + t['reference'][-4:]}
+        for t in transfers
+    ]
+
+
+class PayoutServiceTests(TestCase):
+    def setUp(self):
+        self.withdrawals = []
+        for i in range(3):
+            user = User.objects.create_user(email=f'payee{i}@example.com', password='x')
+            BankAccount.objects.create(user=user, account_number='0123456789', bank_name='Access Bank', bank_code='044')
+            self.withdrawals.append(
+                WithdrawalRequest.objects.create(user=user, amount=Decimal('1000'), type='full', status='approved')
+            )
+
+    def run_payout(self, **kwargs):
+        with mock.patch('investments.utils.paystack.create_transfer_recipient', side_effect=lambda user: f'RCP_{user.id}'), \
+             mock.patch('investments.utils.paystack.initiate_bulk_transfer', side_effect=received) as bulk:
+            result = PayoutService().run(**kwargs)
+        return result, bulk
+
+    def test_run_sends_one_bulk_transfer_and_skips_accounts_without_bank_details(self):
+        user = User.objects.create_user(email='nobank@example.com', password='x')
+        WithdrawalRequest.objects.create(user=user, amount=Decimal('5'), type='full', status='approved')
+
+        (batches, skipped), bulk = self.run_payout()
+
+        self.assertEqual(bulk.call_count, 1)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].status, 'processing')
+        self.assertEqual([entry['error'] for entry in skipped], ['User has no bank account'])
+        self.assertEqual(PayoutItem.objects.filter(status='queued').count(), 3)
+        self.assertEqual(BankAccount.objects.exclude(recipient_code='').count(), 3)
+
+        # Nothing is sent twice
+        (batches, skipped), bulk = self.run_payout()
+        self.assertEqual(batches, [])
+        bulk.assert_not_called()
+
+    def test_transfer_events_settle_withdrawals_and_batch(self):
+        self.run_payout()
+        items = list(PayoutItem.objects.order_by('id'))
+        service = PayoutService()
+        service.handle_transfer_event('transfer.success', {'reference': items[0].reference})
+        service.handle_transfer_event('transfer.success', {'reference': items[1].reference})
+        service.handle_transfer_event('transfer.failed', {'reference': items[2].reference, 'reason': 'bad account'})
+
+        statuses = dict(WithdrawalRequest.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[items[0].withdrawal_id], 'completed')
+        self.assertEqual(statuses[items[2].withdrawal_id], 'failed')
+        self.assertEqual(PayoutBatch.objects.get().status, 'partial')
+        self.assertEqual(PayoutItem.objects.get(id=items[2].id).failure_reason, 'bad account')
+
+        # A late "received" does not reopen a settled transfer
+        service.apply_transfer_results([{'reference': items[0].reference, 'status': 'received'}])
+        self.assertEqual(PayoutItem.objects.get(id=items[0].id).status, 'success')
+
+    def test_rejected_bulk_request_fails_the_batch(self):
+        from .utils import paystack
+        with mock.patch('investments.utils.paystack.create_transfer_recipient', return_value='RCP'), \
+             mock.patch('investments.utils.paystack.initiate_bulk_transfer', side_effect=paystack.PaystackError('no balance')):
+            batches, _ = PayoutService().run()
+        self.assertEqual(batches[0].status, 'failed')
+        self.assertFalse(PayoutItem.objects.filter(status__in=PayoutItem.OPEN_STATUSES).exists())
+        self.assertEqual(WithdrawalRequest.objects.filter(status='failed').count(), 3)
+
+    def test_withdrawal_taken_by_a_concurrent_run_is_not_sent_again(self):
+        taken = self.withdrawals[0]
+
+        def resolve_recipient(user):
+            # Another run queues the first withdrawal while recipients resolve
+            if user.id == taken.user_id and not taken.payout_items.exists():
+                batch = PayoutBatch.objects.create(status='processing', total_amount=taken.amount, item_count=1)
+                PayoutItem.objects.create(
+                    batch=batch, withdrawal=taken, amount=taken.amount, reference='OTHER_RUN', recipient_code='RCP'
+                )
+            return f'RCP_{user.id}'
+
+        with mock.patch('investments.utils.paystack.create_transfer_recipient', side_effect=resolve_recipient), \
+             mock.patch('investments.utils.paystack.initiate_bulk_transfer', side_effect=received) as bulk:
+            batches, skipped = PayoutService().run()
+
+        sent = [transfer['reason'] for transfer in bulk.call_args.args[0]]
+        self.assertEqual(len(sent), 2)
+        self.assertNotIn(f'Withdrawal payout #{taken.id}', sent)
+        self.assertEqual(skipped, [{'withdrawal_id': taken.id, 'error': 'Already paid or in flight'}])
+        self.assertEqual(taken.payout_items.count(), 1)
+
+    def test_one_open_transfer_per_withdrawal(self):
+        from django.db import IntegrityError, transaction
+
+        self.run_payout()
+        item = PayoutItem.objects.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PayoutItem.objects.create(
+                batch=item.batch, withdrawal=item.withdrawal, amount=item.amount, reference='DUP', recipient_code='RCP'
+            )
+
+        # Once settled, a retry may open a new one
+        PayoutService().handle_transfer_event('transfer.failed', {'reference': item.reference})
+        PayoutItem.objects.create(
+            batch=item.batch, withdrawal=item.withdrawal, amount=item.amount, reference='RETRY', recipient_code='RCP'
+        )
+
+
+class MarkPaidTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        user = User.objects.create_user(email='payee@example.com', password='x')
+        BankAccount.objects.create(user=user, account_number='0123456789', bank_name='Access Bank', bank_code='044')
+        self.withdrawal = WithdrawalRequest.objects.create(user=user, amount=Decimal('1000'), type='full', status='approved')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def queue_transfer(self):
+        with mock.patch('investments.utils.paystack.create_transfer_recipient', return_value='RCP'), \
+             mock.patch('investments.utils.paystack.initiate_bulk_transfer', side_effect=received):
+            PayoutService().run()
+
+    def test_refused_while_a_transfer_is_in_flight(self):
+        self.queue_transfer()
+        response = self.client.post(f'/api/investments/admin/withdrawals/{self.withdrawal.id}/mark_paid/')
+        self.assertEqual(response.status_code, 409, response.content)
+
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, user=self.admin)
+        response = process_withdrawal(request, withdrawal_id=self.withdrawal.id, action='mark_paid')
+        self.assertEqual(response.status_code, 409)
+
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'approved')
+
+    def test_allowed_once_the_transfer_failed(self):
+        self.queue_transfer()
+        PayoutService().handle_transfer_event('transfer.failed', {'reference': PayoutItem.objects.get().reference})
+        WithdrawalRequest.objects.filter(pk=self.withdrawal.pk).update(status='approved')
+
+        response = self.client.post(f'/api/investments/admin/withdrawals/{self.withdrawal.id}/mark_paid/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'completed')
+
+
+def calendar_rows():
+    return sorted(
+        (bucket.due_date, bucket.kind, bucket.positions, bucket.principal, bucket.payout)
+        for bucket in MaturityBucket.objects.exclude(positions=0)
+    )
+
+
+class MaturityCalendarTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='investor@example.com', password='x')
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.package = investment_package()
+        self.plan = StoragePlan.objects.create(
+            product_name='Rice', description='Paddy rice', buying_price_per_bag=Decimal('100'),
+            projected_selling_price=Decimal('120'), storage_due_date=date(2030, 1, 1), available_quantity=100,
+        )
+
+    def storage_investment(self, **kwargs):
+        return StorageInvestment.objects.create(
+            user=self.user, storage_plan=self.plan, customer_name='Investor', customer_email='investor@example.com',
+            quantity_bags=2, price_per_bag=100, total_investment_amount=200,
+            projected_selling_price_per_bag=120, projected_returns=240,
+            due_date=date.today() + timedelta(days=10), **kwargs
+        )
+
+    def rebuilt_rows(self):
+        call_command('rebuild_maturity_calendar', stdout=StringIO())
+        return calendar_rows()
+
+    def test_incremental_updates_match_a_rebuild(self):
+        completed = crop_investment(self.user, self.package, '1000', 'active')
+        activated = crop_investment(self.user, self.package, '500', 'pending')
+        stored = self.storage_investment(status='active')
+        self.assertEqual(len(calendar_rows()), 2)
+
+        activated.status = 'active'
+        activated.save()
+        # Partially loaded rows and update_fields saves are tracked too
+        partial = Investment.objects.only('id', 'status').get(pk=completed.pk)
+        partial.status = 'completed'
+        partial.save()
+        stored = StorageInvestment.objects.get(pk=stored.pk)
+        stored.status = 'matured'
+        stored.save(update_fields=['status'])
+        stored.due_date = date.today() + timedelta(days=3)
+        stored.save()
+
+        incremental = calendar_rows()
+        self.assertEqual(incremental, self.rebuilt_rows())
+
+        Investment.objects.get(pk=activated.pk).delete()
+        stored.delete()
+        self.assertEqual(calendar_rows(), [])
+
+    def test_reconciliation_activations_reach_the_calendar(self):
+        from admin_api.reconciliation import FixtureGatewayClient, ReconciliationEngine
+        from storage.models import PaymentTransaction
+
+        pending = crop_investment(self.user, self.package, '1000', 'pending')
+        Payment.objects.create(user=self.user, investment=pending, amount=Decimal('1000'), paystack_reference='PAY_1')
+        stored = self.storage_investment(status='pending')
+        PaymentTransaction.objects.create(investment=stored, reference='AGR_1', amount=Decimal('200'))
+        self.assertEqual(calendar_rows(), [])
+
+        now = timezone.now().isoformat()
+        gateway = FixtureGatewayClient(transactions=[
+            {'reference': 'PAY_1', 'status': 'success', 'amount': 100000, 'paid_at': now, 'created_at': now},
+            {'reference': 'AGR_1', 'status': 'success', 'amount': 20000, 'paid_at': now, 'created_at': now},
+        ])
+        today = timezone.localdate()
+        ReconciliationEngine(gateway).run(today, today, apply=True)
+
+        self.assertEqual(len(calendar_rows()), 2)
+        self.assertEqual(calendar_rows(), self.rebuilt_rows())
+
+    def test_endpoint_groups_by_period_for_staff_only(self):
+        crop_investment(self.user, self.package, '1000', 'active')
+        crop_investment(self.user, self.package, '1000', 'active')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.get('/api/investments/admin/maturity-calendar/', {
+            'granularity': 'month', 'to': (date.today() + timedelta(days=400)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['totals']['positions'], 2)
+        self.assertEqual(Decimal(str(response.json()['totals']['payout'])), Decimal('2200'))
+        self.assertEqual(
+            client.get('/api/investments/admin/maturity-calendar/', {'granularity': 'year'}).status_code, 400
+        )
+
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/investments/admin/maturity-calendar/').status_code, 403)
+
+    def test_endpoint_rejects_impossible_dates_and_stays_within_the_calendar(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = '/api/investments/admin/maturity-calendar/'
+
+        self.assertEqual(client.get(url, {'from': '2024-02-30'}).status_code, 400)
+        self.assertEqual(client.get(url, {'to': '2024-13-01'}).status_code, 400)
+        for granularity in ('day', 'week', 'month'):
+            response = client.get(url, {'from': '9999-12-01', 'granularity': granularity})
+            self.assertEqual(response.status_code, 200, response.content)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(ARCHIVE_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(email='saver@example.com', password='x')
+        self.other = User.objects.create_user(email='other@example.com', password='x')
+        self.investment = crop_investment(self.user, investment_package(), '1000')
+        self.old = timezone.now() - timedelta(days=400)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def old_transaction(self, user, hours=0, **kwargs):
+        values = dict(transaction_type='referral_bonus', amount=Decimal('10.50'), status='completed')
+        values.update(kwargs)
+        tx = Transaction.objects.create(user=user, **values)
+        Transaction.objects.filter(pk=tx.pk).update(created_at=self.old + timedelta(hours=hours))
+        return tx
+
+    def test_settled_history_moves_out_and_statements_still_show_it(self):
+        for i in range(7):
+            self.old_transaction(self.user if i % 2 == 0 else self.other, i, investment=self.investment)
+        self.old_transaction(self.user, transaction_type='investment', amount=5, status='pending')
+        Transaction.objects.create(user=self.user, transaction_type='referral_bonus', amount=1, status='completed')
+        read = Notification.objects.create(user=self.user, message='old', is_read=True)
+        Notification.objects.filter(pk=read.pk).update(created_at=self.old)
+        Notification.objects.create(user=self.user, message='unread')
+
+        call_command('archive_history', '--batch-size', '3', stdout=StringIO())
+        self.assertEqual(ArchiveSegment.objects.filter(kind='transaction').count(), 3)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(
+            archive.archived_totals(self.user, transaction_type='referral_bonus')['amount'], Decimal('42.00')
+        )
+
+        response = self.client.get('/api/investments/transactions/statement/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(response.data['transactions'][-1]['investment_package_name'], 'Maize')
+
+        day = (self.old + timedelta(hours=2)).date()
+        response = self.client.get(f'/api/investments/transactions/statement/?from={day}&to={day}')
+        self.assertTrue(response.data['count'] >= 1)
+        self.assertTrue(all(tx['created_at'][:10] == str(day) for tx in response.data['transactions']))
+        self.assertEqual(self.client.get('/api/investments/dashboard-stats/').data['referral_earnings'], Decimal('43.00'))
+        self.assertEqual(self.client.get('/api/investments/transactions/statement/?from=bad').status_code, 400)
+        for query in ('from=2024-02-30', 'to=2024-13-01', 'to=9999-12-31'):
+            self.assertEqual(self.client.get(f'/api/investments/transactions/statement/?{query}').status_code, 400, query)
+        self.assertEqual(self.client.get('/api/investments/transactions/statement/?from=0001-01-01').status_code, 200)
+
+    def test_a_statement_inflates_only_that_users_rows(self):
+        mine = [self.old_transaction(self.user, i) for i in range(3)]
+        for i in range(3):
+            self.old_transaction(self.other, i)
+        archive.archive('transaction')
+
+        segment = ArchiveSegment.objects.get(kind='transaction')
+        other_range = ArchiveSegmentUser.objects.get(segment=segment, user=self.other)
+        self.assertEqual(other_range.row_count, 3)
+        # Damage the other user's rows: this user's statement must not touch them
+        with open(os.path.join(settings.ARCHIVE_ROOT, segment.path), 'r+b') as fh:
+            fh.seek(other_range.offset)
+            fh.write(b'\0' * other_range.length)
+
+        with self.assertNoLogs('investments.services.archive', level='ERROR'):
+            archived = list(archive.archived_transactions(self.user))
+        self.assertEqual(sorted(tx.id for tx in archived), [tx.id for tx in mine])
+
+    def test_segments_without_user_ranges_are_read_whole(self):
+        rows = [
+            {
+                'id': 9000 + i, 'user_id': user.id, 'investment_id': None, 'transaction_type': 'referral_bonus',
+                'amount': '10.50', 'status': 'completed', 'payment_method': None, 'payment_reference': None,
+                'created_at': self.old.isoformat(), 'completed_at': None, 'description': '',
+            }
+            for i, user in enumerate([self.user, self.other, self.user])
+        ]
+        path = os.path.join(settings.ARCHIVE_ROOT, 'transaction', 'legacy.jsonl.gz')
+        os.makedirs(os.path.dirname(path))
+        with gzip.open(path, 'wt', encoding='utf-8') as fh:
+            fh.writelines(json.dumps(row) + '\n' for row in rows)
+        ArchiveSegment.objects.create(
+            kind='transaction', path='transaction/legacy.jsonl.gz', row_count=3, first_id=9000, last_id=9002,
+            oldest_created_at=self.old, newest_created_at=self.old,
+        )
+
+        self.assertEqual(sorted(tx.id for tx in archive.archived_transactions(self.user)), [9000, 9002])
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        self.package = investment_package(interest_rate=Decimal('12'), duration_months=6)
+        self.url = f'/api/investments/packages/{self.package.pk}/what_if/'
+        self.client = APIClient()
+
+    def test_maturity_clamps_to_the_end_of_short_months(self):
+        self.assertEqual(projections.maturity_date(date(2025, 8, 31), 6), date(2026, 2, 28))
+
+    def test_what_if_projects_each_amount(self):
+        response = self.client.get(self.url, {'amount': '1000,5000', 'start_date': '2025-08-31'})
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['end_date'], '2026-02-28')
+        self.assertEqual(data['term_days'], 181)
+        self.assertEqual(data['scenarios'][1]['expected_return'], 600.0)
+
+    def test_what_if_rejects_amounts_it_cannot_project(self):
+        for amount in ('x', 'NaN', 'sNaN', 'Infinity', '-inf', '1000,nan', '0', ''):
+            with self.subTest(amount=amount):
+                self.assertEqual(self.client.get(self.url, {'amount': amount}).status_code, 400)
+
+    def test_impossible_dates_are_rejected(self):
+        for start_date in ('2024-02-30', '9999-12-01'):
+            response = self.client.get(self.url, {'amount': '1000', 'start_date': start_date})
+            self.assertEqual(response.status_code, 400, start_date)
+
+        self.client.force_authenticate(User.objects.create_user(email='admin@example.com', password='x', is_staff=True))
+        for as_of in ('2024-02-30', '9999-12-30'):
+            response = self.client.get('/api/investments/admin/projections/', {'as_of': as_of})
+            self.assertEqual(response.status_code, 400, as_of)
+
+    def test_book_accrues_active_positions_only(self):
+        user = User.objects.create_user(email='holder@example.com', password='x')
+        admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        # 120 expected return over 180 days
+        crop_investment(user, self.package, '1000', 'active')
+        crop_investment(user, self.package, '1000', 'pending')
+
+        book = projections.book(as_of=date.today() + timedelta(days=90), days=100)
+        self.assertEqual(book['positions'], 1)
+        self.assertEqual(book['expected_return'], 120.0)
+        self.assertAlmostEqual(book['accrued_return'], 60.0, places=2)
+        self.assertAlmostEqual(book['schedule'][0]['accrual'], 120 / 180, places=2)
+        self.assertEqual(book['schedule'][95]['accrual'], 0.0)
+
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/investments/admin/projections/', {'days': 5})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['schedule']), 5)
+        self.assertEqual(self.client.get('/api/investments/admin/projections/', {'package': 'x'}).status_code, 400)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='buyer@example.com', password='x'))
+        self.body = {
+            'email': 'buyer@example.com', 'amount': '100', 'first_name': 'Ada', 'last_name': 'Obi',
+            'address': '1 Farm Road', 'city': 'Ibadan', 'state': 'Oyo', 'items': [],
+        }
+
+    def initialize(self, body):
+        return self.client.post('/api/payments/initialize/', body, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+    def test_retries_replay_the_first_response(self):
+        gateway = mock.Mock(status_code=200)
+        gateway.json.return_value = {
+            'status': True, 'data': {'authorization_url': 'https://pay/x', 'access_code': 'a', 'reference': 'r'},
+        }
+        with mock.patch('ecommerce.views.requests.post', return_value=gateway) as post:
+            first = self.initialize(self.body)
+            replay = self.initialize(self.body)
+            cache.clear()
+            stored_replay = self.initialize(self.body)
+            changed = self.initialize(dict(self.body, amount='5'))
+
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(stored_replay.data, first.data)
+        self.assertEqual(changed.status_code, 422)
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+
+class PackageCatalogTests(TestCase):
+    def setUp(self):
+        investment_package(
+            name='a', category='grains', risk_level='low', interest_rate=Decimal('5'), total_slots=10, available_slots=1,
+        )
+        investment_package(
+            name='b', category='grains', risk_level='high', interest_rate=Decimal('20'), duration_months=3,
+        )
+        investment_package(
+            name='c', category='livestock', risk_level='low', interest_rate=Decimal('12'), total_slots=10,
+            available_slots=5,
+        )
+        investment_package(name='d', category='aquaculture', risk_level='medium', status='inactive')
+        self.client = APIClient()
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [package['name'] for package in response.data]
+
+    def test_browse_returns_a_page_and_facets_in_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/investments/packages/browse/?category=grains&sort=-filled')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([package['name'] for package in response.data['results']], ['a', 'b'])
+        self.assertEqual(response.data['count'], 2)
+
+        facets = {
+            name: {facet['value']: facet['count'] for facet in values}
+            for name, values in response.data['facets'].items()
+        }
+        # Every choice is listed, including those with no active packages
+        self.assertEqual(facets['category'], {
+            'grains': 2, 'livestock': 1, 'aquaculture': 0, 'cash_crops': 0, 'horticulture': 0, 'processing': 0,
+        })
+        self.assertEqual(facets['risk_level'], {'low': 1, 'high': 1, 'medium': 0})
+
+    def test_list_filters_and_sorts(self):
+        self.assertEqual(self.names('/api/investments/packages/?sort=interest_rate&risk_level=low,high'), ['a', 'c', 'b'])
+        self.assertEqual(self.names('/api/investments/packages/?sort=duration')[0], 'b')
+        self.assertEqual(self.client.get('/api/investments/packages/?category=nope').status_code, 400)
+        for query in ('min_amount=NaN', 'min_amount=sNaN', 'max_amount=Infinity'):
+            self.assertEqual(self.client.get(f'/api/investments/packages/?{query}').status_code, 400, query)
+        self.assertEqual(self.client.get('/api/investments/packages/categories/').data, ['grains', 'livestock'])
@@ -21,6 +21,8 @@ urlpatterns = [
     path('', include(router.urls)),
     path('dashboard-stats/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin/maturity-calendar/', views.AdminMaturityCalendarView.as_view(), name='admin-maturity-calendar'),
+    path('admin/projections/', views.AdminProjectionView.as_view(), name='admin-projections'),
     path('investments/withdrawable/', views.InvestmentViewSet.as_view({'get': 'withdrawable'}), name='investment-withdrawable'),
     path('api/investments/<int:pk>/complete/',
          views.InvestmentViewSet.as_view({'post': 'complete'}),
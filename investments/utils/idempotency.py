@@ -0,0 +1,133 @@
+"""
+Idempotency-Key handling for requests that start a payment.
+
+A retried POST with the same ``Idempotency-Key`` header gets the response
+of the first attempt instead of creating another order/investment and
+another Paystack transaction. Keys are scoped to the user and remembered
+for ``IDEMPOTENCY_KEY_TTL_HOURS``.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from ..models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def get_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def request_fingerprint(request):
+    """Hash of what the request asks for, so a reused key with a different body is caught"""
+    try:
+        body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    except (TypeError, ValueError):
+        body = repr(request.data)
+    raw = f"{request.method}:{request.path}:{body}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def cache_key(user_id, key):
+    return f"idempotency:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'error': 'Idempotency-Key was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(stored['body'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Make a payment-initiating view safe to retry with an Idempotency-Key.
+
+    Works on ``@api_view`` functions and on APIView/ViewSet methods. Requests
+    without the header run as before. Server errors are not stored, so the
+    client can retry them with the same key.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, (Request, HttpRequest)))
+        key = request.META.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+
+        key = key[:255]
+        fingerprint = request_fingerprint(request)
+        ckey = cache_key(request.user.id, key)
+
+        stored = cache.get(ckey)
+        if stored is not None:
+            return replay(stored, fingerprint)
+
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + get_ttl(),
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key)
+            if record.expires_at <= now:
+                # Expired keys can be reused for a new request
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                return wrapper(*args, **kwargs)
+            if record.status == 'completed':
+                stored = {
+                    'fingerprint': record.fingerprint,
+                    'status': record.response_status,
+                    'body': record.response_body,
+                }
+                cache.set(ckey, stored, int((record.expires_at - now).total_seconds()))
+                return replay(stored, fingerprint)
+            if record.fingerprint != fingerprint:
+                return replay({'fingerprint': record.fingerprint}, fingerprint)
+            return Response(
+                {'error': 'A request with this Idempotency-Key is still being processed'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            record.delete()
+            return response
+
+        body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status='completed',
+            response_status=response.status_code,
+            response_body=body,
+        )
+        cache.set(ckey, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'body': body,
+        }, int(get_ttl().total_seconds()))
+        return response
+
+    return wrapper
@@ -1,37 +1,117 @@
 import requests
 from django.conf import settings
+from django.core.cache import cache
 
 PAYSTACK_SECRET_KEY = settings.PAYSTACK_SECRET_KEY
 BASE_URL = "https://api.paystack.co"
+BANK_LIST_CACHE_KEY = "paystack:banks:nigeria"
+BANK_LIST_CACHE_TTL = 60 * 60 * 24
+
+
+class PaystackError(Exception):
+    """Raised when Paystack rejects a request"""
+
+
+def get_headers():
+    return {
+        "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def list_banks():
+    """Return Paystack's Nigerian bank list, cached for a day."""
+    banks = cache.get(BANK_LIST_CACHE_KEY)
+    if banks is None:
+        response = requests.get(
+            f"{BASE_URL}/bank",
+            params={"country": "nigeria", "perPage": 100},
+            headers=get_headers(),
+            timeout=30,
+        ).json()
+        if not response.get("status"):
+            raise PaystackError(f"Paystack error: {response.get('message')}")
+        banks = [{"name": bank["name"], "code": bank["code"]} for bank in response["data"]]
+        cache.set(BANK_LIST_CACHE_KEY, banks, BANK_LIST_CACHE_TTL)
+    return banks
+
+
+def resolve_bank_code(bank_name):
+    """Map a bank name as entered by the user to its Paystack bank code."""
+    wanted = (bank_name or "").strip().lower()
+    for bank in list_banks():
+        if bank["name"].lower() == wanted:
+            return bank["code"]
+    raise PaystackError(f"Unknown bank: {bank_name}")
+
 
 def create_transfer_recipient(user):
     """Create a transfer recipient for the user's bank account."""
     account = user.bank_account
     url = f"{BASE_URL}/transferrecipient"
-    headers = {"Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"}
     data = {
         "type": "nuban",
         "name": account.account_name or user.get_full_name(),
         "account_number": account.account_number,
-        "bank_code": account.bank_code,
+        "bank_code": account.bank_code or resolve_bank_code(account.bank_name),
         "currency": "NGN"
     }
-    response = requests.post(url, json=data, headers=headers).json()
+    response = requests.post(url, json=data, headers=get_headers(), timeout=30).json()
     if not response.get("status"):
-        raise Exception(f"Paystack error: {response.get('message')}")
+        raise PaystackError(f"Paystack error: {response.get('message')}")
     return response["data"]["recipient_code"]
 
 def initiate_transfer(amount, recipient_code, reason="Withdrawal Payout"):
     """Send money to a recipient via Paystack."""
     url = f"{BASE_URL}/transfer"
-    headers = {"Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"}
     data = {
         "source": "balance",
         "amount": int(amount * 100),  # Convert to kobo
         "recipient": recipient_code,
         "reason": reason
     }
-    response = requests.post(url, json=data, headers=headers).json()
+    response = requests.post(url, json=data, headers=get_headers(), timeout=30).json()
+    if not response.get("status"):
+        raise PaystackError(f"Paystack error: {response.get('message')}")
+    return response["data"]
+
+def initiate_bulk_transfer(transfers):
+    """Send up to 100 transfers in one request.
+
+    Each transfer is a dict with ``amount`` (in naira), ``recipient``,
+    ``reference`` and ``reason``. Returns Paystack's per-transfer results.
+    """
+    url = f"{BASE_URL}/transfer/bulk"
+    data = {
+        "currency": "NGN",
+        "source": "balance",
+        "transfers": [
+            {
+                "amount": int(transfer["amount"] * 100),  # Convert to kobo
+                "recipient": transfer["recipient"],
+                "reference": transfer["reference"],
+                "reason": transfer.get("reason", "Withdrawal Payout"),
+            }
+            for transfer in transfers
+        ],
+    }
+    response = requests.post(url, json=data, headers=get_headers(), timeout=60).json()
+    if not response.get("status"):
+        raise PaystackError(f"Paystack error: {response.get('message')}")
+    return response["data"]
+
+def verify_transfer(reference):
+    """Fetch the current state of a transfer by our reference."""
+    url = f"{BASE_URL}/transfer/verify/{reference}"
+    response = requests.get(url, headers=get_headers(), timeout=30).json()
+    if not response.get("status"):
+        raise PaystackError(f"Paystack error: {response.get('message')}")
+    return response["data"]
+
+def verify_transaction(reference):
+    """Fetch the current state of a charge by its reference."""
+    url = f"{BASE_URL}/transaction/verify/{reference}"
+    response = requests.get(url, headers=get_headers(), timeout=30).json()
     if not response.get("status"):
-        raise Exception(f"Paystack error: {response.get('message')}")
+        raise PaystackError(f"Paystack error: {response.get('message')}")
     return response["data"]
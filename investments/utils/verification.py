@@ -0,0 +1,107 @@
+"""
+Single-flight verification of Paystack charges.
+
+The frontends poll the verify endpoints for the same reference until they
+see a result, and Paystack redirects to the callback at the same time. The
+coordinator makes sure only one of those requests talks to Paystack and
+applies the state change; everyone else gets the settled local record.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from . import paystack
+
+RESULT_CACHE_TTL = 60 * 60
+LOCK_TIMEOUT = 60
+
+
+class VerificationCoordinator:
+    """Verifies one kind of payment record, keyed by its reference.
+
+    ``success_statuses`` and ``failure_statuses`` are the local statuses that
+    mean the charge is settled. ``on_success(obj, data)`` and
+    ``on_failure(obj, data)`` apply the state change; they run inside the
+    row lock, at most once per reference.
+    """
+
+    def __init__(self, model, reference_field, success_statuses, failure_statuses):
+        self.model = model
+        self.reference_field = reference_field
+        self.success_statuses = success_statuses
+        self.failure_statuses = failure_statuses
+
+    def cache_key(self, reference):
+        return f"paystack:verify:{self.model._meta.label_lower}:{reference}"
+
+    def local_outcome(self, obj):
+        if obj.status in self.success_statuses:
+            return 'success'
+        if obj.status in self.failure_statuses:
+            return 'failed'
+        return None
+
+    def verify(self, obj, on_success, on_failure=None):
+        """Settle ``obj`` against Paystack and return ``(result, obj)``.
+
+        ``result`` is a dict with ``status`` (success, failed or pending),
+        ``message`` and ``verified`` - whether this call went to Paystack.
+        Raises ``PaystackError`` or ``requests.RequestException`` when the
+        gateway could not be asked.
+        """
+        reference = getattr(obj, self.reference_field)
+        key = self.cache_key(reference)
+
+        cached = cache.get(key)
+        if cached is not None:
+            obj.refresh_from_db()
+            return cached, obj
+
+        outcome = self.local_outcome(obj)
+        if outcome is not None:
+            return self.remember(key, outcome, 'Payment already verified'), obj
+
+        # The cache lock collapses concurrent polls in this cache; the row
+        # lock below is what keeps separate processes from double-applying.
+        lock_key = f"{key}:lock"
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            obj.refresh_from_db()
+            outcome = self.local_outcome(obj)
+            if outcome is not None:
+                return self.remember(key, outcome, 'Payment already verified'), obj
+            return {'status': 'pending', 'message': 'Verification in progress', 'verified': False}, obj
+
+        try:
+            with transaction.atomic():
+                obj = self.model.objects.select_for_update().get(pk=obj.pk)
+                outcome = self.local_outcome(obj)
+                if outcome is not None:
+                    return self.remember(key, outcome, 'Payment already verified'), obj
+
+                data = paystack.verify_transaction(reference)
+                gateway_status = data.get('status')
+                if gateway_status == 'success':
+                    on_success(obj, data)
+                    outcome = 'success'
+                elif gateway_status in ('failed', 'reversed'):
+                    if on_failure is not None:
+                        on_failure(obj, data)
+                    outcome = 'failed'
+                else:
+                    # abandoned / ongoing / pending - the customer may still pay
+                    return {
+                        'status': 'pending',
+                        'message': data.get('gateway_response') or 'Payment not completed',
+                        'verified': True,
+                    }, obj
+        finally:
+            cache.delete(lock_key)
+
+        obj.refresh_from_db()
+        result = self.remember(key, outcome, 'Payment verified successfully' if outcome == 'success' else 'Payment verification failed')
+        result['verified'] = True
+        return result, obj
+
+    def remember(self, key, outcome, message):
+        result = {'status': outcome, 'message': message, 'verified': False}
+        cache.set(key, result, RESULT_CACHE_TTL)
+        return dict(result)
@@ -5,9 +5,12 @@ from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from django.db import transaction
 from django.db.models import Sum, Count
 from django.utils import timezone
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.utils.dateparse import parse_date
 from django.contrib.auth import get_user_model
 from django.conf import settings
 import time
@@ -15,7 +18,7 @@ import requests
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
 
-from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest
+from .models import InvestmentPackage, Investment, Transaction, Portfolio, Payment, WithdrawalRequest, PayoutBatch, PayoutItem
 from .serializers import (
     InvestmentPackageSerializer,
     InvestmentPackageDetailSerializer,
@@ -28,7 +31,21 @@ from .serializers import (
     PaymentSerializer,
     PaymentCreateSerializer,
     CreateWithdrawalRequestSerializer,
-    WithdrawalRequestSerializer
+    WithdrawalRequestSerializer,
+    PayoutBatchSerializer
+)
+from .services import archive, maturity_calendar, projections
+from .services.catalog import CatalogError, PackageCatalog
+from .services.payout_service import PayoutService
+from .utils import paystack
+from .utils.idempotency import idempotent
+from .utils.verification import VerificationCoordinator
+from search import index as search_index
+
+payment_verifier = VerificationCoordinator(
+    Payment, 'paystack_reference',
+    success_statuses=['success'],
+    failure_statuses=['failed'],
 )
 
 class InvestmentPackageViewSet(viewsets.ReadOnlyModelViewSet):
@@ -42,37 +59,71 @@ class InvestmentPackageViewSet(viewsets.ReadOnlyModelViewSet):
             return InvestmentPackageDetailSerializer
         return InvestmentPackageSerializer
     
-    def get_queryset(self):
+    def get_catalog(self):
         queryset = super().get_queryset()
         
-        # Filter by category
-        category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category=category)
-        
-        # Filter by risk level
-        risk_level = self.request.query_params.get('risk_level', None)
-        if risk_level:
-            queryset = queryset.filter(risk_level=risk_level)
-        
-        # Filter by minimum amount
-        min_amount = self.request.query_params.get('min_amount', None)
-        if min_amount:
-            queryset = queryset.filter(min_amount__gte=min_amount)
+        # Full-text search over name, category, location and description
+        search = self.request.query_params.get('search', None)
+        if search:
+            queryset = search_index.filter_queryset(queryset, 'package', search)
         
-        # Filter by maximum amount
-        max_amount = self.request.query_params.get('max_amount', None)
-        if max_amount:
-            queryset = queryset.filter(max_amount__lte=max_amount)
-        
-        return queryset
+        # Category / risk level (comma-separated for several), min/max amount and sort
+        try:
+            return PackageCatalog(queryset, self.request.query_params)
+        except CatalogError as e:
+            raise serializers.ValidationError({'error': str(e)})
+    
+    def get_queryset(self):
+        return self.get_catalog().results()
+    
+    @action(detail=False, methods=['get'])
+    def browse(self, request):
+        """Get filtered, sorted packages with category and risk level facet counts"""
+        catalog = self.get_catalog()
+        total, facets = catalog.facets()
+        serializer = self.get_serializer(catalog.results(), many=True)
+        return Response({
+            'count': total,
+            'results': serializer.data,
+            'facets': facets,
+        })
     
     @action(detail=False, methods=['get'])
     def categories(self, request):
-        """Get all available categories"""
-        categories = InvestmentPackage.objects.values_list('category', flat=True).distinct()
+        """Get the categories of active packages"""
+        categories = InvestmentPackage.objects.filter(status='active').order_by('category').values_list(
+            'category', flat=True
+        ).distinct()
         return Response(list(categories))
     
+    @action(detail=True, methods=['get'])
+    def what_if(self, request, pk=None):
+        """Project returns for ?amount=1000,5000 (comma-separated for several) starting ?start_date (default today)"""
+        package = self.get_object()
+        try:
+            amounts = [Decimal(value) for value in request.query_params.get('amount', '').split(',') if value]
+            # Decimal parses "NaN" and "Infinity"; neither can be projected
+            if not all(amount.is_finite() for amount in amounts):
+                raise InvalidOperation
+        except InvalidOperation:
+            return Response({'error': 'amount must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if not amounts:
+            return Response({'error': 'amount is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(amount <= 0 for amount in amounts):
+            return Response({'error': 'amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        value = request.query_params.get('start_date')
+        try:
+            start_date = parse_date(value) if value else timezone.localdate()
+        except ValueError:  # well formed but impossible, e.g. 2024-02-30
+            start_date = None
+        if start_date is None:
+            return Response({'error': 'start_date must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(projections.what_if(package, amounts, start_date))
+        except (OverflowError, ValueError):  # the term ends past the last representable date
+            return Response({'error': 'start_date is out of range'}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get investment package statistics"""
@@ -314,6 +365,35 @@ class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
         
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        """Get a statement for ?from=YYYY-MM-DD&to=YYYY-MM-DD, including archived transactions"""
+        bounds = []
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            try:
+                day = parse_date(value) if value else None
+            except ValueError:  # well formed but impossible, e.g. 2024-02-30
+                day = None
+            if value and day is None:
+                return Response({'error': f'{param} must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+            bounds.append(day)
+
+        start_day, end_day = bounds
+        if end_day == date.max:
+            return Response({'error': 'to is out of range'}, status=status.HTTP_400_BAD_REQUEST)
+        start = timezone.make_aware(datetime.combine(start_day, datetime.min.time())) if start_day else None
+        end = timezone.make_aware(datetime.combine(end_day + timedelta(days=1), datetime.min.time())) if end_day else None
+
+        transactions = archive.statement(request.user, start, end)
+        serializer = self.get_serializer(transactions, many=True)
+        return Response({
+            'from': start_day,
+            'to': end_day,
+            'count': len(transactions),
+            'transactions': serializer.data,
+        })
 
 class PortfolioViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for user portfolio"""
@@ -389,6 +469,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return PaymentCreateSerializer
         return PaymentSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -468,72 +549,54 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # If payment is already successful, just return the investment data
-        if payment.status == 'success':
-            investment = payment.investment
-            return Response({
-                'status': 'success',
-                'payment': PaymentSerializer(payment).data,
-                'investment': InvestmentSerializer(investment).data
-            })
-
-        # Verify with Paystack
-        paystack_secret_key = getattr(settings, 'PAYSTACK_SECRET_KEY', '')
-        url = f'https://api.paystack.co/transaction/verify/{reference}'
-        headers = {
-            'Authorization': f'Bearer {paystack_secret_key}',
-        }
-
-        try:
-            response = requests.get(url, headers=headers)
-            response_data = response.json()
-
-            if response_data.get('status') and response_data['data']['status'] == 'success':
-                # Update payment status
-                payment.status = 'success'
-                payment.paid_at = timezone.now()
-                payment.metadata = response_data['data']
-                payment.save()
-
-                # Update investment status to active
-                investment = payment.investment
-                if investment.status == 'pending':
-                    investment.status = 'active'
-                    investment.save()
+        def on_success(payment, data):
+            payment.status = 'success'
+            payment.paid_at = timezone.now()
+            payment.metadata = data
+            payment.save()
 
-                # Reduce available slots in the package
-                package = investment.package
-                if package.available_slots > 0:
-                    package.available_slots -= 1
-                    package.save()
+            # Update investment status to active
+            investment = payment.investment
+            if investment.status == 'pending':
+                investment.status = 'active'
+                investment.save()
 
-                    # If slots are now full, cancel all pending investments
-                    if package.available_slots == 0:
-                        from .views import InvestmentViewSet
-                        viewset = InvestmentViewSet()
-                        viewset.cancel_pending_investments_for_package(package)
+            # Reduce available slots in the package
+            package = investment.package
+            if package.available_slots > 0:
+                package.available_slots -= 1
+                package.save()
 
-                return Response({
-                    'status': 'success',
-                    'payment': PaymentSerializer(payment).data,
-                    'investment': InvestmentSerializer(investment).data
-                })
-            else:
-                payment.status = 'failed'
-                payment.save()
+                # If slots are now full, cancel all pending investments
+                if package.available_slots == 0:
+                    InvestmentViewSet().cancel_pending_investments_for_package(package)
 
-                return Response({
-                    'status': 'failed',
-                    'payment': PaymentSerializer(payment).data,
-                    'message': response_data.get('message', 'Payment verification failed')
-                })
+        def on_failure(payment, data):
+            payment.status = 'failed'
+            payment.metadata = data
+            payment.save()
 
-        except requests.RequestException as e:
+        try:
+            result, payment = payment_verifier.verify(payment, on_success, on_failure)
+        except (paystack.PaystackError, requests.RequestException) as e:
             return Response(
                 {'error': f'Verification failed: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        if result['status'] == 'success':
+            return Response({
+                'status': 'success',
+                'payment': PaymentSerializer(payment).data,
+                'investment': InvestmentSerializer(payment.investment).data
+            })
+
+        return Response({
+            'status': result['status'],
+            'payment': PaymentSerializer(payment).data,
+            'message': result['message']
+        })
+
 class PaystackWebhookView(APIView):
     """Handle Paystack webhooks"""
 
@@ -619,6 +682,10 @@ class PaystackWebhookView(APIView):
                 # Log error but don't fail webhook
                 pass
 
+        elif event in ('transfer.success', 'transfer.failed', 'transfer.reversed'):
+            # Withdrawal payouts sent through PayoutService
+            PayoutService().handle_transfer_event(event, data)
+
         return Response({'status': 'success'})
 
 @api_view(['GET'])
@@ -690,11 +757,13 @@ class DashboardStatsView(APIView):
         ).order_by('-created_at')[:5]
         
         # Get referral earnings
-        referral_earnings = Transaction.objects.filter(
+        referral_earnings = (Transaction.objects.filter(
             user=user,
             transaction_type='referral_bonus',
             status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        ).aggregate(total=Sum('amount'))['total'] or 0) + archive.archived_totals(
+            user, transaction_type='referral_bonus', status='completed'
+        )['amount']
         
         return Response({
             'total_portfolio': total_invested + total_returns,
@@ -1036,12 +1105,14 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get transaction statistics"""
-        total_transactions = Transaction.objects.count()
-        completed_transactions = Transaction.objects.filter(status='completed').count()
+        archived = archive.archived_totals()
+        archived_completed = archive.archived_totals(status='completed')
+        total_transactions = Transaction.objects.count() + archived['count']
+        completed_transactions = Transaction.objects.filter(status='completed').count() + archived_completed['count']
         pending_transactions = Transaction.objects.filter(status='pending').count()
-        total_amount = Transaction.objects.filter(status='completed').aggregate(
+        total_amount = (Transaction.objects.filter(status='completed').aggregate(
             total=Sum('amount')
-        )['total'] or 0
+        )['total'] or 0) + archived_completed['amount']
         
         return Response({
             'total_transactions': total_transactions,
@@ -1102,18 +1173,50 @@ class AdminWithdrawalViewSet(viewsets.ModelViewSet):
         """Mark an approved withdrawal as paid"""
         withdrawal = self.get_object()
 
-        if withdrawal.status != 'approved':
+        with transaction.atomic():
+            # Locked so a concurrent payout run cannot pick it up meanwhile
+            withdrawal = WithdrawalRequest.objects.select_for_update().get(pk=withdrawal.pk)
+
+            if withdrawal.status != 'approved':
+                return Response(
+                    {'error': 'Only approved withdrawals can be marked as paid'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if withdrawal.payout_items.filter(status__in=PayoutItem.OPEN_STATUSES).exists():
+                return Response(
+                    {'error': 'A Paystack transfer for this withdrawal is still in flight'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            withdrawal.status = 'completed'
+            withdrawal.processed_date = timezone.now()
+            withdrawal.admin_notes = (withdrawal.admin_notes or '') + "\nMarked as paid manually by admin."
+            withdrawal.save()
+
+        return Response({'message': 'Withdrawal marked as paid successfully'})
+
+    @action(detail=False, methods=['post'])
+    def payout(self, request):
+        """Pay approved withdrawals out through Paystack bulk transfers"""
+        withdrawal_ids = request.data.get('withdrawal_ids') or None
+        batches, skipped = PayoutService().run(withdrawal_ids, created_by=request.user)
+
+        if not batches and not skipped:
             return Response(
-                {'error': 'Only approved withdrawals can be marked as paid'},
+                {'error': 'No approved withdrawals are waiting for payout'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        withdrawal.status = 'completed'
-        withdrawal.processed_date = timezone.now()
-        withdrawal.admin_notes = (withdrawal.admin_notes or '') + "\nMarked as paid manually by admin."
-        withdrawal.save()
+        return Response({
+            'batches': PayoutBatchSerializer(batches, many=True).data,
+            'skipped': skipped,
+        })
 
-        return Response({'message': 'Withdrawal marked as paid successfully'})
+    @action(detail=False, methods=['get'])
+    def payout_batches(self, request):
+        """List recent payout batches with their per-transfer status"""
+        batches = PayoutBatch.objects.prefetch_related('items__withdrawal__user')[:20]
+        return Response(PayoutBatchSerializer(batches, many=True).data)
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -1136,6 +1239,68 @@ class AdminWithdrawalViewSet(viewsets.ModelViewSet):
             'total_amount': total_amount,
         })
 
+class AdminProjectionView(APIView):
+    """Expected and accrued returns of the active book, per package, with the daily accrual ahead"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        value = request.query_params.get('as_of')
+        try:
+            as_of = parse_date(value) if value else timezone.localdate()
+        except ValueError:  # well formed but impossible, e.g. 2024-02-30
+            as_of = None
+        if as_of is None:
+            return Response({'error': 'as_of must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'error': 'days must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= 366:
+            return Response({'error': 'days must be between 1 and 366'}, status=status.HTTP_400_BAD_REQUEST)
+        if as_of > date.max - timedelta(days=days):
+            return Response({'error': 'as_of is out of range'}, status=status.HTTP_400_BAD_REQUEST)
+
+        investments = Investment.objects.all()
+        package = request.query_params.get('package')
+        if package:
+            if not package.isdigit():
+                return Response({'error': 'package must be a package id'}, status=status.HTTP_400_BAD_REQUEST)
+            investments = investments.filter(package_id=package)
+        return Response(projections.book(investments, as_of, days))
+
+
+class AdminMaturityCalendarView(APIView):
+    """Upcoming payout liability per day, week or month, answered from the maturity calendar"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in maturity_calendar.GRANULARITIES:
+            return Response({'error': 'granularity must be one of: day, week, month'}, status=status.HTTP_400_BAD_REQUEST)
+        kind = request.query_params.get('kind')
+        if kind and kind not in maturity_calendar.SOURCES:
+            return Response({'error': 'kind must be one of: crop, storage'}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = []
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            try:
+                day = parse_date(value) if value else None
+            except ValueError:  # well formed but impossible, e.g. 2024-02-30
+                day = None
+            if value and day is None:
+                return Response({'error': f'{param} must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+            bounds.append(day)
+
+        start = bounds[0] or timezone.localdate()
+        end = bounds[1] or start + min(timedelta(days=90), date.max - start)
+        if end < start:
+            return Response({'error': 'to must not be before from'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(maturity_calendar.calendar(start, end, granularity, kind))
+
+
 class AdminDashboardView(APIView):
     """Admin dashboard overview with investment management actions"""
 
@@ -1162,8 +1327,8 @@ class AdminDashboardView(APIView):
         active_packages = packages.filter(status='active').count()
 
         # Transaction stats
-        total_transactions = transactions.count()
-        completed_transactions = transactions.filter(status='completed').count()
+        total_transactions = transactions.count() + archive.archived_totals()['count']
+        completed_transactions = transactions.filter(status='completed').count() + archive.archived_totals(status='completed')['count']
 
         # Recent activity
         recent_investments = investments.order_by('-investment_date')[:5]
@@ -1291,6 +1456,7 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
+@transaction.atomic
 def process_withdrawal(request, withdrawal_id, action):
     try:
         withdrawal = WithdrawalRequest.objects.select_for_update().get(id=withdrawal_id)
@@ -1308,6 +1474,11 @@ def process_withdrawal(request, withdrawal_id, action):
                     {'error': 'Only approved withdrawals can be marked as paid.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            if withdrawal.payout_items.filter(status__in=PayoutItem.OPEN_STATUSES).exists():
+                return Response(
+                    {'error': 'A Paystack transfer for this withdrawal is still in flight.'},
+                    status=status.HTTP_409_CONFLICT
+                )
             withdrawal.status = 'completed'
             withdrawal.processed_date = timezone.now()
             withdrawal.admin_notes = (withdrawal.admin_notes or '') + "\nMarked as paid manually by admin."
@@ -0,0 +1,27 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from referrals.services.earning_engine import ReferralEarningEngine
+
+
+class Command(BaseCommand):
+    help = 'Book referral earnings for paid investments. Safe to re-run over the same window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only investments made on or after this day (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only investments made on or before this day (YYYY-MM-DD)')
+
+    def parse_day(self, value, at):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return timezone.make_aware(datetime.combine(day, at))
+
+    def handle(self, *args, **options):
+        start = self.parse_day(options['since'], time.min) if options['since'] else None
+        end = self.parse_day(options['until'], time.max) if options['until'] else None
+        created = ReferralEarningEngine().run(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Done. Created {created} referral earnings.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from referrals.services.bonus_engine import ReferralBonusEngine
+
+
+class Command(BaseCommand):
+    help = 'Pay active referral bonus tiers to referrers who qualify. Each tier is paid once per referrer.'
+
+    def handle(self, *args, **options):
+        awarded = ReferralBonusEngine().run()
+        self.stdout.write(self.style.SUCCESS(f'Done. Issued {awarded} referral bonuses.'))
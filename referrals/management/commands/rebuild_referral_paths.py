@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from referrals.services import referral_graph
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the referral closure table from existing referrals.'
+
+    def handle(self, *args, **options):
+        total = referral_graph.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done. Stored {total} referral paths.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0015_idempotency_keys'),
+        ('referrals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='referralearning',
+            constraint=models.UniqueConstraint(fields=('referral', 'investment'), name='unique_earning_per_investment'),
+        ),
+    ]
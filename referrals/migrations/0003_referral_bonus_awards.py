@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0015_idempotency_keys'),
+        ('referrals', '0002_unique_earning_per_investment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralBonusAward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('qualifying_referrals', models.PositiveIntegerField()),
+                ('qualifying_volume', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bonus', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='awards', to='referrals.referralbonus')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referral_bonus_award', to='investments.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_bonus_awards', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('bonus', 'user'), name='unique_bonus_award_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0003_referral_bonus_awards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,12 +1,50 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 from django.utils import timezone
-import uuid
-from users.models import Notification
+from users.services import notifications as notification_service
 
 User = get_user_model()
 
+
+def paid_earnings_subquery(**filters):
+    """Sum of paid ReferralEarning amounts matching ``filters``, for use in annotate()"""
+    return Subquery(
+        ReferralEarning.objects.filter(status='paid', **filters)
+        .order_by()
+        .values('status')
+        .annotate(total=Sum('amount'))
+        .values('total'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class ReferralCodeQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Referral counts and paid earnings in the same query as the codes"""
+        return self.select_related('user').annotate(
+            referrals_total=Count('referrals', distinct=True),
+            active_referrals_total=Count('referrals', filter=Q(referrals__status='active'), distinct=True),
+            paid_earnings_total=paid_earnings_subquery(referral__referral_code=OuterRef('pk')),
+        )
+
+
+class ReferralQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Users, code and paid earnings in the same query as the referrals"""
+        return self.select_related('referrer', 'referred_user', 'referral_code').annotate(
+            paid_earnings_total=paid_earnings_subquery(referral=OuterRef('pk')),
+        )
+
+
+class ReferralEarningQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related(
+            'referral__referrer', 'referral__referred_user', 'investment__package'
+        )
+
+
 class ReferralCode(models.Model):
     """Model for user referral codes"""
     
@@ -15,6 +53,8 @@ class ReferralCode(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReferralCodeQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.user.email} - {self.code}"
@@ -27,14 +67,18 @@ class ReferralCode(models.Model):
     
     def generate_unique_code(self):
         """Generate a unique referral code"""
-        while True:
-            # Generate a code based on user's name and random string
-            base = self.user.first_name[:3].upper() if self.user.first_name else 'USER'
-            random_part = str(uuid.uuid4())[:6].upper()
-            code = f"{base}{random_part}"
-            
-            if not ReferralCode.objects.filter(code=code).exists():
-                return code
+        from .services.code_allocator import allocate_codes
+        return allocate_codes([self.user.first_name])[0]
+
+
+class ReferralCodeCounter(models.Model):
+    """Single-row counter that referral codes are allocated from"""
+
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Next referral code #{self.next_value}"
+
 
 class Referral(models.Model):
     """Model for tracking referrals"""
@@ -63,6 +107,8 @@ class Referral(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     activated_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ReferralQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
@@ -77,10 +123,10 @@ class Referral(models.Model):
             self.activated_at = timezone.now()
             self.save()
             # Create notification for referrer
-            Notification.objects.create(
-                user=self.referrer,
-                notification_type='referral',
-                message=f"Your referral {self.referred_user.email} has made their first investment!"
+            notification_service.notify(
+                self.referrer,
+                'referral',
+                f"Your referral {self.referred_user.email} has made their first investment!"
             )
     
     def complete(self):
@@ -110,9 +156,14 @@ class ReferralEarning(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ReferralEarningQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['referral', 'investment'], name='unique_earning_per_investment'),
+        ]
     
     def __str__(self):
         return f"{self.referral.referrer.email} - ₦{self.amount}"
@@ -133,10 +184,10 @@ class ReferralEarning(models.Model):
         super().save(*args, **kwargs)
         if is_new:
             # Create notification for referrer
-            Notification.objects.create(
-                user=self.referral.referrer,
-                notification_type='earning',
-                message=f"You earned ₦{self.amount} from referral {self.referral.referred_user.email}'s investment."
+            notification_service.notify(
+                self.referral.referrer,
+                'earning',
+                f"You earned ₦{self.amount} from referral {self.referral.referred_user.email}'s investment."
             )
 
 class ReferralBonus(models.Model):
@@ -173,3 +224,48 @@ class ReferralBonus(models.Model):
         elif self.bonus_type == 'percentage' and investment_amount:
             return investment_amount * (self.bonus_amount / 100)
         return 0
+
+class ReferralBonusAward(models.Model):
+    """Record of a bonus tier paid to a referrer, so each tier is paid once"""
+    
+    bonus = models.ForeignKey(ReferralBonus, on_delete=models.CASCADE, related_name='awards')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_bonus_awards')
+    transaction = models.OneToOneField(
+        'investments.Transaction',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='referral_bonus_award'
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    qualifying_referrals = models.PositiveIntegerField()
+    qualifying_volume = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['bonus', 'user'], name='unique_bonus_award_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.bonus.name} - ₦{self.amount}"
+
+class ReferralPath(models.Model):
+    """Closure table of the referral tree: one row per (ancestor, descendant) pair"""
+    
+    ancestor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='downline_paths')
+    descendant = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upline_paths')
+    depth = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_referral_path'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth']),
+            models.Index(fields=['descendant', 'depth']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
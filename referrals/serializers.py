@@ -23,13 +23,21 @@ class ReferralCodeSerializer(serializers.ModelSerializer):
     def get_user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.email
 
+    # The *_total attributes are set by ReferralCode.objects.with_stats()
+
     def get_referrals_count(self, obj):
+        if hasattr(obj, 'referrals_total'):
+            return obj.referrals_total
         return obj.referrals.count()
 
     def get_active_referrals(self, obj):
+        if hasattr(obj, 'active_referrals_total'):
+            return obj.active_referrals_total
         return obj.referrals.filter(status='active').count()
 
     def get_total_earnings(self, obj):
+        if hasattr(obj, 'paid_earnings_total'):
+            return obj.paid_earnings_total or 0
         return ReferralEarning.objects.filter(
             referral__referral_code=obj,
             status='paid'
@@ -61,6 +69,9 @@ class ReferralSerializer(serializers.ModelSerializer):
         return f"{obj.referred_user.first_name} {obj.referred_user.last_name}".strip() or obj.referred_user.email
 
     def get_earnings(self, obj):
+        # Set by Referral.objects.with_stats()
+        if hasattr(obj, 'paid_earnings_total'):
+            return obj.paid_earnings_total or 0
         return ReferralEarning.objects.filter(
             referral=obj,
             status='paid'
@@ -0,0 +1,114 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from investments.models import Investment, Transaction
+from ..models import ReferralBonus, ReferralBonusAward
+
+
+class ReferralBonusEngine:
+    """Pays ReferralBonus tiers to the referrers who qualify for them.
+
+    A referral qualifies for a tier when it is active or completed and the
+    referred user has at least ``min_investment_amount`` in paid
+    investments. A referrer earns the tier once they have ``min_referrals``
+    qualifying referrals; percentage tiers are applied to the qualifying
+    referrals' invested volume. Invested totals come from one grouped
+    query ordered by referrer, which is folded per referrer as it streams.
+    """
+
+    PAID_STATUSES = ['active', 'completed']
+    QUALIFYING_REFERRAL_STATUSES = ['active', 'completed']
+    CHUNK_SIZE = 2000
+
+    def invested_per_referral(self):
+        """(referrer_id, referred_user_id, total invested) for every qualifying referral"""
+        return Investment.objects.filter(
+            status__in=self.PAID_STATUSES,
+            user__referred_by__status__in=self.QUALIFYING_REFERRAL_STATUSES,
+        ).values_list(
+            'user__referred_by__referrer_id', 'user_id'
+        ).annotate(total=Sum('amount')).order_by('user__referred_by__referrer_id', 'user_id')
+
+    def referrer_stats(self, bonuses):
+        """Yield (referrer_id, {bonus_id: (count, volume)}) for each referrer"""
+        current = None
+        stats = {}
+        for referrer_id, _, total in self.invested_per_referral().iterator(chunk_size=self.CHUNK_SIZE):
+            if referrer_id != current:
+                if current is not None:
+                    yield current, stats
+                current = referrer_id
+                stats = {bonus.id: (0, Decimal('0')) for bonus in bonuses}
+            total = Decimal(total or 0)
+            if total <= 0:
+                continue
+            for bonus in bonuses:
+                if total >= bonus.min_investment_amount:
+                    count, volume = stats[bonus.id]
+                    stats[bonus.id] = (count + 1, volume + total)
+        if current is not None:
+            yield current, stats
+
+    def run(self):
+        """Issue every bonus that is due. Returns the number of awards made."""
+        bonuses = list(ReferralBonus.objects.filter(is_active=True))
+        if not bonuses:
+            return 0
+
+        awarded = {bonus.id: set() for bonus in bonuses}
+        for bonus_id, user_id in ReferralBonusAward.objects.filter(
+            bonus__in=bonuses
+        ).values_list('bonus_id', 'user_id').iterator(chunk_size=self.CHUNK_SIZE):
+            awarded[bonus_id].add(user_id)
+
+        total = 0
+        pending = []
+        for referrer_id, stats in self.referrer_stats(bonuses):
+            for bonus in bonuses:
+                count, volume = stats[bonus.id]
+                if count < bonus.min_referrals or referrer_id in awarded[bonus.id]:
+                    continue
+                amount = Decimal(bonus.calculate_bonus(volume)).quantize(Decimal('0.01'))
+                if amount <= 0:
+                    continue
+                pending.append((bonus, referrer_id, amount, count, volume))
+
+            if len(pending) >= self.CHUNK_SIZE:
+                total += self.issue(pending)
+                pending = []
+
+        if pending:
+            total += self.issue(pending)
+        return total
+
+    def issue(self, pending):
+        """Create the bonus transactions and their awards for one chunk"""
+        now = timezone.now()
+        transactions = [
+            Transaction(
+                user_id=user_id,
+                transaction_type='referral_bonus',
+                amount=amount,
+                status='completed',
+                completed_at=now,
+                description=f'Referral bonus: {bonus.name}',
+            )
+            for bonus, user_id, amount, count, volume in pending
+        ]
+        with transaction.atomic():
+            Transaction.objects.bulk_create(transactions)
+            ReferralBonusAward.objects.bulk_create([
+                ReferralBonusAward(
+                    bonus=bonus,
+                    user_id=user_id,
+                    transaction=bonus_transaction,
+                    amount=amount,
+                    qualifying_referrals=count,
+                    qualifying_volume=volume,
+                )
+                for (bonus, user_id, amount, count, volume), bonus_transaction in zip(pending, transactions)
+            ])
+        return len(pending)
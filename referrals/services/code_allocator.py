@@ -0,0 +1,88 @@
+"""
+Referral code allocation without uniqueness lookups.
+
+Each code is ``<prefix><7 chars>``. The 7 characters encode a value taken
+from a database counter, scrambled with a keyed Feistel permutation so
+consecutive codes don't look sequential:
+
+* 30 permuted bits as 6 Crockford base32 characters
+* the next 4 bits as one character from ``TAIL_ALPHABET``
+
+Distinct counter values always give distinct suffixes, and the prefix
+length is implied by the code length, so two allocated codes can never
+collide. ``TAIL_ALPHABET`` has no hex digits, which keeps new codes
+disjoint from the legacy ``<prefix><6 hex>`` codes as well.
+"""
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from ..models import ReferralCodeCounter
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford base32
+TAIL_ALPHABET = 'GHJKMNPQRSTVWXYZ'
+HALF_BITS = 15
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+CAPACITY = 1 << 34
+DEFAULT_PREFIX = 'USER'
+
+
+def get_key():
+    # Must never change once codes have been issued, or new codes can repeat old ones
+    return getattr(settings, 'REFERRAL_CODE_KEY', 'agri-invest-referral-codes').encode()
+
+
+def permute(value, key):
+    """Keyed bijection on 30-bit integers (balanced Feistel network)"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_number in range(ROUNDS):
+        digest = hmac.new(key, f'{round_number}:{right}'.encode(), hashlib.sha256).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:4], 'big') & HALF_MASK)
+    return (left << HALF_BITS) | right
+
+
+def encode(value, key):
+    """Turn a counter value into the 7-character code suffix"""
+    scrambled = permute(value & ((1 << 30) - 1), key)
+    chars = []
+    for _ in range(6):
+        chars.append(ALPHABET[scrambled & 31])
+        scrambled >>= 5
+    chars.append(TAIL_ALPHABET[(value >> 30) & 15])
+    return ''.join(reversed(chars[:6])) + chars[6]
+
+
+def code_prefix(first_name):
+    """Up to three ASCII letters from the first name, as before"""
+    letters = re.sub(r'[^A-Z]', '', (first_name or '').upper())
+    return letters[:3] or DEFAULT_PREFIX
+
+
+def reserve(count):
+    """Reserve ``count`` consecutive counter values and return the first"""
+    with transaction.atomic():
+        ReferralCodeCounter.objects.get_or_create(pk=1)
+        ReferralCodeCounter.objects.filter(pk=1).update(next_value=F('next_value') + count)
+        end = ReferralCodeCounter.objects.values_list('next_value', flat=True).get(pk=1)
+    start = end - count
+    if end > CAPACITY:
+        raise OverflowError('Referral code space exhausted')
+    return start
+
+
+def allocate_codes(first_names):
+    """Return one unique code per first name, using a single counter reservation"""
+    first_names = list(first_names)
+    if not first_names:
+        return []
+    key = get_key()
+    start = reserve(len(first_names))
+    return [
+        f"{code_prefix(first_name)}{encode(start + offset, key)}"
+        for offset, first_name in enumerate(first_names)
+    ]
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef, Value
+from django.utils import timezone
+
+from investments.models import Investment
+from users.models import Notification
+from users.services import notifications as notification_service
+from ..models import Referral, ReferralEarning
+
+
+class ReferralEarningEngine:
+    """Books referral commissions for paid investments in bulk.
+
+    A referrer earns ``commission_rate`` percent of their referral's first
+    active or completed investment. The engine anti-joins against existing
+    earnings, so re-running it over the same window creates nothing new.
+    """
+
+    EARNING_STATUSES = ['active', 'completed']
+
+    def eligible_investments(self, start=None, end=None):
+        """Paid investments of referred users whose referral has not earned yet"""
+        already_earned = ReferralEarning.objects.filter(referral_id=OuterRef('user__referred_by__id'))
+        queryset = Investment.objects.filter(
+            status__in=self.EARNING_STATUSES,
+            user__referred_by__isnull=False,
+            user__referred_by__status__in=['pending', 'active'],
+        ).filter(~Exists(already_earned))
+
+        if start:
+            queryset = queryset.filter(investment_date__gte=start)
+        if end:
+            queryset = queryset.filter(investment_date__lte=end)
+
+        return queryset.annotate(
+            referral_id=F('user__referred_by__id'),
+            referral_status=F('user__referred_by__status'),
+            referrer_id=F('user__referred_by__referrer_id'),
+            rate=F('user__referred_by__commission_rate'),
+            commission=ExpressionWrapper(
+                F('amount') * F('user__referred_by__commission_rate') / Value(100),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            referred_email=F('user__email'),
+        ).order_by('referral_id', 'investment_date', 'id').values(
+            'id', 'referral_id', 'referral_status', 'referrer_id',
+            'rate', 'commission', 'referred_email',
+        )
+
+    def run(self, start=None, end=None):
+        """Create earnings, activate referrals and notify referrers. Returns the number of earnings."""
+        # First qualifying investment per referral
+        first_investments = OrderedDict()
+        for row in self.eligible_investments(start, end):
+            first_investments.setdefault(row['referral_id'], row)
+
+        if not first_investments:
+            return 0
+
+        now = timezone.now()
+        earnings = []
+        notifications = []
+        activated = []
+        for row in first_investments.values():
+            row['commission'] = Decimal(row['commission']).quantize(Decimal('0.01'))
+            earnings.append(ReferralEarning(
+                referral_id=row['referral_id'],
+                investment_id=row['id'],
+                amount=row['commission'],
+                commission_rate=row['rate'],
+                status='pending',
+            ))
+            if row['referral_status'] == 'pending':
+                activated.append(row['referral_id'])
+                notifications.append(Notification(
+                    user_id=row['referrer_id'],
+                    notification_type='referral',
+                    message=f"Your referral {row['referred_email']} has made their first investment!"
+                ))
+            notifications.append(Notification(
+                user_id=row['referrer_id'],
+                notification_type='earning',
+                message=f"You earned ₦{row['commission']} from referral {row['referred_email']}'s investment."
+            ))
+
+        with transaction.atomic():
+            ReferralEarning.objects.bulk_create(earnings)
+            Referral.objects.filter(id__in=activated, status='pending').update(
+                status='active', activated_at=now
+            )
+            notification_service.notify_many(notifications)
+
+        return len(earnings)
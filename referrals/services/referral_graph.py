@@ -0,0 +1,125 @@
+"""
+Multi-level referral queries backed by the ReferralPath closure table.
+
+Every referrer → referred_user edge adds a path from each of the referrer's
+ancestors (and the referrer) to the referred user and their existing
+downline, so "everyone below X" is a single indexed lookup on
+``ancestor``.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+
+from ..models import Referral, ReferralPath
+
+PAID_INVESTMENT_STATUSES = ['active', 'completed']
+CHUNK_SIZE = 5000
+
+paid_volume = Sum(
+    'descendant__investments__amount',
+    filter=Q(descendant__investments__status__in=PAID_INVESTMENT_STATUSES),
+)
+
+
+def upline(user_id):
+    """[(ancestor_id, depth)] including the user itself at depth 0"""
+    return [(user_id, 0)] + list(
+        ReferralPath.objects.filter(descendant_id=user_id).values_list('ancestor_id', 'depth')
+    )
+
+
+def downline(user_id):
+    """[(descendant_id, depth)] including the user itself at depth 0"""
+    return [(user_id, 0)] + list(
+        ReferralPath.objects.filter(ancestor_id=user_id).values_list('descendant_id', 'depth')
+    )
+
+
+def add_referral(referrer_id, referred_user_id):
+    """Link the referred user's subtree under the referrer. Returns False if it would form a cycle."""
+    ancestors = upline(referrer_id)
+    if any(ancestor_id == referred_user_id for ancestor_id, _ in ancestors):
+        return False
+
+    descendants = downline(referred_user_id)
+    ReferralPath.objects.bulk_create([
+        ReferralPath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+        for ancestor_id, up in ancestors
+        for descendant_id, down in descendants
+    ], batch_size=CHUNK_SIZE, ignore_conflicts=True)
+    return True
+
+
+def remove_referral(referrer_id, referred_user_id):
+    """Detach the referred user's subtree from everyone above it"""
+    ancestor_ids = [ancestor_id for ancestor_id, _ in upline(referrer_id)]
+    descendant_ids = [descendant_id for descendant_id, _ in downline(referred_user_id)]
+    ReferralPath.objects.filter(ancestor_id__in=ancestor_ids, descendant_id__in=descendant_ids).delete()
+
+
+def downline_levels(user_id, max_depth=None):
+    """Member count and paid investment volume per level below the user"""
+    paths = ReferralPath.objects.filter(ancestor_id=user_id)
+    if max_depth:
+        paths = paths.filter(depth__lte=max_depth)
+    return list(paths.values('depth').annotate(
+        members=Count('descendant', distinct=True),
+        volume=paid_volume,
+    ).order_by('depth'))
+
+
+def downline_summary(user_id, max_depth=None):
+    levels = downline_levels(user_id, max_depth)
+    return {
+        'total_members': sum(level['members'] for level in levels),
+        'max_depth': levels[-1]['depth'] if levels else 0,
+        'total_volume': sum(level['volume'] or 0 for level in levels),
+        'levels': [
+            {'depth': level['depth'], 'members': level['members'], 'volume': level['volume'] or 0}
+            for level in levels
+        ],
+    }
+
+
+def top_referrers(limit=10, order_by='members', max_depth=None):
+    """Users with the largest downline, by member count or paid volume"""
+    paths = ReferralPath.objects.all()
+    if max_depth:
+        paths = paths.filter(depth__lte=max_depth)
+    ordering = '-volume' if order_by == 'volume' else '-members'
+    return list(paths.values(
+        'ancestor_id', 'ancestor__email', 'ancestor__first_name', 'ancestor__last_name'
+    ).annotate(
+        members=Count('descendant', distinct=True),
+        depth=Max('depth'),
+        volume=paid_volume,
+    ).order_by(ordering, 'ancestor_id')[:limit])
+
+
+def rebuild():
+    """Recreate the closure table from the Referral edges. Returns the number of paths."""
+    parent = dict(Referral.objects.values_list('referred_user_id', 'referrer_id'))
+
+    def ancestors_of(user_id):
+        chain = []
+        seen = {user_id}
+        current = parent.get(user_id)
+        while current is not None and current not in seen:
+            chain.append(current)
+            seen.add(current)
+            current = parent.get(current)
+        return chain
+
+    total = 0
+    with transaction.atomic():
+        ReferralPath.objects.all().delete()
+        batch = []
+        for descendant_id in parent:
+            for depth, ancestor_id in enumerate(ancestors_of(descendant_id), start=1):
+                batch.append(ReferralPath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth))
+            if len(batch) >= CHUNK_SIZE:
+                ReferralPath.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        ReferralPath.objects.bulk_create(batch)
+        total += len(batch)
+    return total
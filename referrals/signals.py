@@ -0,0 +1,20 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Referral
+from .services import referral_graph
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Referral)
+def add_referral_paths(sender, instance, created, **kwargs):
+    if created and not referral_graph.add_referral(instance.referrer_id, instance.referred_user_id):
+        logger.warning("Referral %s would create a cycle; not added to the referral graph", instance.pk)
+
+
+@receiver(post_delete, sender=Referral)
+def remove_referral_paths(sender, instance, **kwargs):
+    referral_graph.remove_referral(instance.referrer_id, instance.referred_user_id)
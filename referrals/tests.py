@@ -1,3 +1,167 @@
+import re
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from investments.models import Investment, Transaction
+from investments.tests import crop_investment, investment_package
+from users.models import Notification, User
+
+from .models import Referral, ReferralBonus, ReferralBonusAward, ReferralCode, ReferralEarning, ReferralPath
+from .services import code_allocator, referral_graph
+from .services.bonus_engine import ReferralBonusEngine
+from .services.earning_engine import ReferralEarningEngine
+
+
+def user(email, **kwargs):
+    return User.objects.create_user(email=email, password='x', **kwargs)
+
+
+def link(referrer, referred):
+    code, _ = ReferralCode.objects.get_or_create(user=referrer, defaults={'code': f'C{referrer.id}X'})
+    return Referral.objects.create(referrer=referrer, referred_user=referred, referral_code=code)
+
+
+class ReferralEarningEngineTests(TestCase):
+    def test_accrues_once_per_active_investment(self):
+        referrer, first, second = user('referrer@example.com'), user('first@example.com'), user('second@example.com')
+        code = ReferralCode.objects.create(user=referrer)
+        default_rate = Referral.objects.create(referrer=referrer, referred_user=first, referral_code=code)
+        custom_rate = Referral.objects.create(
+            referrer=referrer, referred_user=second, referral_code=code, commission_rate=Decimal('7.5')
+        )
+        package = investment_package()
+        crop_investment(first, package, '1000')
+        crop_investment(first, package, '2000')
+        crop_investment(second, package, '333', status='pending')
+        # Saving an investment no longer accrues anything by itself
+        self.assertFalse(ReferralEarning.objects.exists())
+
+        with self.assertNumQueries(6):
+            self.assertEqual(ReferralEarningEngine().run(), 1)
+        self.assertEqual(ReferralEarningEngine().run(), 0)
+        self.assertEqual(ReferralEarning.objects.get().amount, Decimal('50.00'))
+        default_rate.refresh_from_db()
+        self.assertEqual(default_rate.status, 'active')
+        self.assertEqual(Notification.objects.count(), 2)
+
+        Investment.objects.filter(user=second).update(status='active')
+        ReferralEarningEngine().run()
+        self.assertEqual(ReferralEarning.objects.get(referral=custom_rate).amount, Decimal('24.98'))
+
+
+class ReferralBonusEngineTests(TestCase):
+    def test_awards_each_qualifying_tier_once(self):
+        package = investment_package()
+        referrer = user('referrer@example.com')
+        code = ReferralCode.objects.create(user=referrer)
+        for i in range(3):
+            referred = user(f'referred{i}@example.com')
+            Referral.objects.create(referrer=referrer, referred_user=referred, referral_code=code, status='active')
+            crop_investment(referred, package, '600000' if i == 0 else '1000')
+        # Pending volume does not count towards a tier
+        other = user('other@example.com')
+        referred = user('pending@example.com')
+        Referral.objects.create(
+            referrer=other, referred_user=referred, referral_code=ReferralCode.objects.create(user=other),
+            status='active',
+        )
+        crop_investment(referred, package, '1000', status='pending')
+
+        ReferralBonus.objects.create(name='Three', description='', min_referrals=3, bonus_amount=Decimal('5000'))
+        ReferralBonus.objects.create(
+            name='Big', description='', min_referrals=1, min_investment_amount=Decimal('500000'),
+            bonus_amount=Decimal('10'), bonus_type='percentage',
+        )
+        ReferralBonus.objects.create(name='Ten', description='', min_referrals=10, bonus_amount=Decimal('1'))
+
+        with self.assertNumQueries(7):
+            self.assertEqual(ReferralBonusEngine().run(), 2)
+        self.assertEqual(ReferralBonusEngine().run(), 0)
+        self.assertEqual(
+            sorted(ReferralBonusAward.objects.values_list(
+                'bonus__name', 'amount', 'qualifying_referrals', 'qualifying_volume'
+            )),
+            [('Big', Decimal('60000.00'), 1, Decimal('600000.00')), ('Three', Decimal('5000.00'), 3, Decimal('602000.00'))],
+        )
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('amount', flat=True)), [Decimal('5000.00'), Decimal('60000.00')]
+        )
+
+
+class ReferralCodeAllocatorTests(TestCase):
+    def test_counter_values_map_to_distinct_codes(self):
+        key = code_allocator.get_key()
+        permuted = [code_allocator.permute(value, key) for value in range(0, 1 << 30, 4099)]
+        self.assertEqual(len(set(permuted)), len(permuted))
+        suffixes = {code_allocator.encode(value, key) for value in range(100000)}
+        self.assertEqual(len(suffixes), 100000)
+
+    def test_codes_keep_the_name_prefix_and_never_look_like_legacy_codes(self):
+        codes = code_allocator.allocate_codes(['Ada', 'Jo-e', '', 'Émile'])
+        self.assertEqual([re.sub(r'.{7}$', '', code) for code in codes], ['ADA', 'JOE', 'USER', 'MIL'])
+        self.assertTrue(all(code[-1] in code_allocator.TAIL_ALPHABET for code in codes))
+
+    def test_backfill_gives_every_user_without_a_code_one(self):
+        User.objects.bulk_create([User(email=f'member{i}@example.com', first_name='Ada') for i in range(2000)])
+        existing = ReferralCode.objects.create(user=User.objects.first())
+
+        call_command('generate_referral_codes', stdout=StringIO())
+        self.assertEqual(ReferralCode.objects.count(), 2000)
+        self.assertEqual(ReferralCode.objects.get(pk=existing.pk).code, existing.code)
+
+
+class ReferralGraphTests(TestCase):
+    def paths(self):
+        return set(ReferralPath.objects.values_list('ancestor', 'descendant', 'depth'))
+
+    def test_downline_across_levels(self):
+        a, b, c, d, e = [user(f'{name}@example.com') for name in 'abcde']
+        # Build a subtree first, then attach it under a
+        link(b, c)
+        link(c, e)
+        link(a, b)
+        link(a, d)
+        package = investment_package()
+        crop_investment(c, package, '500')
+        crop_investment(e, package, '200')
+        crop_investment(d, package, '100', status='pending')
+
+        summary = referral_graph.downline_summary(a.id)
+        self.assertEqual(summary['total_members'], 4)
+        self.assertEqual(summary['max_depth'], 3)
+        self.assertEqual([level['members'] for level in summary['levels']], [2, 1, 1])
+        self.assertEqual(summary['total_volume'], 700)
+
+        before = self.paths()
+        self.assertEqual(referral_graph.rebuild(), len(before))
+        self.assertEqual(self.paths(), before)
+
+    def test_cycles_are_refused_and_deletes_detach_subtrees(self):
+        a, b, c = [user(f'{name}@example.com') for name in 'abc']
+        link(a, b)
+        link(b, c)
+        self.assertFalse(referral_graph.add_referral(c.id, a.id))
+
+        Referral.objects.get(referred_user=b).delete()
+        self.assertEqual(referral_graph.downline_summary(a.id)['total_members'], 0)
+        self.assertEqual(referral_graph.downline_summary(b.id)['total_members'], 1)
+        self.assertEqual(referral_graph.top_referrers()[0]['ancestor_id'], b.id)
+
+    def test_downline_and_top_referrer_endpoints(self):
+        referrer, admin = user('referrer@example.com'), user('admin@example.com', is_staff=True)
+        link(referrer, admin)
+        client = APIClient()
+
+        client.force_authenticate(referrer)
+        response = client.get('/api/referrals/referrals/downline/?max_depth=2')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['total_members'], 1)
 
-# Create your tests here.
+        client.force_authenticate(admin)
+        response = client.get('/api/referrals/admin/referrals/top_referrers/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data[0]['downline_total'], 1)
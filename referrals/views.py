@@ -8,6 +8,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 from .models import ReferralCode, Referral, ReferralEarning, ReferralBonus
+from .services import referral_graph
 from .serializers import (
     ReferralCodeSerializer,
     ReferralSerializer,
@@ -23,7 +24,7 @@ class ReferralCodeViewSet(viewsets.ModelViewSet):
     serializer_class = ReferralCodeSerializer
     
     def get_queryset(self):
-        return ReferralCode.objects.filter(user=self.request.user)
+        return ReferralCode.objects.with_stats().filter(user=self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -32,7 +33,7 @@ class ReferralCodeViewSet(viewsets.ModelViewSet):
     def my_code(self, request):
         """Get current user's referral code"""
         try:
-            referral_code = ReferralCode.objects.get(user=request.user)
+            referral_code = ReferralCode.objects.with_stats().get(user=request.user)
             serializer = self.get_serializer(referral_code)
             return Response(serializer.data)
         except ReferralCode.DoesNotExist:
@@ -57,7 +58,7 @@ class ReferralViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ReferralSerializer
     
     def get_queryset(self):
-        return Referral.objects.filter(referrer=self.request.user)
+        return Referral.objects.with_stats().filter(referrer=self.request.user)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -127,6 +128,16 @@ class ReferralViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(earnings_data[::-1])  # Reverse to show oldest first
 
+    @action(detail=False, methods=['get'])
+    def downline(self, request):
+        """Get the whole downline: member count, depth and volume per level"""
+        try:
+            max_depth = int(request.query_params.get('max_depth', 0))
+        except ValueError:
+            return Response({'error': 'max_depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(referral_graph.downline_summary(request.user.id, max_depth or None))
+
 class ReferralEarningViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing referral earnings"""
     
@@ -134,7 +145,7 @@ class ReferralEarningViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ReferralEarningSerializer
     
     def get_queryset(self):
-        return ReferralEarning.objects.filter(referral__referrer=self.request.user)
+        return ReferralEarning.objects.with_related().filter(referral__referrer=self.request.user)
     
     @action(detail=False, methods=['get'])
     def recent(self, request):
@@ -185,7 +196,7 @@ class ReferralDashboardView(APIView):
         referral_code, created = ReferralCode.objects.get_or_create(user=user)
 
         # Get referral statistics
-        referrals = Referral.objects.filter(referrer=user)
+        referrals = Referral.objects.with_stats().filter(referrer=user)
         total_referrals = referrals.count()
         active_referrals = referrals.filter(status='active').count()
 
@@ -204,7 +215,7 @@ class ReferralDashboardView(APIView):
         recent_referrals = referrals.order_by('-created_at')[:5]
 
         # Get recent earnings
-        recent_earnings = ReferralEarning.objects.filter(
+        recent_earnings = ReferralEarning.objects.with_related().filter(
             referral__referrer=user
         ).order_by('-created_at')[:5]
 
@@ -270,18 +281,43 @@ class AdminReferralCodeViewSet(viewsets.ReadOnlyModelViewSet):
 
     permission_classes = [IsAdminUser]
     serializer_class = ReferralCodeSerializer
-    queryset = ReferralCode.objects.all()
+    queryset = ReferralCode.objects.with_stats()
 
 class AdminReferralViewSet(viewsets.ReadOnlyModelViewSet):
     """Admin ViewSet for viewing all referrals"""
 
     permission_classes = [IsAdminUser]
     serializer_class = ReferralSerializer
-    queryset = Referral.objects.all()
+    queryset = Referral.objects.with_stats()
+
+    @action(detail=False, methods=['get'])
+    def top_referrers(self, request):
+        """Get users with the largest downline (?order_by=members|volume)"""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 100)
+            max_depth = int(request.query_params.get('max_depth', 0))
+        except ValueError:
+            return Response({'error': 'limit and max_depth must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = referral_graph.top_referrers(
+            limit=limit,
+            order_by=request.query_params.get('order_by', 'members'),
+            max_depth=max_depth or None,
+        )
+        return Response([{
+            'user': {
+                'id': row['ancestor_id'],
+                'email': row['ancestor__email'],
+                'name': f"{row['ancestor__first_name']} {row['ancestor__last_name']}".strip() or row['ancestor__email'],
+            },
+            'downline_total': row['members'],
+            'max_depth': row['depth'],
+            'downline_volume': row['volume'] or 0,
+        } for row in rows])
 
 class AdminReferralEarningViewSet(viewsets.ReadOnlyModelViewSet):
     """Admin ViewSet for viewing all referral earnings"""
 
     permission_classes = [IsAdminUser]
     serializer_class = ReferralEarningSerializer
-    queryset = ReferralEarning.objects.all()
+    queryset = ReferralEarning.objects.with_related()
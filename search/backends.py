@@ -0,0 +1,195 @@
+"""
+Full-text backends. Each one keeps a document per SearchEntry (keyed by the
+entry id) and renders a query as SQL selecting ``(object_id, rank)`` for
+every match, lower ranks first (``matches``). ``search`` reads the best ids
+from it directly; search/index.py embeds it in a queryset's own SQL, so the
+queryset's filters see every hit.
+
+SQLite uses FTS5: a unicode61 table for word and prefix matches, plus a
+trigram table that catches typos and substrings (phone numbers, partial
+emails) when the word query matches nothing. Postgres uses a generated
+``tsvector`` column for prefix matches and ``pg_trgm`` word similarity for
+typos.
+"""
+import re
+
+WORD_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+FUZZY_THRESHOLD = 0.4
+
+
+def query_terms(query):
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def trigrams(text):
+    return {
+        word[i:i + 3]
+        for word in WORD_RE.findall(text.lower())
+        for i in range(len(word) - 2)
+    }
+
+
+class Backend:
+    def matches(self, kind, query):
+        raise NotImplementedError
+
+    def search(self, connection, kind, query, limit):
+        matches = self.matches(kind, query)
+        if matches is None:
+            return []
+        sql, params = matches
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT object_id FROM ({sql}) matches ORDER BY rank LIMIT %s", [*params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteBackend(Backend):
+    table = 'search_fts'
+    fuzzy_table = 'search_fts_trigram'
+
+    def create_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fuzzy_table} USING fts5("
+                "content, tokenize='trigram')"
+            )
+
+    def drop_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.fuzzy_table}")
+
+    def upsert(self, connection, documents):
+        """``documents`` is a list of (entry_id, text)"""
+        self.delete(connection, [entry_id for entry_id, _ in documents])
+        with connection.cursor() as cursor:
+            for table in (self.table, self.fuzzy_table):
+                cursor.executemany(f"INSERT INTO {table} (rowid, content) VALUES (%s, %s)", documents)
+
+    def delete(self, connection, entry_ids):
+        if not entry_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(entry_ids))
+        with connection.cursor() as cursor:
+            for table in (self.table, self.fuzzy_table):
+                cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", list(entry_ids))
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            for table in (self.table, self.fuzzy_table):
+                cursor.execute(f"DELETE FROM {table}")
+
+    @staticmethod
+    def _prefix_match(terms):
+        # Every term, each as a prefix: "joh" finds "john"
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def matches(self, kind, query):
+        """
+        ``(sql, params)`` selecting (object_id, rank) of the word and prefix matches, or when there
+        are none, of the documents sharing enough trigrams with ``query``. None if it has no terms.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+
+        # The unary + keeps SQLite from driving the join off the (kind, object_id)
+        # index, which runs the MATCH once per entry (seconds for a broad query)
+        words = (
+            f"SELECT e.object_id AS object_id, f.rank AS rank FROM {self.table} f "
+            "JOIN search_searchentry e ON e.id = f.rowid "
+            f"WHERE {self.table} MATCH %s AND +e.kind = %s"
+        )
+        word_params = [self._prefix_match(terms), kind]
+        grams = sorted(trigrams(query))
+        if not grams:
+            return words, word_params
+
+        # One MATCH per trigram; a document's row count is the number it shares with the query
+        shared = ' UNION ALL '.join(
+            [f"SELECT rowid FROM {self.fuzzy_table} WHERE {self.fuzzy_table} MATCH %s"] * len(grams)
+        )
+        fuzzy = (
+            f"SELECT e.object_id, -COUNT(*) FROM ({shared}) g "
+            "JOIN search_searchentry e ON e.id = g.rowid "
+            "WHERE +e.kind = %s GROUP BY e.object_id HAVING COUNT(*) * 1.0 / %s >= %s"
+        )
+        fuzzy_params = [*(f'"{gram}"' for gram in grams), kind, len(grams), FUZZY_THRESHOLD]
+        return (
+            f"SELECT * FROM ({words}) UNION ALL SELECT * FROM ({fuzzy}) WHERE NOT EXISTS ({words})",
+            [*word_params, *fuzzy_params, *word_params],
+        )
+
+
+class PostgresBackend(Backend):
+    table = 'search_document'
+
+    def create_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "entry_id bigint PRIMARY KEY REFERENCES search_searchentry (id) ON DELETE CASCADE, "
+                "content text NOT NULL, "
+                "vector tsvector GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_vector ON {self.table} USING GIN (vector)")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_trgm ON {self.table} USING GIN (content gin_trgm_ops)"
+            )
+
+    def drop_schema(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def upsert(self, connection, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (entry_id, content) VALUES (%s, %s) "
+                "ON CONFLICT (entry_id) DO UPDATE SET content = EXCLUDED.content",
+                documents,
+            )
+
+    def delete(self, connection, entry_ids):
+        if not entry_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE entry_id = ANY(%s)", [list(entry_ids)])
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+    @staticmethod
+    def _queries(query):
+        terms = query_terms(query)
+        return ' & '.join(f'{term}:*' for term in terms), ' '.join(terms)
+
+    def matches(self, kind, query):
+        """``(sql, params)`` selecting (object_id, rank) of prefix and similar-word matches, None if no terms"""
+        if not query_terms(query):
+            return None
+        tsquery, text = self._queries(query)
+        return (
+            "SELECT e.object_id AS object_id, "
+            f"-(ts_rank(d.vector, to_tsquery('simple', %s)) + word_similarity(%s, d.content)) AS rank "
+            f"FROM {self.table} d JOIN search_searchentry e ON e.id = d.entry_id "
+            "WHERE e.kind = %s AND (d.vector @@ to_tsquery('simple', %s) OR %s <%% d.content)",
+            [tsquery, text, kind, tsquery, text],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(connection):
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
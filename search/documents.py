@@ -0,0 +1,36 @@
+"""
+What gets indexed: each kind maps a source model to the text fields that make
+up its search document.
+"""
+from django.apps import apps
+
+
+DOCUMENTS = {
+    'user': ('users.User', ['email', 'first_name', 'last_name', 'phone']),
+    'product': ('ecommerce.Product', ['name', 'category', 'description']),
+    'storage_plan': ('storage.StoragePlan', ['product_name', 'description']),
+    'package': ('investments.InvestmentPackage', ['name', 'category', 'location', 'description']),
+}
+
+
+def model_for(kind):
+    return apps.get_model(DOCUMENTS[kind][0])
+
+
+def fields_for(kind):
+    return DOCUMENTS[kind][1]
+
+
+def kind_for(model):
+    label = model._meta.label
+    for kind, (model_label, _) in DOCUMENTS.items():
+        if model_label == label:
+            return kind
+    return None
+
+
+def document_text(kind, values):
+    """Join an object's (or a ``values()`` row's) indexed fields into one document"""
+    if not isinstance(values, dict):
+        values = {field: getattr(values, field) for field in fields_for(kind)}
+    return ' '.join(str(values[field]) for field in fields_for(kind) if values.get(field))
@@ -0,0 +1,153 @@
+"""
+Public API of the search subsystem.
+
+``filter_queryset(queryset, kind, query)`` is what viewsets call: it narrows
+the queryset to the matches with a subquery, and on request orders them by
+rank, all in the queryset's own SQL, so visibility filters and pagination
+apply to every match rather than to a capped list of ids. On databases
+without a backend it falls back to ``icontains`` over the indexed fields.
+
+Object ids are stored as the database renders the primary key as text (UUIDs
+are hex on SQLite), which is what lets that SQL compare them to the row.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, FloatField, Func, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from . import documents
+from .backends import get_backend
+from .models import SearchEntry
+
+CHUNK_SIZE = 1000
+
+
+def object_key(model, object_id):
+    """``object_id`` as stored in SearchEntry.object_id"""
+    return str(model._meta.pk.get_db_prep_value(object_id, connection))
+
+
+def _entry_ids(kind, object_ids):
+    object_ids = [str(object_id) for object_id in object_ids]
+    SearchEntry.objects.bulk_create(
+        [SearchEntry(kind=kind, object_id=object_id) for object_id in object_ids],
+        ignore_conflicts=True,
+    )
+    return dict(
+        SearchEntry.objects.filter(kind=kind, object_id__in=object_ids).values_list('object_id', 'id')
+    )
+
+
+def index_objects(kind, objects):
+    """Add or refresh the documents for model instances or ``values()`` rows of ``kind``"""
+    backend = get_backend(connection)
+    if backend is None or not objects:
+        return
+
+    model = documents.model_for(kind)
+    pk_name = model._meta.pk.attname
+    texts = {}
+    for obj in objects:
+        object_id = obj[pk_name] if isinstance(obj, dict) else obj.pk
+        texts[object_key(model, object_id)] = documents.document_text(kind, obj)
+
+    entry_ids = _entry_ids(kind, texts)
+    backend.upsert(connection, [(entry_ids[object_id], text) for object_id, text in texts.items()])
+
+
+def remove_objects(kind, object_ids):
+    backend = get_backend(connection)
+    model = documents.model_for(kind)
+    entries = SearchEntry.objects.filter(
+        kind=kind, object_id__in=[object_key(model, object_id) for object_id in object_ids]
+    )
+    if backend is not None:
+        backend.delete(connection, list(entries.values_list('id', flat=True)))
+    entries.delete()
+
+
+def rebuild(kind=None):
+    """Reindex every object of ``kind`` (or of all kinds). Returns the number of documents."""
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+
+    kinds = [kind] if kind else list(documents.DOCUMENTS)
+    total = 0
+    for kind in kinds:
+        entries = SearchEntry.objects.filter(kind=kind)
+        backend.delete(connection, list(entries.values_list('id', flat=True)))
+        entries.delete()
+
+        model = documents.model_for(kind)
+        pk_name = model._meta.pk.attname
+        rows = model._default_manager.order_by(pk_name).values(pk_name, *documents.fields_for(kind))
+        batch = []
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                index_objects(kind, batch)
+                total += len(batch)
+                batch = []
+        index_objects(kind, batch)
+        total += len(batch)
+    return total
+
+
+def search(kind, query, limit=None):
+    """Ranked object ids (as strings) matching ``query``, best first"""
+    backend = get_backend(connection)
+    if backend is None:
+        return None
+    pk_field = documents.model_for(kind)._meta.pk
+    return [
+        str(pk_field.to_python(object_id))
+        for object_id in backend.search(connection, kind, query, limit or settings.SEARCH_RESULT_LIMIT)
+    ]
+
+
+class SearchRank(Func):
+    """
+    A row's rank among the backend's ``matches``, lower first. The matches are
+    materialized once per query, not once per row.
+    """
+    output_field = FloatField()
+
+    def __init__(self, matches):
+        self.matches = matches
+        super().__init__(Cast('pk', CharField()))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        key_sql, key_params = compiler.compile(self.source_expressions[0])
+        sql, params = self.matches
+        return (
+            f"(WITH matches AS MATERIALIZED ({sql}) SELECT rank FROM matches WHERE object_id = {key_sql})",
+            [*params, *key_params],
+        )
+
+
+def filter_queryset(queryset, kind, query, ranked=False):
+    """Narrow ``queryset`` to the objects matching ``query``; ``ranked`` orders them best first"""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    backend = get_backend(connection)
+    if backend is None:
+        condition = Q()
+        for field in documents.fields_for(kind):
+            condition |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(condition)
+
+    matches = backend.matches(kind, query)
+    if matches is None:
+        return queryset.none()
+
+    sql, params = matches
+    queryset = queryset.alias(search_key=Cast('pk', CharField())).filter(
+        search_key__in=RawSQL(f"SELECT object_id FROM ({sql}) matches", params)
+    )
+    if ranked:
+        return queryset.order_by(SearchRank(matches), 'pk')
+    return queryset
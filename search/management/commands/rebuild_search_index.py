@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from search import documents, index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for one or all kinds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=list(documents.DOCUMENTS), help='Only rebuild this kind')
+
+    def handle(self, *args, **options):
+        total = index.rebuild(options['kind'])
+        self.stdout.write(self.style.SUCCESS(f'Done. Indexed {total} documents.'))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from search.backends import get_backend
+
+
+def create_schema(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.create_schema(schema_editor.connection)
+
+
+def drop_schema(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.drop_schema(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schema, drop_schema),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+from search.backends import get_backend
+from search.documents import document_text
+
+CHUNK_SIZE = 1000
+
+# The documents as they stood when this migration was written
+DOCUMENTS = {
+    'user': ('users.User', ['email', 'first_name', 'last_name', 'phone']),
+    'product': ('ecommerce.Product', ['name', 'category', 'description']),
+    'storage_plan': ('storage.StoragePlan', ['product_name', 'description']),
+    'package': ('investments.InvestmentPackage', ['name', 'category', 'location', 'description']),
+}
+
+
+def backfill(apps, schema_editor):
+    """Index the rows that existed before the index did, replacing whatever the signals added"""
+    connection = schema_editor.connection
+    backend = get_backend(connection)
+    if backend is None:
+        return
+
+    SearchEntry = apps.get_model('search', 'SearchEntry')
+    backend.clear(connection)
+    SearchEntry.objects.all().delete()
+
+    for kind, (model_label, fields) in DOCUMENTS.items():
+        model = apps.get_model(model_label)
+        pk_field = model._meta.pk
+        rows = model._default_manager.order_by(pk_field.attname).values(pk_field.attname, *fields)
+
+        batch = []
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                index_rows(connection, backend, SearchEntry, kind, pk_field, batch)
+                batch = []
+        index_rows(connection, backend, SearchEntry, kind, pk_field, batch)
+
+
+def index_rows(connection, backend, SearchEntry, kind, pk_field, rows):
+    if not rows:
+        return
+    texts = {
+        str(pk_field.get_db_prep_value(row[pk_field.attname], connection)): document_text(kind, row)
+        for row in rows
+    }
+    SearchEntry.objects.bulk_create([SearchEntry(kind=kind, object_id=object_id) for object_id in texts])
+    entry_ids = dict(
+        SearchEntry.objects.filter(kind=kind, object_id__in=list(texts)).values_list('object_id', 'id')
+    )
+    backend.upsert(connection, [(entry_ids[object_id], text) for object_id, text in texts.items()])
+
+
+def clear(apps, schema_editor):
+    connection = schema_editor.connection
+    backend = get_backend(connection)
+    if backend is not None:
+        backend.clear(connection)
+    apps.get_model('search', 'SearchEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_fulltext_schema'),
+        ('users', '0009_user_profile_picture_url'),
+        ('ecommerce', '0009_product_image_url'),
+        ('storage', '0007_storageplan_product_image_url_and_more'),
+        ('investments', '0019_payout_item_open_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
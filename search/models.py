@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    """
+    One indexed object. Its id is the rowid of the object's document in the
+    backend's full-text table, which keeps the index independent of the
+    source model's primary key type.
+    """
+
+    kind = models.CharField(max_length=30)
+    object_id = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
@@ -0,0 +1,31 @@
+"""
+Keep the search index in step with the indexed models.
+
+Only ``save()``/``delete()`` go through these hooks; after bulk updates run
+the ``rebuild_search_index`` command.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from . import documents, index
+
+
+def make_indexer(kind):
+    fields = set(documents.fields_for(kind))
+
+    def reindex(sender, instance, update_fields=None, **kwargs):
+        # e.g. last_login updates on User do not touch the document
+        if update_fields is not None and not fields.intersection(update_fields):
+            return
+        index.index_objects(kind, [instance])
+
+    def unindex(sender, instance, **kwargs):
+        index.remove_objects(kind, [instance.pk])
+
+    return reindex, unindex
+
+
+def connect():
+    for kind, (model_label, _) in documents.DOCUMENTS.items():
+        reindex, unindex = make_indexer(kind)
+        post_save.connect(reindex, sender=model_label, weak=False, dispatch_uid=f'search-index-{kind}')
+        post_delete.connect(unindex, sender=model_label, weak=False, dispatch_uid=f'search-unindex-{kind}')
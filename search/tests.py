@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ecommerce.models import Product
+from investments.models import InvestmentPackage
+from storage.models import StoragePlan
+from users.models import User
+
+from . import index
+from .models import SearchEntry
+
+
+def user(email, **kwargs):
+    return User.objects.create_user(email=email, password='x', **kwargs)
+
+
+def results(response):
+    return response.data['results'] if isinstance(response.data, dict) else response.data
+
+
+class SearchIndexTests(TestCase):
+    def test_prefix_typo_and_substring_matches(self):
+        okafor = user('john.doe@farm.ng', first_name='Johnathan', last_name='Okafor', phone='08031234567')
+        johnson = user('mary@example.com', first_name='Mary', last_name='Johnson')
+        user('zed@example.com', first_name='Zed')
+
+        self.assertCountEqual(index.search('user', 'joh'), [str(okafor.id), str(johnson.id)])
+        self.assertEqual(index.search('user', 'okafr'), [str(okafor.id)])
+        self.assertEqual(index.search('user', '1234567'), [str(okafor.id)])
+
+    def test_index_follows_saves_and_deletes(self):
+        okafor = user('john@example.com', last_name='Okafor')
+        okafor.last_name = 'Bello'
+        okafor.save()
+        self.assertEqual(index.search('user', 'okafor'), [])
+        self.assertEqual(index.search('user', 'bello'), [str(okafor.id)])
+
+        okafor.delete()
+        self.assertFalse(SearchEntry.objects.filter(kind='user').exists())
+
+    def test_rebuild_indexes_every_kind(self):
+        product = Product.objects.create(name='Yellow Maize', description='Dry maize grain', price=10, stock=3)
+        plan = StoragePlan.objects.create(
+            product_name='Tomatoes', description='Fresh', buying_price_per_bag=10, projected_selling_price=20,
+            storage_due_date=date(2030, 1, 1), available_quantity=5,
+        )
+        SearchEntry.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(index.search('product', 'maiz'), [str(product.id)])
+        self.assertEqual(index.search('storage_plan', 'tomatos'), [str(plan.id)])
+
+    def test_backfill_migration_indexes_existing_rows(self):
+        product = Product.objects.create(name='Cassava Flour', description='Milled', price=10, stock=3)
+        SearchEntry.objects.all().delete()
+
+        migration = import_module('search.migrations.0003_backfill_index')
+        migration.backfill(apps, mock.Mock(connection=connection))
+        self.assertEqual(index.search('product', 'cassava'), [str(product.id)])
+
+
+class FilterQuerysetTests(TestCase):
+    @override_settings(SEARCH_RESULT_LIMIT=2)
+    def test_filters_apply_to_every_match_not_a_capped_list(self):
+        for i in range(3):
+            Product.objects.create(name=f'Maize {i}', description='Old stock', price=10, stock=1, is_active=False)
+        active = [
+            Product.objects.create(name=f'Maize {i}', description='Grain', price=10, stock=1) for i in range(3)
+        ]
+
+        found = index.filter_queryset(Product.objects.filter(is_active=True), 'product', 'maize')
+        self.assertEqual(found.count(), 3)
+        self.assertCountEqual(found, active)
+
+    def test_admin_user_search_pages_through_all_matches(self):
+        admin = user('admin@example.com', is_staff=True, is_superuser=True)
+        for i in range(30):
+            user(f'farmer{i}@gmail.com')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/adminusers/?search=gmail')
+        self.assertEqual(response.status_code, 200)
+        if isinstance(response.data, dict):
+            self.assertEqual(response.data['count'], 30)
+        else:
+            self.assertEqual(len(response.data), 30)
+
+    def test_best_match_comes_first(self):
+        weak = Product.objects.create(name='Sack', description='For rice, beans or maize', price=10, stock=1)
+        strong = Product.objects.create(name='Maize', description='Maize grain', price=10, stock=1)
+
+        found = index.filter_queryset(Product.objects.order_by('name'), 'product', 'maize', ranked=True)
+        self.assertEqual(list(found), [strong, weak])
+
+    def test_callers_ordering_is_kept_unless_ranked(self):
+        sack = Product.objects.create(name='Sack', description='For maize', price=10, stock=1)
+        maize = Product.objects.create(name='Maize', description='Maize grain', price=10, stock=1)
+
+        found = index.filter_queryset(Product.objects.order_by('-name'), 'product', 'maize')
+        self.assertEqual(list(found), [sack, maize])
+        found = index.filter_queryset(Product.objects.order_by('name'), 'product', 'maize')
+        self.assertEqual(list(found), [maize, sack])
+
+    def test_matching_and_fallback_run_in_the_one_query(self):
+        maize = Product.objects.create(name='Maize', description='Grain', price=10, stock=1)
+        tomatoes = Product.objects.create(name='Tomatoes', description='Fresh', price=10, stock=1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(index.filter_queryset(Product.objects.all(), 'product', 'maiz', ranked=True)), [maize])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(index.filter_queryset(Product.objects.all(), 'product', 'tomatos')), [tomatoes])
+
+    def test_typo_fallback_only_offers_visible_rows(self):
+        Product.objects.create(name='Tomatoes', description='Hidden', price=10, stock=1, is_active=False)
+        visible = Product.objects.create(name='Tomatoes', description='Fresh', price=10, stock=1)
+
+        found = index.filter_queryset(Product.objects.filter(is_active=True), 'product', 'tomatos')
+        self.assertEqual(list(found), [visible])
+
+    def test_uuid_keyed_plans_and_catalog_search(self):
+        plan = StoragePlan.objects.create(
+            product_name='Tomatoes', description='Fresh', buying_price_per_bag=10, projected_selling_price=20,
+            storage_due_date=date(2030, 1, 1), available_quantity=5,
+        )
+        package = InvestmentPackage.objects.create(
+            name='Cassava Farm', description='d', category='crop', risk_level='low',
+            min_amount=Decimal('10'), max_amount=Decimal('100000'), interest_rate=Decimal('10'),
+            duration_months=6, total_slots=10, available_slots=10,
+            start_date=date.today(), end_date=date.today() + timedelta(days=180),
+        )
+        client = APIClient()
+        client.force_authenticate(user('buyer@example.com'))
+
+        response = client.get('/api/storage/storage-plans/?product_name=tomat')
+        self.assertEqual([item['id'] for item in results(response)], [str(plan.id)])
+        response = client.get('/api/investments/packages/?search=cassava')
+        self.assertEqual([item['id'] for item in results(response)], [package.id])
@@ -2,13 +2,14 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import StoragePlan, StorageInvestment, PaymentTransaction, StorageUpdate
+from .models import StoragePlan, StorageInvestment, PaymentTransaction, StorageUpdate, StorageReservation
 
 
 admin.site.register(StoragePlan)
 admin.site.register(StorageInvestment)
 admin.site.register(PaymentTransaction)
 admin.site.register(StorageUpdate)
+admin.site.register(StorageReservation)
 
 # @admin.register(StoragePlan)
 # class StoragePlanAdmin(admin.ModelAdmin):
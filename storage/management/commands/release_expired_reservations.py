@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from storage.services import inventory
+
+
+class Command(BaseCommand):
+    help = 'Return stock held for storage purchases whose payment never arrived.'
+
+    def handle(self, *args, **options):
+        count = inventory.release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {count} expired reservations.'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:40
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0003_alter_storageplan_product_image_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageinvestment',
+            name='roi_percentage',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(then=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('projected_returns'), '-', models.F('total_investment_amount')), models.FloatField()), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.Cast('total_investment_amount', models.FloatField())), 1), total_investment_amount__gt=0), default=models.Value(Decimal('0')), output_field=models.DecimalField(decimal_places=1, max_digits=9)), output_field=models.DecimalField(decimal_places=1, max_digits=9)),
+        ),
+        migrations.AddField(
+            model_name='storageplan',
+            name='roi_percentage',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(buying_price_per_bag__gt=0, then=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('projected_selling_price'), '-', models.F('buying_price_per_bag')), models.FloatField()), '*', models.Value(100.0)), '/', django.db.models.functions.comparison.Cast('buying_price_per_bag', models.FloatField())), 1)), default=models.Value(Decimal('0')), output_field=models.DecimalField(decimal_places=1, max_digits=9)), output_field=models.DecimalField(decimal_places=1, max_digits=9)),
+        ),
+        migrations.AddIndex(
+            model_name='storageinvestment',
+            index=models.Index(fields=['user', '-roi_percentage'], name='storage_sto_user_id_2cee5e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storageplan',
+            index=models.Index(fields=['is_active', '-roi_percentage'], name='storage_sto_is_acti_751ffa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storageplan',
+            index=models.Index(fields=['is_active', 'storage_due_date'], name='storage_sto_is_acti_dc5b5f_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0004_roi_percentage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('consumed', 'Consumed'), ('released', 'Released')], default='held', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('investment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reservation', to='storage.storageinvestment')),
+                ('storage_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='storage.storageplan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='storage_sto_status_de9e11_idx')],
+            },
+        ),
+    ]
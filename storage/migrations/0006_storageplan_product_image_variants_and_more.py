@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-19 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0005_storage_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageplan',
+            name='product_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='storageupdate',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0006_storageplan_product_image_variants_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageplan',
+            name='product_image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='storageupdate',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Round
 
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -8,11 +10,24 @@ from cloudinary.models import CloudinaryField
 
 User = get_user_model()
 
+
+def roi_expression(returns, cost):
+    """ROI percentage of ``returns`` over ``cost``, rounded to one place (0 when cost is 0)"""
+    # Divide as floats: SQLite would otherwise truncate decimal division
+    ratio = Cast(F(returns) - F(cost), models.FloatField()) * Value(100.0) / Cast(cost, models.FloatField())
+    return Case(
+        When(**{f'{cost}__gt': 0}, then=Round(ratio, 1)),
+        default=Value(Decimal('0')),
+        output_field=models.DecimalField(max_digits=9, decimal_places=1),
+    )
+
 class StoragePlan(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     product_name = models.CharField(max_length=200)
     # product_image = models.ImageField(upload_to='storage_plans/', blank=True, null=True)
     product_image = CloudinaryField('image', blank=True, null=True)
+    product_image_url = models.URLField(max_length=500, blank=True)  # see agri_invest/media.py
+    product_image_variants = models.JSONField(default=dict, blank=True)  # size name -> URL
     description = models.TextField()
     buying_price_per_bag = models.DecimalField(
         max_digits=12, 
@@ -37,38 +52,46 @@ class StoragePlan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Return on Investment percentage, stored so the catalog can filter and sort on it
+    roi_percentage = models.GeneratedField(
+        expression=roi_expression('projected_selling_price', 'buying_price_per_bag'),
+        output_field=models.DecimalField(max_digits=9, decimal_places=1),
+        db_persist=True,
+    )
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Storage Plan"
         verbose_name_plural = "Storage Plans"
+        indexes = [
+            models.Index(fields=['is_active', '-roi_percentage']),
+            models.Index(fields=['is_active', 'storage_due_date']),
+        ]
 
     def __str__(self):
         return f"{self.product_name} - ₦{self.buying_price_per_bag}/bag"
 
-    @property
-    def roi_percentage(self):
-        """Calculate Return on Investment percentage"""
-        if self.buying_price_per_bag > 0:
-            return round(((self.projected_selling_price - self.buying_price_per_bag) / self.buying_price_per_bag) * 100, 1)
-        return 0
-
     @property
     def is_available(self):
         """Check if plan is still available for investment"""
         return self.is_active and self.available_quantity > 0
 
-    def reserve_quantity(self, quantity):
-        """Reserve quantity for purchase"""
-        if self.available_quantity >= quantity:
-            self.available_quantity -= quantity
-            self.save()
-            return True
-        return False
+    def reserve_quantity(self, quantity, active_only=True):
+        """
+        Take quantity out of stock; a single conditional UPDATE, so concurrent buyers cannot oversell.
+        Pass ``active_only=False`` for stock that was already sold (a late payment on a deactivated plan).
+        """
+        plans = StoragePlan.objects.filter(pk=self.pk, available_quantity__gte=quantity)
+        if active_only:
+            plans = plans.filter(is_active=True)
+        reserved = plans.update(available_quantity=F('available_quantity') - quantity)
+        self.refresh_from_db(fields=['available_quantity'])
+        return bool(reserved)
 
     def release_quantity(self, quantity):
-        """Release reserved quantity back to available"""
-        self.available_quantity += quantity
-        self.save()
+        """Put quantity back into stock"""
+        StoragePlan.objects.filter(pk=self.pk).update(available_quantity=F('available_quantity') + quantity)
+        self.refresh_from_db(fields=['available_quantity'])
 
 
 class StorageInvestment(models.Model):
@@ -111,10 +134,20 @@ class StorageInvestment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Actual ROI percentage of this investment
+    roi_percentage = models.GeneratedField(
+        expression=roi_expression('projected_returns', 'total_investment_amount'),
+        output_field=models.DecimalField(max_digits=9, decimal_places=1),
+        db_persist=True,
+    )
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Investment"
         verbose_name_plural = "Investments"
+        indexes = [
+            models.Index(fields=['user', '-roi_percentage']),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.storage_plan.product_name} ({self.quantity_bags} bags)"
@@ -125,14 +158,8 @@ class StorageInvestment(models.Model):
 
     @property
     def product_image(self):
-        return self.storage_plan.product_image.url if self.storage_plan.product_image else None
-
-    @property
-    def roi_percentage(self):
-        """Calculate actual ROI percentage"""
-        if self.total_investment_amount > 0:
-            return round(((self.projected_returns - self.total_investment_amount) / self.total_investment_amount) * 100, 1)
-        return 0
+        from agri_invest import media
+        return media.url_for(self.storage_plan, 'product_image')
 
     @property
     def days_remaining(self):
@@ -176,6 +203,31 @@ class StorageInvestment(models.Model):
         super().save(*args, **kwargs)
 
 
+class StorageReservation(models.Model):
+    """Stock held for a pending storage investment until it is paid for or expires"""
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('consumed', 'Consumed'),
+        ('released', 'Released'),
+    ]
+
+    storage_plan = models.ForeignKey(StoragePlan, on_delete=models.CASCADE, related_name='reservations')
+    investment = models.OneToOneField(StorageInvestment, on_delete=models.CASCADE, related_name='reservation')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} bags of {self.storage_plan_id} ({self.status})"
+
+
 class PaymentTransaction(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -223,6 +275,8 @@ class StorageUpdate(models.Model):
     current_market_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     # image = models.ImageField(upload_to='storage_updates/', blank=True, null=True)
     image = CloudinaryField('image', blank=True, null=True)
+    image_url = models.URLField(max_length=500, blank=True)  # see agri_invest/media.py
+    image_variants = models.JSONField(default=dict, blank=True)  # size name -> URL
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -2,7 +2,10 @@ from datetime import timezone
 import requests
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import StoragePlan, StorageInvestment, PaymentTransaction, StorageUpdate
+from agri_invest import imaging, media
+from .services import inventory
 from decimal import Decimal
 
 class StoragePlanSerializer(serializers.ModelSerializer):
@@ -12,11 +15,15 @@ class StoragePlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = StoragePlan
         fields = [
-            'id', 'product_name', 'product_image', 'description',
+            'id', 'product_name', 'product_image', 'product_image_variants', 'description',
             'buying_price_per_bag', 'projected_selling_price', 'storage_due_date',
             'available_quantity', 'minimum_quantity', 'maximum_quantity',
             'is_active', 'roi_percentage', 'is_available', 'created_at'
         ]
+        read_only_fields = ['product_image_variants']
+
+    def validate_product_image(self, value):
+        return imaging.clean(value)
 
     def validate_buying_price_per_bag(self, value):
         """Validate buying price is positive"""
@@ -44,16 +51,14 @@ class StoragePlanSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and instance.product_image:
-            # Handle both CloudinaryResource objects and string URLs
-            if hasattr(instance.product_image, 'url'):
-                data['product_image'] = request.build_absolute_uri(instance.product_image.url)
-            else:
-                # If it's already a string URL, use it as-is
-                data['product_image'] = instance.product_image
+        data['product_image'] = media.url_for(instance, 'product_image')
         return data
 
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        imaging.generate_variants(instance, 'product_image', validated_data.get('product_image'))
+        return instance
+
     def update(self, instance, validated_data):
         # Handle the image field separately for updates
         product_image = validated_data.pop('product_image', None)
@@ -70,6 +75,9 @@ class StoragePlanSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+        # The database computes the ROI; save() does not read it back
+        instance.refresh_from_db(fields=['roi_percentage'])
+        imaging.generate_variants(instance, 'product_image', product_image)
         return instance
 
 
@@ -80,14 +88,21 @@ class StorageUpdateSerializer(serializers.ModelSerializer):
         model = StorageUpdate
         fields = [
             'id', 'update_type', 'title', 'message', 
-            'current_market_price', 'image', 'created_at'
+            'current_market_price', 'image', 'image_variants', 'created_at'
         ]
+        read_only_fields = ['image_variants']
+
+    def validate_image(self, value):
+        return imaging.clean(value)
+
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        imaging.generate_variants(instance, 'image', validated_data.get('image'))
+        return instance
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and instance.image:
-            data['image'] = request.build_absolute_uri(instance.image.url)
+        data['image'] = media.url_for(instance, 'image')
         return data
     
     def update(self, instance, validated_data):
@@ -107,9 +122,21 @@ class StorageUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
+class StorageUpdateBroadcastSerializer(serializers.Serializer):
+    update_type = serializers.ChoiceField(choices=StorageUpdate.UPDATE_TYPES)
+    title = serializers.CharField(max_length=200)
+    message = serializers.CharField()
+    current_market_price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, allow_null=True)
+    image = serializers.ImageField(required=False, allow_null=True)
+
+    def validate_image(self, value):
+        return imaging.clean(value)
+
+
 class InvestmentSerializer(serializers.ModelSerializer):
-    product_name = serializers.ReadOnlyField()
-    product_image = serializers.ReadOnlyField()
+    product_name = serializers.CharField(source='storage_plan.product_name', read_only=True)
+    product_image = media.MediaURLField('product_image', source='storage_plan')
+    product_image_variants = serializers.JSONField(source='storage_plan.product_image_variants', read_only=True)
     roi_percentage = serializers.ReadOnlyField()
     days_remaining = serializers.ReadOnlyField()
     progress_percentage = serializers.ReadOnlyField()
@@ -122,7 +149,7 @@ class InvestmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = StorageInvestment
         fields = [
-            'id', 'product_name', 'product_image', 'customer_name',
+            'id', 'product_name', 'product_image', 'product_image_variants', 'customer_name',
             'customer_email', 'customer_phone', 'quantity_bags',
             'price_per_bag', 'total_investment_amount',
             'projected_selling_price_per_bag', 'projected_returns',
@@ -131,6 +158,8 @@ class InvestmentSerializer(serializers.ModelSerializer):
             'days_remaining', 'progress_percentage', 'updates',
             'storage_plan_details', 'user_email', 'user_first_name', 'user_last_name', 'created_at'
         ]
+        # List views show the latest updates only; detail views show them all
+        prefetch_limits = {'updates': 10}
 
 
 class InvestmentCreateSerializer(serializers.Serializer):
@@ -175,29 +204,33 @@ class InvestmentCreateSerializer(serializers.Serializer):
         plan_id = validated_data.pop('plan_id')  # Remove plan_id as it's not a model field
         quantity = validated_data['quantity_bags']
         
-        # Reserve the quantity
-        if not storage_plan.reserve_quantity(quantity):
-            raise serializers.ValidationError("Unable to reserve quantity")
-
         # Calculate investment amounts
         total_investment = storage_plan.buying_price_per_bag * quantity
         projected_returns = storage_plan.projected_selling_price * quantity
 
-        # Create investment with explicit field mapping
-        investment = StorageInvestment.objects.create(
-            user=self.context['request'].user,
-            storage_plan=storage_plan,
-            customer_name=validated_data['customer_name'],
-            customer_email=validated_data['customer_email'],
-            customer_phone=validated_data.get('customer_phone', ''),
-            quantity_bags=quantity,
-            price_per_bag=storage_plan.buying_price_per_bag,
-            total_investment_amount=total_investment,
-            projected_selling_price_per_bag=storage_plan.projected_selling_price,
-            projected_returns=projected_returns,
-            due_date=storage_plan.storage_due_date,
-            status='pending'
-        )
+        with transaction.atomic():
+            # Reserve the quantity; validate() read the stock before any concurrent buyer
+            if not storage_plan.reserve_quantity(quantity):
+                raise serializers.ValidationError(
+                    f"Only {storage_plan.available_quantity} bags available"
+                )
+
+            # Create investment with explicit field mapping
+            investment = StorageInvestment.objects.create(
+                user=self.context['request'].user,
+                storage_plan=storage_plan,
+                customer_name=validated_data['customer_name'],
+                customer_email=validated_data['customer_email'],
+                customer_phone=validated_data.get('customer_phone', ''),
+                quantity_bags=quantity,
+                price_per_bag=storage_plan.buying_price_per_bag,
+                total_investment_amount=total_investment,
+                projected_selling_price_per_bag=storage_plan.projected_selling_price,
+                projected_returns=projected_returns,
+                due_date=storage_plan.storage_due_date,
+                status='pending'
+            )
+            inventory.hold(investment)
 
         return investment
 
@@ -224,4 +257,7 @@ class DashboardStatsSerializer(serializers.Serializer):
     pending_investments = serializers.IntegerField()
     matured_investments = serializers.IntegerField()
     completed_investments = serializers.IntegerField()
-    average_roi = serializers.DecimalField(max_digits=5, decimal_places=2)
\ No newline at end of file
+    average_roi = serializers.DecimalField(max_digits=5, decimal_places=2)
+    current_value = serializers.DecimalField(max_digits=15, decimal_places=2)
+    unrealized_pnl = serializers.DecimalField(max_digits=15, decimal_places=2)
+    current_roi = serializers.DecimalField(max_digits=9, decimal_places=2)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Plan-wide storage updates.
+
+A broadcast writes one StorageUpdate per active investment in the plan with
+``bulk_create``, ``STORAGE_BROADCAST_CHUNK_SIZE`` rows at a time, while
+streaming the investments. A shared image is uploaded to Cloudinary once
+and every row points at the same resource and its resolved URL, which
+``bulk_create`` would not fill in (see agri_invest/media.py). A plan with
+no active investments gets nothing, not even the upload. Holders are
+notified (once each, however many investments they hold) from a background
+thread after the transaction commits, so the request returns as soon as the
+rows are written.
+The image's variants are uploaded the same way (see agri_invest/imaging.py).
+"""
+from cloudinary import uploader
+from django.conf import settings
+from django.db import transaction
+
+from agri_invest import imaging, media
+from agri_invest.background import dispatch
+from users.models import Notification
+from users.services import notifications as notification_service
+
+from ..models import StorageInvestment, StorageUpdate
+
+
+def _notify_holders(user_ids, message):
+    """
+    Runs on a daemon thread (agri_invest/background.py): notifications not yet
+    written when the worker process exits are lost; the updates themselves are not.
+    """
+    chunk_size = settings.STORAGE_BROADCAST_CHUNK_SIZE
+    for start in range(0, len(user_ids), chunk_size):
+        notification_service.notify_many(
+            Notification(user_id=user_id, notification_type='storage', message=message)
+            for user_id in user_ids[start:start + chunk_size]
+        )
+
+
+def broadcast(plan, update_type, title, message, current_market_price=None, image=None):
+    """Post an update to every active investment in ``plan``. Returns (updates created, holders notified)."""
+    chunk_size = settings.STORAGE_BROADCAST_CHUNK_SIZE
+    investments = StorageInvestment.objects.filter(storage_plan=plan, status='active').order_by()
+    # Checked before uploading, so an image sent to nobody is not left orphaned in Cloudinary
+    if not investments.exists():
+        return 0, 0
+
+    upload = image
+    stored = ''
+    if image:
+        image = uploader.upload_resource(image, type='upload', resource_type='image')
+        stored = StorageUpdate._meta.get_field('image').get_prep_value(image)
+    image_url = media.resolve(stored)
+
+    created = 0
+    user_ids = set()
+    with transaction.atomic():
+        batch = []
+        for investment_id, user_id in investments.values_list('id', 'user_id').iterator(chunk_size=chunk_size):
+            user_ids.add(user_id)
+            batch.append(StorageUpdate(
+                investment_id=investment_id,
+                update_type=update_type,
+                title=title,
+                message=message,
+                current_market_price=current_market_price,
+                image=image,
+                image_url=image_url,
+            ))
+            if len(batch) >= chunk_size:
+                StorageUpdate.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        StorageUpdate.objects.bulk_create(batch)
+        created += len(batch)
+
+        if user_ids:
+            user_ids = sorted(user_ids)
+            text = f"{plan.product_name}: {title}"
+            transaction.on_commit(lambda: dispatch(_notify_holders, user_ids, text))
+        if created and image:
+            imaging.generate_variants_for(StorageUpdate, 'image', stored, upload)
+
+    return created, len(user_ids)
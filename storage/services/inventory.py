@@ -0,0 +1,96 @@
+"""
+Stock reservations for storage purchases.
+
+Buying takes the bags out of ``available_quantity`` with a conditional
+UPDATE and records a StorageReservation that expires after
+``STORAGE_RESERVATION_TTL_MINUTES``. Payment consumes the hold; a failed
+payment or the sweeper releases it. Every state change is a conditional
+UPDATE on the reservation, so a hold is released at most once however many
+webhooks, verifications and sweeps race for it.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import StorageInvestment, StoragePlan, StorageReservation
+
+logger = logging.getLogger(__name__)
+
+
+def hold(investment):
+    """Record the hold for a freshly reserved investment"""
+    return StorageReservation.objects.create(
+        storage_plan_id=investment.storage_plan_id,
+        investment=investment,
+        quantity=investment.quantity_bags,
+        expires_at=timezone.now() + timedelta(minutes=settings.STORAGE_RESERVATION_TTL_MINUTES),
+    )
+
+
+def release(investment):
+    """Give an unpaid investment's bags back. Returns True if stock was returned."""
+    with transaction.atomic():
+        reservation = StorageReservation.objects.filter(investment=investment).first()
+        if reservation is None:
+            # Purchases made before reservations existed
+            investment.storage_plan.release_quantity(investment.quantity_bags)
+            return True
+
+        released = StorageReservation.objects.filter(pk=reservation.pk, status='held').update(
+            status='released', released_at=timezone.now()
+        )
+        if released:
+            investment.storage_plan.release_quantity(reservation.quantity)
+        return bool(released)
+
+
+def consume(investment):
+    """Turn a paid investment's hold into a sale"""
+    with transaction.atomic():
+        consumed = StorageReservation.objects.filter(investment=investment, status='held').update(status='consumed')
+        if consumed:
+            return
+
+        # The hold expired before the payment landed: take the stock again
+        released = StorageReservation.objects.filter(investment=investment, status='released').update(
+            status='consumed', released_at=None
+        )
+        if released and not investment.storage_plan.reserve_quantity(investment.quantity_bags, active_only=False):
+            logger.error(
+                "Storage plan %s is oversold: paid investment %s arrived after its hold expired",
+                investment.storage_plan_id, investment.pk,
+            )
+
+
+def release_expired(now=None):
+    """Bulk-release every expired hold and cancel its unpaid investment. Returns the number released."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Flip first, then read back exactly the rows this sweep flipped
+        StorageReservation.objects.filter(status='held', expires_at__lte=now).update(
+            status='released', released_at=now
+        )
+        expired = list(
+            StorageReservation.objects.filter(status='released', released_at=now)
+            .values_list('storage_plan_id', 'investment_id', 'quantity')
+        )
+        if not expired:
+            return 0
+
+        per_plan = defaultdict(int)
+        for plan_id, _, quantity in expired:
+            per_plan[plan_id] += quantity
+        for plan_id, quantity in per_plan.items():
+            StoragePlan.objects.filter(pk=plan_id).update(available_quantity=F('available_quantity') + quantity)
+
+        StorageInvestment.objects.filter(
+            id__in=[row[1] for row in expired], status='pending'
+        ).update(status='cancelled', updated_at=now)
+
+    logger.info("Released %s expired storage reservations", len(expired))
+    return len(expired)
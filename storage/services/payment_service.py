@@ -1,8 +1,44 @@
 import requests
 import uuid
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from decimal import Decimal
-from ..models import PaymentTransaction
+from ..models import PaymentTransaction, StorageUpdate
+from . import inventory
+
+
+def confirm_payment(payment_transaction, gateway_reference=None, paid_at=None):
+    """
+    Record a successful payment: activate the investment and take its stock.
+    Shared by the webhook, manual verification and reconciliation, so a payment
+    that lands after the reservation sweeper cancelled the investment (and
+    returned its bags) reactivates it and takes the bags again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        payment_transaction.status = 'successful'
+        if gateway_reference is not None:
+            payment_transaction.gateway_reference = gateway_reference
+        payment_transaction.paid_at = paid_at or now
+        payment_transaction.save()
+
+        investment = payment_transaction.investment
+        investment.status = 'active'
+        investment.payment_status = 'paid'
+        investment.payment_date = now
+        investment.payment_reference = payment_transaction.reference
+        investment.save()
+        investment.refresh_from_db(fields=['roi_percentage'])
+        inventory.consume(investment)
+
+        StorageUpdate.objects.create(
+            investment=investment,
+            update_type='storage_start',
+            title='Payment Confirmed - Storage Started',
+            message=f'Your payment of ₦{payment_transaction.amount:,.2f} has been confirmed. Your {investment.product_name} storage has officially started.'
+        )
+    return investment
 
 
 class PaymentService:
@@ -0,0 +1,125 @@
+"""
+Mark-to-market valuation of open storage positions.
+
+The latest ``current_market_price`` reported for each plan comes from one
+windowed query over the storage updates. Positions are then streamed in
+batches of ``STORAGE_VALUATION_BATCH_SIZE`` rows and valued with NumPy, so
+valuing the whole book is one price query plus one query per batch.
+Positions on plans with no reported price are marked at their projected
+selling price.
+"""
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from ..models import StorageInvestment, StoragePlan, StorageUpdate
+
+# Positions still held, i.e. not yet sold or cancelled
+OPEN_STATUSES = ('active', 'matured')
+
+
+def latest_prices(plan_ids=None):
+    """{plan_id: (market_price, priced_at)} from each plan's most recent priced update"""
+    updates = StorageUpdate.objects.filter(current_market_price__isnull=False)
+    if plan_ids is not None:
+        updates = updates.filter(investment__storage_plan_id__in=plan_ids)
+    rows = updates.annotate(
+        row=Window(
+            RowNumber(),
+            partition_by=F('investment__storage_plan_id'),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(row=1).values_list('investment__storage_plan_id', 'current_market_price', 'created_at')
+    return {plan_id: (price, priced_at) for plan_id, price, priced_at in rows}
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator * 100, 2) if denominator else 0.0
+
+
+class _PlanTotals:
+    __slots__ = ('positions', 'quantity', 'cost', 'value')
+
+    def __init__(self):
+        self.positions = 0
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.value = 0.0
+
+
+def _value_batch(batch, prices, plans):
+    codes = {}
+    index = np.fromiter((codes.setdefault(row[0], len(codes)) for row in batch), dtype=np.intp, count=len(batch))
+    quantity = np.fromiter((row[1] for row in batch), dtype=np.float64, count=len(batch))
+    cost = np.fromiter((row[2] for row in batch), dtype=np.float64, count=len(batch))
+    price = np.fromiter(
+        (prices[row[0]][0] if row[0] in prices else row[3] for row in batch), dtype=np.float64, count=len(batch)
+    )
+    value = quantity * price
+
+    width = len(codes)
+    positions = np.bincount(index, minlength=width)
+    quantities = np.bincount(index, weights=quantity, minlength=width)
+    costs = np.bincount(index, weights=cost, minlength=width)
+    values = np.bincount(index, weights=value, minlength=width)
+    for plan_id, code in codes.items():
+        totals = plans.setdefault(plan_id, _PlanTotals())
+        totals.positions += int(positions[code])
+        totals.quantity += quantities[code]
+        totals.cost += costs[code]
+        totals.value += values[code]
+
+
+def valuate(queryset=None, batch_size=None):
+    """
+    Mark every open position in ``queryset`` (all storage investments by
+    default) to market. Returns the book totals and a per-plan breakdown.
+    """
+    queryset = StorageInvestment.objects.all() if queryset is None else queryset
+    batch_size = batch_size or settings.STORAGE_VALUATION_BATCH_SIZE
+    queryset = queryset.filter(status__in=OPEN_STATUSES)
+
+    prices = latest_prices(queryset.values('storage_plan_id'))
+    rows = queryset.order_by().values_list(
+        'storage_plan_id', 'quantity_bags', 'total_investment_amount', 'projected_selling_price_per_bag'
+    )
+
+    plans = {}
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _value_batch(batch, prices, plans)
+            batch = []
+    if batch:
+        _value_batch(batch, prices, plans)
+
+    names = dict(StoragePlan.objects.filter(pk__in=plans).values_list('id', 'product_name'))
+    breakdown = []
+    for plan_id, totals in plans.items():
+        market_price, priced_at = prices.get(plan_id, (None, None))
+        breakdown.append({
+            'plan_id': plan_id,
+            'product_name': names.get(plan_id),
+            'positions': totals.positions,
+            'quantity_bags': int(totals.quantity),
+            'market_price': market_price,
+            'priced_at': priced_at,
+            'invested_amount': round(totals.cost, 2),
+            'current_value': round(totals.value, 2),
+            'unrealized_pnl': round(totals.value - totals.cost, 2),
+            'roi': _ratio(totals.value - totals.cost, totals.cost),
+        })
+    breakdown.sort(key=lambda plan: plan['current_value'], reverse=True)
+
+    cost = sum(totals.cost for totals in plans.values())
+    value = sum(totals.value for totals in plans.values())
+    return {
+        'positions': sum(totals.positions for totals in plans.values()),
+        'invested_amount': round(cost, 2),
+        'current_value': round(value, 2),
+        'unrealized_pnl': round(value - cost, 2),
+        'roi': _ratio(value - cost, cost),
+        'plans': breakdown,
+    }
@@ -1,3 +1,343 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from agri_invest import imaging
+from users.models import Notification, User
+from users.tests import png_upload
+
+from .models import PaymentTransaction, StorageInvestment, StoragePlan, StorageReservation, StorageUpdate
+from .serilizers import InvestmentCreateSerializer, StoragePlanSerializer
+from .services import inventory, valuation
+
+
+def storage_plan(**kwargs):
+    values = dict(
+        product_name='Rice', description='Paddy rice', buying_price_per_bag=Decimal('100'),
+        projected_selling_price=Decimal('120'), storage_due_date=date(2030, 1, 1), available_quantity=10,
+    )
+    values.update(kwargs)
+    return StoragePlan.objects.create(**values)
+
+
+def storage_investment(user, plan, quantity=1, **kwargs):
+    return StorageInvestment.objects.create(
+        user=user, storage_plan=plan, customer_name='Investor', customer_email=user.email,
+        quantity_bags=quantity, price_per_bag=100, total_investment_amount=100 * quantity,
+        projected_selling_price_per_bag=120, projected_returns=120 * quantity, due_date=date(2030, 1, 1), **kwargs
+    )
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.plan = storage_plan()
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+
+    def buy(self, quantity):
+        serializer = InvestmentCreateSerializer(
+            data={
+                'plan_id': str(self.plan.id), 'quantity_bags': quantity,
+                'customer_name': 'Buyer', 'customer_email': 'buyer@example.com',
+            },
+            context={'request': mock.Mock(user=self.user)},
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def available(self):
+        self.plan.refresh_from_db()
+        return self.plan.available_quantity
+
+    def expire(self, investment):
+        StorageReservation.objects.filter(investment=investment).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        inventory.release_expired()
+
+    def test_purchase_holds_stock_and_release_returns_it_once(self):
+        investment = self.buy(6)
+        self.assertEqual(self.available(), 4)
+
+        # A stale read of the plan cannot oversell
+        stale = StoragePlan.objects.get(pk=self.plan.pk)
+        stale.available_quantity = 10
+        self.assertFalse(stale.reserve_quantity(5))
+
+        self.assertTrue(inventory.release(investment))
+        self.assertFalse(inventory.release(investment))
+        self.assertEqual(self.available(), 10)
+
+    def test_sweeper_cancels_expired_holds_and_a_late_payment_takes_stock_again(self):
+        late = self.buy(3)
+        paid = self.buy(2)
+        self.expire(late)
+        self.assertEqual(self.available(), 8)
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'cancelled')
+        self.assertEqual(inventory.release_expired(), 0)
+
+        inventory.consume(late)
+        self.assertEqual(self.available(), 5)
+        inventory.consume(paid)
+        self.assertFalse(inventory.release(paid))
+        self.assertEqual(self.available(), 5)
+
+    def test_late_payment_on_a_deactivated_plan_is_not_reported_as_oversold(self):
+        investment = self.buy(3)
+        self.expire(investment)
+        StoragePlan.objects.filter(pk=self.plan.pk).update(is_active=False)
+
+        with self.assertNoLogs('storage.services.inventory', level='ERROR'):
+            inventory.consume(investment)
+        self.assertEqual(self.available(), 7)
+
+    def test_late_payment_confirmed_by_reconciliation_reactivates_the_investment(self):
+        from admin_api.reconciliation import FixtureGatewayClient, ReconciliationEngine
+
+        investment = self.buy(3)
+        PaymentTransaction.objects.create(investment=investment, reference='AGR_LATE', amount=Decimal('300'))
+        self.expire(investment)
+        self.assertEqual(self.available(), 10)
+
+        gateway = FixtureGatewayClient(transactions=[{
+            'reference': 'AGR_LATE', 'status': 'success', 'amount': 30000,
+            'paid_at': timezone.now().isoformat(), 'created_at': timezone.now().isoformat(),
+        }])
+        today = timezone.localdate()
+        ReconciliationEngine(gateway).run(today, today, apply=True)
+
+        investment.refresh_from_db()
+        self.assertEqual(investment.status, 'active')
+        self.assertEqual(investment.payment_status, 'paid')
+        self.assertEqual(PaymentTransaction.objects.get(reference='AGR_LATE').status, 'successful')
+        self.assertEqual(StorageReservation.objects.get(investment=investment).status, 'consumed')
+        self.assertEqual(self.available(), 7)
+        self.assertTrue(investment.updates.filter(update_type='storage_start').exists())
+
+
+class StoragePlanImageTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+
+    @mock.patch('agri_invest.background.dispatch', side_effect=lambda task, *args: task(*args))
+    def test_plan_image_is_processed_and_variants_stored_after_commit(self, _):
+        serializer = StoragePlanSerializer(data={
+            'product_name': 'Maize', 'description': 'Dry maize', 'buying_price_per_bag': '100',
+            'projected_selling_price': '150', 'storage_due_date': '2030-01-01', 'available_quantity': 10,
+            'product_image': png_upload(),
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertIsInstance(serializer.validated_data['product_image'], imaging.ProcessedUpload)
+
+        stored = CloudinaryResource('plans/abc', format='webp', type='upload', resource_type='image', version='1')
+        with mock.patch('cloudinary.models.uploader.upload_resource', return_value=stored), \
+             mock.patch('agri_invest.imaging.uploader.upload', return_value={'secure_url': 'https://cdn/v.webp'}), \
+             self.captureOnCommitCallbacks(execute=True):
+            plan = serializer.save()
+
+        plan.refresh_from_db()
+        self.assertEqual(plan.product_image_variants['thumb'], 'https://cdn/v.webp')
+        self.assertIn('product_image_variants', StoragePlanSerializer(plan).data)
+
+
+class PlanFilterTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='browser@example.com', password='x'))
+
+    def names(self, query):
+        response = self.client.get(f'/api/storage/storage-plans/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [plan['product_name'] for plan in data]
+
+    def test_roi_is_computed_by_the_database(self):
+        plan = storage_plan(buying_price_per_bag=Decimal('18000'), projected_selling_price=Decimal('23000'))
+        self.assertEqual(plan.roi_percentage, Decimal('27.8'))
+
+        plan.projected_selling_price = Decimal('36000')
+        plan.save()
+        plan.refresh_from_db()
+        self.assertEqual(plan.roi_percentage, Decimal('100.0'))
+
+    def test_patch_returns_the_recomputed_roi(self):
+        plan = storage_plan(buying_price_per_bag=Decimal('100'), projected_selling_price=Decimal('120'))
+        self.client.force_authenticate(User.objects.create_user(email='staff@example.com', password='x', is_staff=True))
+
+        response = self.client.patch(
+            f'/api/storage/storage-plans/{plan.id}/', {'projected_selling_price': '150'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Decimal(str(response.data['roi_percentage'])), Decimal('50.0'))
+
+    def test_filters_and_ordering_run_in_sql(self):
+        storage_plan(product_name='A', buying_price_per_bag=Decimal('18000'), projected_selling_price=Decimal('23000'))
+        storage_plan(
+            product_name='B', buying_price_per_bag=Decimal('100'), projected_selling_price=Decimal('150'),
+            storage_due_date=date(2029, 1, 1),
+        )
+        storage_plan(product_name='C', buying_price_per_bag=Decimal('100'), projected_selling_price=Decimal('105'))
+
+        self.assertEqual(self.names('min_roi=20&ordering=-roi'), ['B', 'A'])
+        self.assertEqual(self.names('max_price=1000&ordering=roi'), ['C', 'B'])
+        self.assertEqual(self.names('due_before=2029-06-01'), ['B'])
+        self.assertEqual(self.client.get('/api/storage/storage-plans/?min_roi=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/storage/storage-plans/?ordering=bogus').status_code, 400)
+
+    def test_non_finite_numbers_are_rejected(self):
+        for query in ('min_roi=NaN', 'min_roi=sNaN', 'min_roi=Infinity', 'max_price=-Infinity'):
+            self.assertEqual(self.client.get(f'/api/storage/storage-plans/?{query}').status_code, 400, query)
+        self.assertEqual(self.client.get('/api/storage/my-investments/?min_roi=NaN').status_code, 400)
+
+
+class InvestmentPrefetchTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.user = User.objects.create_user(email='holder@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_investments(self, count):
+        for i in range(count):
+            investment = storage_investment(self.user, storage_plan(product_name=f'Rice {i}'))
+            StorageUpdate.objects.bulk_create([
+                StorageUpdate(investment=investment, update_type='general', title=f'Update {j}', message='m')
+                for j in range(12)
+            ])
+        return investment
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        if isinstance(data, dict) and 'results' in data:
+            data = data['results']
+        return len(queries), data
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.add_investments(2)
+        few, _ = self.get('/api/storage/my-investments/')
+        latest = self.add_investments(5)
+        many, data = self.get('/api/storage/my-investments/')
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(data), 7)
+        self.assertEqual(len(data[0]['updates']), 10)
+        self.assertTrue(data[0]['product_name'].startswith('Rice'))
+        self.assertIsNone(data[0]['product_image'])
+        self.assertEqual(data[0]['user_email'], 'holder@example.com')
+
+        _, detail = self.get(f'/api/storage/investments/{latest.pk}/')
+        self.assertEqual(len(detail['updates']), 12)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.user = User.objects.create_user(email='holder@example.com', password='x')
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+
+    @override_settings(STORAGE_VALUATION_BATCH_SIZE=2)
+    def test_open_positions_are_marked_at_the_latest_price(self):
+        rice = storage_plan(product_name='Rice', available_quantity=100)
+        maize = storage_plan(product_name='Maize', available_quantity=100)
+        priced = storage_investment(self.user, rice, 2, status='active')
+        storage_investment(self.user, rice, 3, status='matured')
+        storage_investment(self.user, maize, 4, status='active')
+        storage_investment(self.user, maize, 5, status='pending')
+        storage_investment(self.admin, rice, 1, status='active')
+        for price in (Decimal('90'), Decimal('150')):
+            StorageUpdate.objects.create(
+                investment=priced, update_type='price_update', title='Price', message='m', current_market_price=price,
+            )
+        StorageUpdate.objects.create(investment=priced, update_type='general', title='Note', message='m')
+
+        book = valuation.valuate()
+        self.assertEqual(book['positions'], 4)
+        self.assertEqual(book['invested_amount'], 1000)
+        # Rice at its latest price, Maize (never priced) at the projected price
+        self.assertEqual(book['current_value'], 6 * 150 + 4 * 120)
+        self.assertEqual(book['unrealized_pnl'], 380)
+        self.assertEqual(book['roi'], 38.0)
+        plans = {plan['product_name']: plan for plan in book['plans']}
+        self.assertEqual(plans['Rice']['market_price'], Decimal('150'))
+        self.assertIsNone(plans['Maize']['market_price'])
+
+    def test_admin_valuation_and_user_dashboard(self):
+        rice = storage_plan(product_name='Rice', available_quantity=100)
+        investment = storage_investment(self.user, rice, 2, status='active')
+        StorageUpdate.objects.create(
+            investment=investment, update_type='price_update', title='Price', message='m',
+            current_market_price=Decimal('150'),
+        )
+        client = APIClient()
+
+        client.force_authenticate(self.admin)
+        response = client.get('/api/storage/admin/valuation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['positions'], 1)
+
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/storage/admin/valuation/').status_code, 403)
+        stats = client.get('/api/storage/dashboard/stats/').json()
+        self.assertEqual(stats['current_value'], '300.00')
+        self.assertEqual(stats['unrealized_pnl'], '100.00')
+
+
+class BroadcastTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.plan = storage_plan(available_quantity=100)
+        holders = [User.objects.create_user(email=f'holder{i}@example.com', password='x') for i in range(3)]
+        for holder in holders * 2:
+            storage_investment(holder, self.plan, status='active')
+        storage_investment(self.admin, self.plan, status='pending')
+        self.url = f'/api/storage/admin/storage-plans/{self.plan.pk}/broadcast/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @override_settings(STORAGE_BROADCAST_CHUNK_SIZE=2)
+    def test_one_upload_fans_out_to_every_active_position(self):
+        stored = CloudinaryResource('storage/abc', format='png', type='upload', resource_type='image', version='1')
+        with mock.patch('storage.services.broadcast.uploader.upload_resource', return_value=stored) as upload, \
+             mock.patch('storage.services.broadcast.dispatch', side_effect=lambda task, *args: task(*args)), \
+             mock.patch('agri_invest.background.dispatch', side_effect=lambda task, *args: task(*args)), \
+             mock.patch('agri_invest.imaging.uploader.upload', return_value={'secure_url': 'https://cdn/v.webp'}), \
+             self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {
+                'update_type': 'price_update', 'title': 'New price', 'message': 'm', 'current_market_price': '130',
+                'image': png_upload((4, 4), exif=False),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['updates_created'], 6)
+        self.assertEqual(response.json()['holders_notified'], 3)
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual({str(update.image) for update in StorageUpdate.objects.all()}, {'storage/abc'})
+        self.assertEqual(StorageUpdate.objects.count(), 6)
+        self.assertEqual(Notification.objects.filter(notification_type='storage').count(), 3)
+
+    def test_invalid_update_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'update_type': 'bogus'}).status_code, 400)
+
+    def test_plan_without_active_positions_uploads_nothing(self):
+        plan = storage_plan()
+        with mock.patch('storage.services.broadcast.uploader.upload_resource') as upload:
+            response = self.client.post(f'/api/storage/admin/storage-plans/{plan.pk}/broadcast/', {
+                'update_type': 'general', 'title': 'Hello', 'message': 'm', 'image': png_upload((4, 4), exif=False),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['updates_created'], 0)
+        upload.assert_not_called()
@@ -1,6 +1,7 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.shortcuts import get_object_or_404
 from django.db.models import Sum, Avg, Count, Q
@@ -10,18 +11,56 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from datetime import date, datetime
 import uuid
+from decimal import Decimal, InvalidOperation
 import hashlib
 import hmac
 
 from .models import StoragePlan, StorageInvestment, PaymentTransaction, StorageUpdate
 from .serilizers import (
     StoragePlanSerializer, InvestmentSerializer, InvestmentCreateSerializer,
-    PaymentTransactionSerializer, DashboardStatsSerializer
+    PaymentTransactionSerializer, DashboardStatsSerializer, StorageUpdateBroadcastSerializer
 )
-from .services.payment_service import PaymentService
+from .services import broadcast as broadcast_service
+from .services import inventory
+from .services import valuation as valuation_service
+from .services.payment_service import PaymentService, confirm_payment
+from investments.utils.idempotency import idempotent
+from investments.utils.verification import VerificationCoordinator
+from search import index as search_index
+from agri_invest.prefetch import OptimizedQuerysetMixin
+
+payment_verifier = VerificationCoordinator(
+    PaymentTransaction, 'reference',
+    success_statuses=['successful'],
+    failure_statuses=['failed', 'cancelled'],
+)
+
+
+PLAN_ORDERINGS = {
+    'roi': 'roi_percentage',
+    '-roi': '-roi_percentage',
+    'price': 'buying_price_per_bag',
+    '-price': '-buying_price_per_bag',
+    'due_date': 'storage_due_date',
+    '-due_date': '-storage_due_date',
+}
+
+
+def parse_query_param(params, name, parse):
+    """Parse an optional query parameter, turning bad input into a 400"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse(value)
+        if isinstance(parsed, Decimal) and not parsed.is_finite():
+            raise InvalidOperation
+        return parsed
+    except (ArithmeticError, ValueError):
+        raise ValidationError({name: f"Invalid value: {value}"})
 
 
-class StoragePlanListView(generics.ListCreateAPIView):
+class StoragePlanListView(OptimizedQuerysetMixin, generics.ListCreateAPIView):
     """List all available storage plans"""
     serializer_class = StoragePlanSerializer
     permission_classes = [IsAuthenticated]
@@ -46,16 +85,27 @@ class StoragePlanListView(generics.ListCreateAPIView):
             # Regular users → only active ones
             queryset = StoragePlan.objects.filter(is_active=True)
         
-        # Filter by product name
-        product_name = self.request.query_params.get('product_name')
+        # Filter by product name, best match first on ?ordering=relevance
+        params = self.request.query_params
+        ordering = params.get('ordering')
+        product_name = params.get('product_name') or params.get('search')
         if product_name:
-            queryset = queryset.filter(product_name__icontains=product_name)
+            queryset = search_index.filter_queryset(
+                queryset, 'storage_plan', product_name, ranked=ordering == 'relevance'
+            )
+        
+        # Filter by minimum ROI, maximum price per bag and due date
+        min_roi = parse_query_param(params, 'min_roi', Decimal)
+        if min_roi is not None:
+            queryset = queryset.filter(roi_percentage__gte=min_roi)
         
-        # Filter by minimum ROI
-        min_roi = self.request.query_params.get('min_roi')
-        if min_roi:
-            # This would require a custom filter since roi_percentage is a property
-            pass
+        max_price = parse_query_param(params, 'max_price', Decimal)
+        if max_price is not None:
+            queryset = queryset.filter(buying_price_per_bag__lte=max_price)
+        
+        due_before = parse_query_param(params, 'due_before', date.fromisoformat)
+        if due_before is not None:
+            queryset = queryset.filter(storage_due_date__lte=due_before)
         
         # Filter by availability (only for non-admin users)
         if not (user.is_staff or user.is_superuser):
@@ -63,6 +113,13 @@ class StoragePlanListView(generics.ListCreateAPIView):
             if available_only.lower() == 'true':
                 queryset = queryset.filter(available_quantity__gt=0)
         
+        if ordering == 'relevance':
+            # Already ranked when searching; nothing to rank otherwise
+            return queryset if product_name else queryset.order_by('-created_at')
+        if ordering:
+            if ordering not in PLAN_ORDERINGS:
+                raise ValidationError({'ordering': f"Must be one of: relevance, {', '.join(PLAN_ORDERINGS)}"})
+            return queryset.order_by(PLAN_ORDERINGS[ordering], '-created_at')
         return queryset.order_by('-created_at')
 
     def create(self, request, *args, **kwargs):
@@ -112,7 +169,7 @@ class StoragePlanListView(generics.ListCreateAPIView):
         serializer.save()
 
 
-class StoragePlanDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StoragePlanDetailView(OptimizedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Get detailed information about a specific storage plan"""
     queryset = StoragePlan.objects.all()
     serializer_class = StoragePlanSerializer
@@ -189,11 +246,13 @@ class StoragePlanDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def purchase_storage_plan(request):
     """Purchase a storage plan and initiate payment"""
     serializer = InvestmentCreateSerializer(data=request.data, context={'request': request})
     
     if serializer.is_valid():
+        investment = None
         try:
             # Create investment
             investment = serializer.save()
@@ -213,6 +272,11 @@ def purchase_storage_plan(request):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
+            # Don't strand the stock if the payment could not be started
+            if investment is not None:
+                inventory.release(investment)
+                investment.status = 'cancelled'
+                investment.save()
             return Response({
                 'success': False,
                 'message': f'Failed to create investment: {str(e)}'
@@ -224,7 +288,7 @@ def purchase_storage_plan(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MyInvestmentsView(generics.ListAPIView):
+class MyInvestmentsView(OptimizedQuerysetMixin, generics.ListAPIView):
     """List current user's investments"""
     serializer_class = InvestmentSerializer
     permission_classes = [IsAuthenticated]
@@ -237,10 +301,18 @@ class MyInvestmentsView(generics.ListAPIView):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
+        min_roi = parse_query_param(self.request.query_params, 'min_roi', Decimal)
+        if min_roi is not None:
+            queryset = queryset.filter(roi_percentage__gte=min_roi)
+
+        ordering = self.request.query_params.get('ordering')
+        if ordering in ('roi', '-roi'):
+            return queryset.order_by(ordering.replace('roi', 'roi_percentage'), '-created_at')
+
         return queryset.order_by('-created_at')
 
 
-class AdminStorageInvestmentsView(generics.ListCreateAPIView):
+class AdminStorageInvestmentsView(OptimizedQuerysetMixin, generics.ListCreateAPIView):
     """List and create storage investments for admin"""
     serializer_class = InvestmentSerializer
     permission_classes = [IsAdminUser]
@@ -351,14 +423,14 @@ class AdminStorageInvestmentsView(generics.ListCreateAPIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class AdminStorageInvestmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AdminStorageInvestmentDetailView(OptimizedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, and delete storage investment for admin"""
     serializer_class = InvestmentSerializer
     permission_classes = [IsAdminUser]
     queryset = StorageInvestment.objects.all()
 
 
-class InvestmentDetailView(generics.RetrieveAPIView):
+class InvestmentDetailView(OptimizedQuerysetMixin, generics.RetrieveAPIView):
     """Get detailed information about a specific investment"""
     serializer_class = InvestmentSerializer
     permission_classes = [IsAuthenticated]
@@ -396,11 +468,41 @@ def dashboard_stats(request):
         )
     else:
         stats['average_roi'] = 0
+
+    # Open positions marked to the latest reported market prices
+    valuation = valuation_service.valuate(user_investments)
+    stats['current_value'] = valuation['current_value']
+    stats['unrealized_pnl'] = valuation['unrealized_pnl']
+    stats['current_roi'] = valuation['roi']
     
     serializer = DashboardStatsSerializer(stats)
     return Response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def broadcast_storage_update(request, pk):
+    """Post the same update to every active investment in a storage plan"""
+    plan = get_object_or_404(StoragePlan, pk=pk)
+    serializer = StorageUpdateBroadcastSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    created, holders = broadcast_service.broadcast(plan, **serializer.validated_data)
+    return Response({
+        'message': f'Update posted to {created} investments',
+        'updates_created': created,
+        'holders_notified': holders,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def storage_valuation(request):
+    """Mark-to-market value of every open storage position, with a per-plan breakdown"""
+    return Response(valuation_service.valuate())
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def paystack_webhook(request):
@@ -432,29 +534,10 @@ def paystack_webhook(request):
             
             try:
                 payment_transaction = PaymentTransaction.objects.get(reference=reference)
-                investment = payment_transaction.investment
-                
-                # Update payment status
-                payment_transaction.status = 'successful'
-                payment_transaction.gateway_reference = data['data']['id']
-                payment_transaction.paid_at = datetime.now()
-                payment_transaction.save()
-                
-                # Update investment status
-                investment.status = 'active'
-                investment.payment_status = 'paid'
-                investment.payment_date = datetime.now()
-                investment.payment_reference = reference
-                investment.save()
-                
-                # Create storage update
-                StorageUpdate.objects.create(
-                    investment=investment,
-                    update_type='storage_start',
-                    title='Payment Confirmed - Storage Started',
-                    message=f'Your payment of ₦{payment_transaction.amount:,.2f} has been confirmed. Your {investment.product_name} storage has officially started.'
-                )
-                
+
+                # Update payment and investment status, take the stock
+                confirm_payment(payment_transaction, gateway_reference=data['data']['id'])
+
                 return Response({'status': 'success'})
                 
             except PaymentTransaction.DoesNotExist:
@@ -472,7 +555,7 @@ def paystack_webhook(request):
                 payment_transaction.save()
                 
                 # Release reserved quantity
-                investment.storage_plan.release_quantity(investment.quantity_bags)
+                inventory.release(investment)
                 
                 # Update investment status
                 investment.status = 'cancelled'
@@ -501,52 +584,35 @@ def verify_payment(request):
 
     try:
         payment_transaction = PaymentTransaction.objects.get(reference=reference)
-        investment = payment_transaction.investment
 
-        # If payment is already successful, just return the investment data
-        if payment_transaction.status == 'successful' and investment.status == 'active':
-            return Response({
-                'success': True,
-                'message': 'Payment already verified',
-                'investment': InvestmentSerializer(investment).data,
-                'redirect_url': f'/payment-success?reference={reference}&status=success'
-            })
-
-        payment_service = PaymentService()
+        def on_success(payment_transaction, data):
+            # Update payment and investment status, take the stock
+            confirm_payment(payment_transaction, gateway_reference=data['id'])
 
-        # Verify with payment gateway
-        verification_result = payment_service.verify_payment(reference)
-
-        if verification_result['status'] == 'success':
-            # Update payment and investment status
-            payment_transaction.status = 'successful'
-            payment_transaction.paid_at = datetime.now()
+        def on_failure(payment_transaction, data):
+            payment_transaction.status = 'failed'
             payment_transaction.save()
 
-            investment.status = 'active'
-            investment.payment_status = 'paid'
-            investment.payment_date = datetime.now()
+            # Release reserved quantity
+            investment = payment_transaction.investment
+            inventory.release(investment)
+            investment.status = 'cancelled'
             investment.save()
 
-            # Create success notification/update
-            StorageUpdate.objects.create(
-                investment=investment,
-                update_type='storage_start',
-                title='Payment Confirmed - Storage Started',
-                message=f'Your payment of ₦{payment_transaction.amount:,.2f} has been confirmed. Your {investment.product_name} storage has officially started.'
-            )
+        result, payment_transaction = payment_verifier.verify(payment_transaction, on_success, on_failure)
 
+        if result['status'] == 'success':
             return Response({
                 'success': True,
-                'message': 'Payment verified successfully',
-                'investment': InvestmentSerializer(investment).data,
+                'message': result['message'],
+                'investment': InvestmentSerializer(payment_transaction.investment).data,
                 'redirect_url': f'/payment-success?reference={reference}&status=success'
             })
         else:
             return Response({
                 'success': False,
-                'message': 'Payment verification failed',
-                'redirect_url': f'/payment-success?reference={reference}&status=failed'
+                'message': result['message'],
+                'redirect_url': f'/payment-success?reference={reference}&status={result["status"]}'
             })
 
     except PaymentTransaction.DoesNotExist:
@@ -670,6 +736,7 @@ def mature_investment(request, investment_id):
         investment.status = 'matured'
         investment.matured_date = datetime.now()  # Add this field to your model if needed
         investment.save()
+        investment.refresh_from_db(fields=['roi_percentage'])
         
         # Create maturation update
         StorageUpdate.objects.create(
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Notification
+from .models import User, Notification, StatusEvent
 
 admin.site.register(User)
 admin.site.register(Notification)
+admin.site.register(StatusEvent)
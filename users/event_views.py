@@ -0,0 +1,104 @@
+"""
+Server-Sent Events stream of the user's payment, investment and order status.
+
+Replaces polling ``payment_status``/``verify``/dashboard endpoints after a
+Paystack redirect. Events are written by ``users.signals`` and picked up
+here by polling the ``StatusEvent`` table, so it works across worker
+processes. This is an async view and must be served from the ASGI app
+(``agri_invest.asgi:application``, e.g. gunicorn with uvicorn workers);
+under WSGI the stream would be buffered.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .models import StatusEvent
+
+RETRY_MS = 3000
+
+
+def get_stream_settings():
+    return (
+        getattr(settings, 'STATUS_STREAM_POLL_SECONDS', 2),
+        getattr(settings, 'STATUS_STREAM_HEARTBEAT_SECONDS', 15),
+        getattr(settings, 'STATUS_STREAM_MAX_SECONDS', 300),
+    )
+
+
+def authenticate_stream(request):
+    """Resolve the user from ``?token=`` (EventSource can't send headers) or the Authorization header"""
+    auth = JWTAuthentication()
+    raw_token = request.GET.get('token')
+    if not raw_token:
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def format_event(event):
+    data = {
+        'kind': event.kind,
+        'id': event.object_id,
+        'status': event.status,
+        'previous_status': event.previous_status,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat(),
+    }
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(user_id, last_id):
+    poll_seconds, heartbeat_seconds, max_seconds = get_stream_settings()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    next_heartbeat = loop.time() + heartbeat_seconds
+
+    yield f"retry: {RETRY_MS}\n\n"
+    while loop.time() < deadline:
+        events = [
+            event async for event in StatusEvent.objects.filter(
+                user_id=user_id, id__gt=last_id
+            ).order_by('id')[:100]
+        ]
+        for event in events:
+            last_id = event.id
+            yield format_event(event)
+
+        if events:
+            next_heartbeat = loop.time() + heartbeat_seconds
+        elif loop.time() >= next_heartbeat:
+            yield ": keepalive\n\n"
+            next_heartbeat = loop.time() + heartbeat_seconds
+
+        await asyncio.sleep(poll_seconds)
+    # The browser reconnects on its own and resumes from Last-Event-ID
+
+
+async def status_stream(request):
+    """Stream status changes for the authenticated user"""
+    user = await sync_to_async(authenticate_stream)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        # Fresh connection: only changes from now on
+        latest = await StatusEvent.objects.filter(user_id=user.id).order_by('-id').afirst()
+        last_id = latest.id if latest else 0
+
+    response = StreamingHttpResponse(event_stream(user.id, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,16 +1,29 @@
 from django.core.management.base import BaseCommand
 from users.models import User
 from referrals.models import ReferralCode
+from referrals.services.code_allocator import allocate_codes
 
 class Command(BaseCommand):
     help = 'Generate referral codes for all users who do not have one.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Users per bulk insert')
+
     def handle(self, *args, **options):
-        users = User.objects.all()
+        chunk_size = options['chunk_size']
+        without_code = User.objects.filter(user_referral_code__isnull=True).order_by('id')
         created_count = 0
-        for user in users:
-            if not hasattr(user, 'user_referral_code'):
-                ReferralCode.objects.create(user=user)
-                self.stdout.write(self.style.SUCCESS(f"Created referral code for {user.email}"))
-                created_count += 1
-        self.stdout.write(self.style.SUCCESS(f"Done. Created {created_count} referral codes.")) 
\ No newline at end of file
+        last_id = 0
+        while True:
+            users = list(without_code.filter(id__gt=last_id).values_list('id', 'first_name')[:chunk_size])
+            if not users:
+                break
+            last_id = users[-1][0]
+            codes = allocate_codes(first_name for _, first_name in users)
+            ReferralCode.objects.bulk_create(
+                [ReferralCode(user_id=user_id, code=code) for (user_id, _), code in zip(users, codes)],
+                ignore_conflicts=True,  # a user who signed up meanwhile may already have one
+            )
+            created_count += len(users)
+            self.stdout.write(f"Created {created_count} referral codes...")
+        self.stdout.write(self.style.SUCCESS(f"Done. Created {created_count} referral codes."))
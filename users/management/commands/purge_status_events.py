@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import StatusEvent
+
+class Command(BaseCommand):
+    help = 'Delete status stream events older than the given number of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Keep events from the last N days')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        count, _ = StatusEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} status events.'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_profile_picture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('payment', 'Payment'), ('investment', 'Investment'), ('storage_investment', 'Storage Investment'), ('order', 'Order')], max_length=20)),
+                ('object_id', models.CharField(max_length=64)),
+                ('status', models.CharField(max_length=20)),
+                ('previous_status', models.CharField(blank=True, max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='users_statu_user_id_a15b07_idx')],
+            },
+        ),
+    ]
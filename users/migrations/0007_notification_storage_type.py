@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('referral', 'Referral'), ('earning', 'Referral Earning'), ('storage', 'Storage Update'), ('general', 'General')], default='general', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_user_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
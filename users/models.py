@@ -31,6 +31,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     last_name = models.CharField(max_length=30, blank=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
     profile_picture = CloudinaryField('image', default='default.jpg')
+    profile_picture_url = models.URLField(max_length=500, blank=True)  # see agri_invest/media.py
+    profile_picture_variants = models.JSONField(default=dict, blank=True)  # size name -> URL
     date_of_birth = models.DateField(blank=True, null=True)
     gender = models.CharField(max_length=10, choices=(
         ('male', 'Male'),
@@ -64,6 +66,7 @@ class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('referral', 'Referral'),
         ('earning', 'Referral Earning'),
+        ('storage', 'Storage Update'),
         ('general', 'General'),
     ]
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='notifications')
@@ -75,6 +78,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+        ]
 
     def mark_as_read(self):
         self.is_read = True
@@ -83,3 +90,28 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.notification_type} - {self.message[:30]}..."
+
+class StatusEvent(models.Model):
+    """A status change on one of the user's payments, investments or orders, pushed over SSE"""
+    KIND_CHOICES = [
+        ('payment', 'Payment'),
+        ('investment', 'Investment'),
+        ('storage_investment', 'Storage Investment'),
+        ('order', 'Order'),
+    ]
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='status_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=64)
+    status = models.CharField(max_length=20)
+    previous_status = models.CharField(max_length=20, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.kind} {self.object_id} - {self.status}"
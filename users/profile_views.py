@@ -3,6 +3,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.exceptions import ValidationError
+from agri_invest import imaging
 from investments.serializers import UserInvestmentSummarySerializer
 
 @api_view(['POST'])
@@ -27,23 +29,12 @@ def update_profile_picture(request):
         profile_picture = request.FILES['profile_picture']
         print(f"Profile picture file: {profile_picture.name}, size: {profile_picture.size}, type: {profile_picture.content_type}")
 
-        # Validate file type
-        print("Validating file type")
-        allowed_types = ['image/jpeg', 'image/png', 'image/jpg']
-        if profile_picture.content_type not in allowed_types:
-            print(f"Invalid content type: {profile_picture.content_type}")
+        # Validate, resize and re-encode the image
+        try:
+            profile_picture = imaging.process(profile_picture)
+        except ValidationError as e:
             return Response(
-                {'error': 'Only JPEG, PNG, and JPG files are allowed'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Validate file size (max 5MB)
-        print("Validating file size")
-        max_size = 5 * 1024 * 1024  # 5MB
-        if profile_picture.size > max_size:
-            print(f"File size too big: {profile_picture.size}")
-            return Response(
-                {'error': 'File size must be less than 5MB'},
+                {'error': e.message},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
@@ -51,6 +42,7 @@ def update_profile_picture(request):
         print("Updating user profile picture")
         user.profile_picture = profile_picture
         user.save()
+        imaging.generate_variants(user, 'profile_picture', profile_picture)
         print("User saved successfully")
 
         # Return updated user data with full profile picture URL
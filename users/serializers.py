@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import Notification
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from agri_invest import media
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -51,11 +52,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and instance.profile_picture and instance.profile_picture != 'default.jpg':
-            data['profile_picture'] = request.build_absolute_uri(instance.profile_picture.url)
-        else:
-            data['profile_picture'] = None
+        data['profile_picture'] = media.url_for(instance, 'profile_picture')
         return data
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,39 @@
+"""
+Notification fan-out and the per-user unread count.
+
+Notifications are written with one ``bulk_create`` per batch and marked read
+with one UPDATE. The unread count is read from the database every time: the
+partial index ``notification_unread_idx`` holds only unread rows, so the
+bell icon poll counts a handful of index entries and is correct in every
+worker process, without a shared cache to keep in step.
+"""
+from django.utils import timezone
+
+from ..models import Notification
+
+
+def notify_many(notifications):
+    """Bulk-create unsaved Notification instances"""
+    notifications = list(notifications)
+    if not notifications:
+        return []
+    return Notification.objects.bulk_create(notifications)
+
+
+def notify(user, notification_type, message):
+    user_id = getattr(user, 'pk', user)
+    return notify_many([Notification(
+        user_id=user_id, notification_type=notification_type, message=message
+    )])[0]
+
+
+def unread_count(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def mark_read(user_id, ids=None):
+    """Mark the user's unread notifications (optionally only ``ids``) read in one UPDATE"""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    return unread.update(is_read=True, read_at=timezone.now())
@@ -0,0 +1,85 @@
+"""
+Record status changes of the models users wait on, for the SSE stream.
+
+Only ``save()`` goes through these hooks; bulk ``update()`` calls (payout
+and reconciliation jobs) do not emit events.
+"""
+from django.db.models.signals import post_init, post_save
+
+from .models import StatusEvent
+
+
+def payment_payload(payment):
+    return {
+        'reference': payment.paystack_reference,
+        'amount': str(payment.amount),
+        'investment_id': payment.investment_id,
+    }
+
+
+def investment_payload(investment):
+    return {
+        'package_id': investment.package_id,
+        'amount': str(investment.amount),
+    }
+
+
+def storage_investment_payload(investment):
+    return {
+        'storage_plan_id': str(investment.storage_plan_id),
+        'payment_status': investment.payment_status,
+        'payment_reference': investment.payment_reference,
+    }
+
+
+def order_payload(order):
+    return {
+        'reference': order.reference,
+        'total_amount': str(order.total_amount) if order.total_amount is not None else None,
+    }
+
+
+TRACKED_MODELS = {
+    'investments.Payment': ('payment', payment_payload),
+    'investments.Investment': ('investment', investment_payload),
+    'storage.StorageInvestment': ('storage_investment', storage_investment_payload),
+    'ecommerce.Order': ('order', order_payload),
+}
+
+
+def remember_status(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not loaded just for this
+    instance._initial_status = instance.__dict__.get('status')
+
+
+def make_status_recorder(kind, payload):
+    def record_status_change(sender, instance, created, **kwargs):
+        previous = getattr(instance, '_initial_status', None)
+        current = instance.__dict__.get('status')
+        instance._initial_status = current
+
+        if not instance.user_id or current is None:
+            return
+        if not created and current == previous:
+            return
+
+        StatusEvent.objects.create(
+            user_id=instance.user_id,
+            kind=kind,
+            object_id=str(instance.pk),
+            status=current,
+            previous_status='' if created else (previous or ''),
+            payload=payload(instance),
+        )
+    return record_status_change
+
+
+def connect():
+    for sender, (kind, payload) in TRACKED_MODELS.items():
+        post_init.connect(remember_status, sender=sender, dispatch_uid=f'status_snapshot_{kind}')
+        post_save.connect(
+            make_status_recorder(kind, payload),
+            sender=sender,
+            weak=False,
+            dispatch_uid=f'status_event_{kind}',
+        )
@@ -1,3 +1,182 @@
-from django.test import TestCase
+import asyncio
+import io
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from agri_invest import imaging
+from ecommerce.models import Order
+
+from .models import Notification, StatusEvent, User
+from .serializers import UserSerializer
+from .services import notifications as notification_service
+
+
+def png_upload(size=(3000, 2000), mode='RGB', exif=True):
+    buffer = io.BytesIO()
+    image = Image.new(mode, size, (255, 0, 0, 128) if mode == 'RGBA' else 'red')
+    options = {}
+    if exif:
+        tags = Image.Exif()
+        tags[0x0112] = 6  # Orientation: rotate 90° clockwise
+        tags[0x010F] = 'Camera'
+        options['exif'] = tags.tobytes()
+    image.save(buffer, 'PNG', **options)
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unread_count_follows_writes_made_anywhere(self):
+        notification_service.notify(self.user, 'general', 'Welcome')
+        notification_service.notify_many(Notification(user=self.user, message=str(i)) for i in range(30))
+        # Written behind the service's back, e.g. by another process
+        Notification.objects.create(user=self.user, message='direct')
+
+        response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.data['unread_count'], 32)
+
+        Notification.objects.filter(message='direct').delete()
+        self.assertEqual(notification_service.unread_count(self.user.id), 31)
+
+    def test_mark_read_by_ids_then_all(self):
+        notification_service.notify_many(Notification(user=self.user, message=str(i)) for i in range(5))
+        ids = list(Notification.objects.values_list('id', flat=True)[:3])
+
+        response = self.client.post('/api/notifications/mark_all_read/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'updated': 3, 'unread_count': 2})
+
+        response = self.client.post('/api/notifications/mark_all_read/', {}, format='json')
+        self.assertEqual(response.data, {'updated': 2, 'unread_count': 0})
+
+        response = self.client.post('/api/notifications/mark_all_read/', {'ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination_is_opt_in(self):
+        notification_service.notify_many(Notification(user=self.user, message=str(i)) for i in range(25))
+
+        self.assertEqual(len(self.client.get('/api/notifications/').data), 25)
+
+        first = self.client.get('/api/notifications/?page_size=10').data
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(len(second['results']), 10)
+        self.assertFalse({n['id'] for n in first['results']} & {n['id'] for n in second['results']})
+
+
+class ImageProcessingTests(TestCase):
+    def test_upload_is_rotated_downscaled_stripped_and_reencoded(self):
+        processed = imaging.process(png_upload())
+        image = Image.open(io.BytesIO(processed.read()))
+
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (1067, 1600))
+        self.assertFalse(image.getexif())
+        self.assertEqual(processed.name, 'photo.webp')
+
+    def test_transparency_is_kept(self):
+        processed = imaging.process(png_upload((100, 100), 'RGBA', exif=False))
+        self.assertEqual(Image.open(io.BytesIO(processed.read())).mode, 'RGBA')
+
+    def test_rejects_non_images_unsupported_formats_and_oversized_files(self):
+        with self.assertRaises(ValidationError):
+            imaging.process(SimpleUploadedFile('x.png', b'not an image'))
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'GIF')
+        with self.assertRaises(ValidationError):
+            imaging.process(SimpleUploadedFile('x.gif', buffer.getvalue()))
+
+        with override_settings(IMAGE_MAX_UPLOAD_BYTES=10), self.assertRaises(ValidationError):
+            imaging.process(png_upload())
+
+    @mock.patch('agri_invest.background.dispatch', side_effect=lambda task, *args: task(*args))
+    def test_profile_picture_endpoint_reports_invalid_images(self, _):
+        user = User.objects.create_user(email='pictured@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post(
+            '/api/user/profile-picture/',
+            {'profile_picture': SimpleUploadedFile('x.png', b'junk')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()['error'], 'Upload a valid image file')
+
+    @mock.patch('agri_invest.background.dispatch', side_effect=lambda task, *args: task(*args))
+    def test_current_user_endpoint_processes_pictures_too(self, _):
+        cloudinary.config(cloud_name='test')
+        user = User.objects.create_user(email='me@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        url = '/api/auth/users/me/'
+
+        response = client.patch(url, {'profile_picture': SimpleUploadedFile('x.png', b'junk')}, format='multipart')
+        self.assertEqual(response.status_code, 400, response.content)
+
+        stored = CloudinaryResource('users/me', format='webp', type='upload', resource_type='image', version='1')
+        with mock.patch('cloudinary.models.uploader.upload_resource', return_value=stored) as upload_resource, \
+             mock.patch('agri_invest.imaging.uploader.upload', return_value={'secure_url': 'https://cdn/v.webp'}), \
+             self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(url, {'profile_picture': png_upload()}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        uploaded = upload_resource.call_args.args[0]
+        self.assertIsInstance(uploaded, imaging.ProcessedUpload)
+        self.assertEqual(Image.open(io.BytesIO(uploaded.read())).size, (1067, 1600))
+        user.refresh_from_db()
+        self.assertEqual(user.profile_picture_variants['thumb'], 'https://cdn/v.webp')
+
+
+class StatusStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='watcher@example.com', password='x')
+
+    def test_only_status_changes_are_recorded(self):
+        order = Order.objects.create(user=self.user, reference='ORD1', total_amount=Decimal('2'))
+        order.save()
+        order.status = 'paid'
+        order.save()
+        # Saving with status deferred must not read it back as a change
+        Order.objects.only('id', 'user').get().save()
+
+        self.assertEqual(
+            list(StatusEvent.objects.values_list('status', 'previous_status')),
+            [('pending', ''), ('paid', 'pending')],
+        )
+
+    @override_settings(STATUS_STREAM_POLL_SECONDS=0.05, STATUS_STREAM_MAX_SECONDS=0.3)
+    def test_stream_sends_events_to_the_token_holder(self):
+        Order.objects.create(user=self.user, reference='ORD2', total_amount=Decimal('2'))
+
+        async def stream(**params):
+            response = await AsyncClient().get('/api/user/status-stream/', params)
+            if response.status_code != 200:
+                return response, b''
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, body = asyncio.run(stream(token=str(AccessToken.for_user(self.user)), last_event_id=0))
+        self.assertIn(b'event: order', body)
+
+        response, _ = asyncio.run(stream())
+        self.assertEqual(response.status_code, 401)
+
+
+class ProfilePictureURLTests(TestCase):
+    def test_default_picture_reads_as_no_image(self):
+        user = User.objects.create_user(email='plain@example.com', password='x')
+        self.assertIsNone(UserSerializer(user).data['profile_picture'])
+        self.assertEqual(User.objects.get(pk=user.pk).profile_picture_url, '')
@@ -15,6 +15,9 @@ from urllib.parse import urlencode
 from django.http import HttpResponse
 from rest_framework import viewsets, permissions, status
 from .models import Notification
+from .services import notifications as notification_service
+from agri_invest.pagination import OptionalCursorPagination
+from search import index as search_index
 from .serializers import NotificationSerializer, UserSerializer ,UserCreateSerializer, UserUpdateSerializer, UserKYCStatusSerializer
 from referrals.models import ReferralCode, Referral  # Ensure correct import
 from django.contrib.auth import get_user_model
@@ -191,6 +194,7 @@ def custom_activation(request, uid, token):
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
@@ -201,6 +205,23 @@ class NotificationViewSet(viewsets.ModelViewSet):
         if not instance.is_read:
             instance.mark_as_read()
 
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return Response({'unread_count': notification_service.unread_count(request.user.id)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Mark all (or the given ``ids``) of the user's notifications read"""
+        ids = request.data.get('ids')
+        if ids is not None and not isinstance(ids, list):
+            return Response({'error': 'ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = notification_service.mark_read(request.user.id, ids)
+        return Response({
+            'updated': updated,
+            'unread_count': notification_service.unread_count(request.user.id),
+        })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def submit_referral_code(request):
@@ -376,47 +397,6 @@ class AdminUserViewSet(viewsets.ModelViewSet):
             return UserUpdateSerializer
         return UserSerializer
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Filtering
-        role = request.query_params.get('role', None)
-        if role == 'admin':
-            queryset = queryset.filter(is_superuser=True)
-        elif role == 'staff':
-            queryset = queryset.filter(is_staff=True, is_superuser=False)
-        elif role == 'user':
-            queryset = queryset.filter(is_staff=False, is_superuser=False)
-        
-        status = request.query_params.get('status', None)
-        if status == 'active':
-            queryset = queryset.filter(is_active=True)
-        elif status == 'inactive':
-            queryset = queryset.filter(is_active=False)
-        
-        kyc_status = request.query_params.get('kyc_status', None)
-        if kyc_status == 'verified':
-            queryset = queryset.filter(is_kyc_complete=True)
-        elif kyc_status == 'unverified':
-            queryset = queryset.filter(is_kyc_complete=False)
-        
-        search = request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                models.Q(email__icontains=search) |
-                models.Q(first_name__icontains=search) |
-                models.Q(last_name__icontains=search) |
-                models.Q(phone__icontains=search)
-            )
-        
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-
     @action(detail=True, methods=['post'])
     def set_kyc_status(self, request, pk=None):
         user = self.get_object()
@@ -529,12 +509,7 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                models.Q(email__icontains=search) |
-                models.Q(first_name__icontains=search) |
-                models.Q(last_name__icontains=search) |
-                models.Q(phone__icontains=search)
-            )
+            queryset = search_index.filter_queryset(queryset, 'user', search)
             
         return queryset
 